@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark comparing Model.findVars() with the former dir()-based getter lookup
+
+:copyright: Copyright (C) 2013-2022 Gianluca Costa.
+:license: LGPLv3, see LICENSE for details.
+"""
+
+import timeit
+
+from info.gianlucacosta.iris.rendering import Model
+
+
+class BenchmarkModel(Model):
+    def getTitle(self):
+        return "Benchmark"
+
+    def getAuthor(self):
+        return "Iris"
+
+    def getCount(self):
+        return 90
+
+    def getItems(self):
+        return [1, 2, 3]
+
+    def isPublished(self):
+        return True
+
+    def isDraft(self):
+        return False
+
+
+def findVarsViaDirScan(model):
+    """
+    The getter lookup performed by findVars() before the accessor plan was introduced
+    """
+    result = {}
+
+    for itemName in map(str, dir(model)):
+        match = model._getterPattern.match(itemName)
+
+        if match is None:
+            continue
+
+        propertyName = match.group(1)
+        varName = propertyName[0].lower() + propertyName[1:]
+
+        result[varName] = getattr(model, itemName)()
+
+    result.update(model._explicitVars)
+    result["vars"] = result
+
+    return result
+
+
+def main():
+    iterations = 100000
+    model = BenchmarkModel(False)
+
+    assert findVarsViaDirScan(model).keys() == model.findVars().keys()
+
+    dirScanTime = timeit.timeit(lambda: findVarsViaDirScan(model), number=iterations)
+    accessorPlanTime = timeit.timeit(model.findVars, number=iterations)
+
+    print("Calls per variant: {0}".format(iterations))
+    print("dir() scan:     {0:.3f}s".format(dirScanTime))
+    print("Accessor plan:  {0:.3f}s".format(accessorPlanTime))
+    print("Speedup:        {0:.1f}x".format(dirScanTime / accessorPlanTime))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark comparing the whole-buffer TrailingSpaceRemover with the per-line processing
+
+:copyright: Copyright (C) 2013-2022 Gianluca Costa.
+:license: LGPLv3, see LICENSE for details.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from info.gianlucacosta.iris.io.filetree import (
+    FileAccessOptions,
+    FileTreeLineProcessor,
+    TrailingSpaceRemover,
+)
+
+
+class PerLineTrailingSpaceRemover(FileTreeLineProcessor):
+    """
+    Relies on the per-line processing used by TrailingSpaceRemover before the whole-buffer one
+    """
+
+    _processLine = TrailingSpaceRemover._processLine
+
+
+def createSourceTree(rootPath, fileCount, linesPerFile):
+    randomGenerator = random.Random(90)
+    trailingSpaces = ["", " ", "   ", "\t", " \t "]
+
+    for fileIndex in range(fileCount):
+        lines = [
+            "    int value{0} = {1};{2}\n".format(
+                lineIndex,
+                randomGenerator.randint(0, 1000),
+                randomGenerator.choice(trailingSpaces),
+            )
+            for lineIndex in range(linesPerFile)
+        ]
+
+        with open(os.path.join(rootPath, "F{0}.java".format(fileIndex)), "w") as output:
+            output.writelines(lines)
+
+
+def measure(processor, sourcePath, workPath):
+    shutil.rmtree(workPath, ignore_errors=True)
+    shutil.copytree(sourcePath, workPath)
+
+    startTime = time.perf_counter()
+    processor.applyTo(workPath)
+    elapsedTime = time.perf_counter() - startTime
+
+    return elapsedTime
+
+
+def readTree(rootPath):
+    result = {}
+
+    for fileName in os.listdir(rootPath):
+        with open(os.path.join(rootPath, fileName), "rb") as treeFile:
+            result[fileName] = treeFile.read()
+
+    return result
+
+
+def main():
+    fileCount = 20
+    linesPerFile = 100000
+    filePattern = r".*\.java$"
+
+    variants = [
+        ("Per-line", PerLineTrailingSpaceRemover(filePattern)),
+        ("Whole buffer (text)", TrailingSpaceRemover(filePattern)),
+        (
+            "Whole buffer (binary)",
+            TrailingSpaceRemover(
+                filePattern, FileAccessOptions(binary=True, bufferSize=1024 * 1024)
+            ),
+        ),
+    ]
+
+    with tempfile.TemporaryDirectory() as tempPath:
+        sourcePath = os.path.join(tempPath, "source")
+        workPath = os.path.join(tempPath, "work")
+
+        os.makedirs(sourcePath)
+        createSourceTree(sourcePath, fileCount, linesPerFile)
+
+        totalSize = sum(
+            os.path.getsize(os.path.join(sourcePath, fileName))
+            for fileName in os.listdir(sourcePath)
+        )
+
+        print(
+            "Files: {0} - lines per file: {1} - total size: {2:.1f} MiB".format(
+                fileCount, linesPerFile, totalSize / 1024 / 1024
+            )
+        )
+
+        expectedTree = None
+
+        for variantName, processor in variants:
+            elapsedTime = measure(processor, sourcePath, workPath)
+
+            processedTree = readTree(workPath)
+            if expectedTree is None:
+                expectedTree = processedTree
+            assert processedTree == expectedTree
+
+            print(
+                "{0:<24}{1:.3f}s ({2:.1f} MiB/s)".format(
+                    variantName + ":",
+                    elapsedTime,
+                    totalSize / 1024 / 1024 / elapsedTime,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
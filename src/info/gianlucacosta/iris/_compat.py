@@ -0,0 +1,11 @@
+"""
+Compatibility helpers across the supported Python versions
+
+:copyright: Copyright (C) 2013-2022 Gianluca Costa.
+:license: LGPLv3, see LICENSE for details.
+"""
+
+import asyncio
+
+# Python 3.6 lacks get_running_loop(), but get_event_loop() returns the running loop in coroutines
+getRunningLoop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)
@@ -0,0 +1,234 @@
+"""
+Disk-usage aggregation
+
+:copyright: Copyright (C) 2013-2022 Gianluca Costa.
+:license: LGPLv3, see LICENSE for details.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DirectoryUsage:
+    """
+    The disk usage of a directory, rolled up from its subdirectories
+    """
+
+    def __init__(self, path, ownSize, ownFileCount, children):
+        self._path = path
+        self._ownSize = ownSize
+        self._ownFileCount = ownFileCount
+        self._children = children
+
+        self._totalSize = ownSize + sum(
+            child.getTotalSize() for child in children.values()
+        )
+        self._totalFileCount = ownFileCount + sum(
+            child.getTotalFileCount() for child in children.values()
+        )
+
+    def getPath(self):
+        return self._path
+
+    def getOwnSize(self):
+        """
+        Returns the size of the files directly contained in the directory
+        """
+        return self._ownSize
+
+    def getOwnFileCount(self):
+        return self._ownFileCount
+
+    def getTotalSize(self):
+        """
+        Returns the size of all the files in the tree rooted in the directory
+        """
+        return self._totalSize
+
+    def getTotalFileCount(self):
+        return self._totalFileCount
+
+    def getChildren(self):
+        """
+        Returns a dictionary mapping the name of each subdirectory to its DirectoryUsage
+        """
+        return self._children
+
+    def find(self, relativePath):
+        """
+        Returns the DirectoryUsage of the given descendant path, or None if missing
+        """
+        result = self
+
+        for component in os.path.normpath(relativePath).split(os.sep):
+            if component in ("", os.curdir):
+                continue
+
+            result = result._children.get(component)
+
+            if result is None:
+                return None
+
+        return result
+
+    def walk(self):
+        """
+        Iterates over the DirectoryUsage's of the tree, parents first
+        """
+        pendingUsages = [self]
+
+        while pendingUsages:
+            usage = pendingUsages.pop()
+            yield usage
+
+            pendingUsages.extend(usage._children.values())
+
+
+class DiskUsageAggregator:
+    """
+    Computes the disk usage of a tree, per directory, just like "du".
+
+    The tree is scanned via os.scandir(), in parallel across the subtrees
+    of the root directory; the stat data of every directory is cached,
+    so that refresh() only lists the directories whose modification time changed.
+
+    Consequently, a refresh does not detect files modified in place - as opposed to
+    files created, deleted or renamed: refresh(fullRescan=True) lists every directory.
+    """
+
+    def __init__(self, rootPath, maxWorkers=None, apparentSize=False):
+        """
+        --maxWorkers: the maximum number of subtrees scanned in parallel
+
+        --apparentSize: if True, file sizes are used instead of the allocated disk space
+        """
+        self._rootPath = rootPath
+        self._maxWorkers = maxWorkers
+        self._apparentSize = apparentSize
+
+        self._cache = {}
+        self._usage = None
+
+    def getRootPath(self):
+        return self._rootPath
+
+    def getUsage(self):
+        """
+        Returns the DirectoryUsage of the root directory, computed by the latest refresh();
+        the first call performs the refresh
+        """
+        if self._usage is None:
+            self.refresh()
+
+        return self._usage
+
+    def refresh(self, fullRescan=False, maxWorkers=None):
+        """
+        Updates the disk usage, returning the DirectoryUsage of the root directory
+        - or None if the root directory does not exist.
+
+        --maxWorkers: if not None, it replaces - for this refresh only -
+          the "maxWorkers" passed to the constructor
+        """
+        if maxWorkers is None:
+            maxWorkers = self._maxWorkers
+
+        oldCache = {} if fullRescan else self._cache
+        newCache = {}
+
+        rootEntry = self._scanDir(self._rootPath, oldCache, newCache)
+
+        if rootEntry is None:
+            self._cache = {}
+            self._usage = None
+            return None
+
+        _, ownSize, ownFileCount, subdirNames = rootEntry
+        subdirPaths = [
+            os.path.join(self._rootPath, subdirName) for subdirName in subdirNames
+        ]
+
+        def scanSubtree(subdirPath):
+            return self._scanTree(subdirPath, oldCache, newCache)
+
+        if maxWorkers == 1:
+            subtreeUsages = [scanSubtree(subdirPath) for subdirPath in subdirPaths]
+        else:
+            with ThreadPoolExecutor(maxWorkers) as executor:
+                subtreeUsages = list(executor.map(scanSubtree, subdirPaths))
+
+        children = {
+            subdirName: usage
+            for subdirName, usage in zip(subdirNames, subtreeUsages)
+            if usage is not None
+        }
+
+        self._cache = newCache
+        self._usage = DirectoryUsage(self._rootPath, ownSize, ownFileCount, children)
+
+        return self._usage
+
+    def _getSize(self, entryStat):
+        if self._apparentSize or not hasattr(entryStat, "st_blocks"):
+            return entryStat.st_size
+
+        return entryStat.st_blocks * 512
+
+    def _scanDir(self, dirPath, oldCache, newCache):
+        """
+        Returns the cache entry - (modification time, own size, own file count, subdir names) -
+        of the given directory, listing it only if its modification time changed
+        """
+        try:
+            modificationTime = os.stat(dirPath).st_mtime_ns
+        except OSError:
+            return None
+
+        cacheEntry = oldCache.get(dirPath)
+
+        if cacheEntry is None or cacheEntry[0] != modificationTime:
+            ownSize = 0
+            ownFileCount = 0
+            subdirNames = []
+
+            try:
+                with os.scandir(dirPath) as dirEntries:
+                    for dirEntry in dirEntries:
+                        try:
+                            if dirEntry.is_dir(follow_symlinks=False):
+                                subdirNames.append(dirEntry.name)
+                            else:
+                                ownSize += self._getSize(
+                                    dirEntry.stat(follow_symlinks=False)
+                                )
+                                ownFileCount += 1
+                        except OSError:
+                            continue
+            except OSError:
+                return None
+
+            cacheEntry = (modificationTime, ownSize, ownFileCount, tuple(subdirNames))
+
+        newCache[dirPath] = cacheEntry
+
+        return cacheEntry
+
+    def _scanTree(self, dirPath, oldCache, newCache):
+        cacheEntry = self._scanDir(dirPath, oldCache, newCache)
+
+        if cacheEntry is None:
+            return None
+
+        _, ownSize, ownFileCount, subdirNames = cacheEntry
+
+        children = {}
+
+        for subdirName in subdirNames:
+            usage = self._scanTree(
+                os.path.join(dirPath, subdirName), oldCache, newCache
+            )
+
+            if usage is not None:
+                children[subdirName] = usage
+
+        return DirectoryUsage(dirPath, ownSize, ownFileCount, children)
@@ -0,0 +1,259 @@
+"""
+Detection of duplicate files
+
+:copyright: Copyright (C) 2013-2022 Gianluca Costa.
+:license: LGPLv3, see LICENSE for details.
+"""
+
+import hashlib
+import os
+import stat
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import PathOperations, PathOperationResult
+
+
+class DuplicateFinder:
+    """
+    Finds files having the same content within one or more trees.
+
+    Files are first grouped by size; files sharing their size are then grouped
+    by the hash of their first block and only the files still colliding
+    are fully hashed - so most files are ruled out without being read entirely.
+
+    Paths referring to the same inode (hard links) are considered just once.
+    """
+
+    def __init__(self, blockSize=4096, maxWorkers=None, minSize=1, hashName="sha256"):
+        """
+        --blockSize: the size of the first block, hashed to rule out most candidates
+
+        --maxWorkers: the maximum number of threads hashing files in parallel
+
+        --minSize: files smaller than this size are ignored
+
+        --hashName: the name of the hashlib algorithm
+        """
+        self._blockSize = blockSize
+        self._maxWorkers = maxWorkers
+        self._minSize = minSize
+        self._hashName = hashName
+
+    def find(self, *rootPaths, currentDirFilter=None):
+        """
+        Scans the given trees - passing "currentDirFilter" to PathOperations.linearWalk() -
+        and returns a DuplicateReport
+        """
+        pathsBySize = {}
+        visitedInodes = set()
+        scannedCount = 0
+
+        for rootPath in rootPaths:
+            for item in PathOperations.linearWalk(rootPath, currentDirFilter):
+                path = item.getPath()
+
+                try:
+                    pathStat = os.lstat(path)
+                except OSError:
+                    continue
+
+                if not stat.S_ISREG(pathStat.st_mode):
+                    continue
+
+                inode = (pathStat.st_dev, pathStat.st_ino)
+                if inode in visitedInodes:
+                    continue
+                visitedInodes.add(inode)
+
+                scannedCount += 1
+
+                if pathStat.st_size >= self._minSize:
+                    pathsBySize.setdefault(pathStat.st_size, []).append(path)
+
+        errors = []
+
+        candidateGroups = [
+            (size, paths) for size, paths in pathsBySize.items() if len(paths) > 1
+        ]
+
+        partialGroups = self._groupByHash(candidateGroups, self._blockSize, errors)
+        partiallyHashedCount = sum(len(paths) for _, paths in candidateGroups)
+
+        fullCandidateGroups = []
+        duplicateGroups = []
+
+        for size, paths in partialGroups:
+            if size <= self._blockSize:
+                duplicateGroups.append((size, paths))
+            else:
+                fullCandidateGroups.append((size, paths))
+
+        duplicateGroups.extend(self._groupByHash(fullCandidateGroups, None, errors))
+        fullyHashedCount = sum(len(paths) for _, paths in fullCandidateGroups)
+
+        return DuplicateReport(
+            duplicateGroups,
+            scannedCount,
+            partiallyHashedCount,
+            fullyHashedCount,
+            errors,
+        )
+
+    def _hashFile(self, path, maxSize):
+        """
+        Returns the hex digest of the first "maxSize" bytes of the file - or of all of it,
+        if "maxSize" is None
+        """
+        hasher = hashlib.new(self._hashName)
+        chunkSize = 1024 * 1024 if maxSize is None else maxSize
+
+        with open(path, "rb") as inputFile:
+            while True:
+                chunk = inputFile.read(chunkSize)
+                if not chunk:
+                    break
+
+                hasher.update(chunk)
+
+                if maxSize is not None:
+                    break
+
+        return hasher.hexdigest()
+
+    def _groupByHash(self, sizeGroups, maxSize, errors):
+        """
+        Splits every (size, paths) group by the hash of the content of its paths,
+        hashing in parallel; returns the resulting (size, paths) groups having
+        at least 2 paths, while failures are appended to "errors"
+        """
+        tasks = [(size, path) for size, paths in sizeGroups for path in paths]
+
+        def hashTask(task):
+            size, path = task
+
+            try:
+                return size, path, self._hashFile(path, maxSize), None
+            except OSError as ex:
+                return size, path, None, ex
+
+        if self._maxWorkers == 1:
+            hashResults = [hashTask(task) for task in tasks]
+        else:
+            with ThreadPoolExecutor(self._maxWorkers) as executor:
+                hashResults = list(executor.map(hashTask, tasks))
+
+        pathsByKey = {}
+
+        for size, path, digest, error in hashResults:
+            if error is not None:
+                errors.append(PathOperationResult(path, False, error))
+            else:
+                pathsByKey.setdefault((size, digest), []).append(path)
+
+        return [
+            (size, paths) for (size, _), paths in pathsByKey.items() if len(paths) > 1
+        ]
+
+    @staticmethod
+    def hardLinkDuplicates(duplicateReport, maxWorkers=None):
+        """
+        Replaces every duplicate of the given DuplicateReport with a hard link
+        to the first path of its group; each link is created under a temporary name
+        and atomically renamed over the duplicate.
+
+        Returns a list of PathOperationResult's, one per replaced path; linking fails,
+        for example, when the paths are on different file systems.
+        """
+        linkPairs = [
+            (group[0], duplicatePath)
+            for group in duplicateReport.getGroups()
+            for duplicatePath in group[1:]
+        ]
+
+        def hardLink(pair):
+            sourcePath, targetPath = pair
+
+            targetDirPath, targetName = os.path.split(targetPath)
+            tempPath = os.path.join(
+                targetDirPath, ".{0}.{1}.tmp".format(targetName, uuid.uuid4().hex)
+            )
+
+            os.link(sourcePath, tempPath)
+
+            try:
+                os.replace(tempPath, targetPath)
+            except OSError:
+                PathOperations.safeRemove(tempPath)
+                raise
+
+        return [
+            PathOperationResult(
+                pairResult.getPath()[1],
+                pairResult.isSuccessful(),
+                pairResult.getError(),
+            )
+            for pairResult in PathOperations.runInParallel(
+                hardLink, linkPairs, maxWorkers
+            )
+        ]
+
+
+class DuplicateReport:
+    """
+    The outcome of DuplicateFinder.find()
+    """
+
+    def __init__(
+        self,
+        duplicateGroups,
+        scannedCount,
+        partiallyHashedCount,
+        fullyHashedCount,
+        errors,
+    ):
+        self._sizedGroups = sorted(
+            ((size, sorted(paths)) for size, paths in duplicateGroups),
+            key=lambda sizedGroup: -sizedGroup[0] * (len(sizedGroup[1]) - 1),
+        )
+        self._scannedCount = scannedCount
+        self._partiallyHashedCount = partiallyHashedCount
+        self._fullyHashedCount = fullyHashedCount
+        self._errors = errors
+
+    def getGroups(self):
+        """
+        Returns the list of the groups of duplicate files - each being a sorted list of paths -
+        starting from the groups wasting more space
+        """
+        return [paths for _, paths in self._sizedGroups]
+
+    def getReclaimableSize(self):
+        """
+        Returns the number of bytes that would be freed by keeping just one file per group
+        """
+        return sum(size * (len(paths) - 1) for size, paths in self._sizedGroups)
+
+    def getScannedCount(self):
+        """
+        Returns the number of distinct files scanned
+        """
+        return self._scannedCount
+
+    def getPartiallyHashedCount(self):
+        """
+        Returns the number of files whose first block was hashed
+        """
+        return self._partiallyHashedCount
+
+    def getFullyHashedCount(self):
+        """
+        Returns the number of files that had to be read entirely
+        """
+        return self._fullyHashedCount
+
+    def getErrors(self):
+        """
+        Returns the PathOperationResult's of the files that could not be read
+        """
+        return self._errors
@@ -5,8 +5,367 @@ File-tree utilities
 :license: LGPLv3, see LICENSE for details.
 """
 
+import asyncio
 import os
 import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .._compat import getRunningLoop
+from .utils import AtomicFileWriter, DirectorySyncBatch, PathOperationResult
+
+
+class FileAccessOptions:
+    """
+    Describes how FileTreeProcessor subclasses read and write files.
+
+    In binary mode, files are processed as bytes, without decoding: this is much faster,
+    and it is suitable for ASCII-compatible encodings - such as UTF-8 -
+    whenever the processing only involves ASCII characters.
+
+    In atomic mode, files are rewritten via AtomicFileWriter: a crash or an interruption
+    never leaves a file truncated.
+    """
+
+    def __init__(
+        self,
+        encoding=None,
+        errors=None,
+        preserveNewlines=False,
+        bufferSize=-1,
+        binary=False,
+        atomic=False,
+    ):
+        """
+        --encoding: the text encoding - by default, the platform's one;
+          in binary mode, it is only used to encode the str patterns
+
+        --errors: the text error handling scheme, as in open() - for example, "surrogateescape"
+          can process mixed-encoding trees without raising UnicodeDecodeError
+
+        --preserveNewlines: if True, the newlines of text files are read and written unchanged,
+          instead of being translated; in binary mode, newlines are always preserved
+
+        --bufferSize: the buffer size passed to open()
+
+        --binary: if True, files are processed as bytes
+
+        --atomic: if True, files are written to a temporary file - synced to disk
+          and renamed over the original, whose permissions are preserved;
+          symbolic links are followed, while hard-linked files cause an OSError
+        """
+        self._encoding = encoding
+        self._errors = errors
+        self._preserveNewlines = preserveNewlines
+        self._bufferSize = bufferSize
+        self._binary = binary
+        self._atomic = atomic
+
+    def getEncoding(self):
+        return self._encoding
+
+    def getErrors(self):
+        return self._errors
+
+    def isPreservingNewlines(self):
+        return self._preserveNewlines
+
+    def getBufferSize(self):
+        return self._bufferSize
+
+    def isBinary(self):
+        return self._binary
+
+    def isAtomic(self):
+        return self._atomic
+
+    def openFile(self, filePath, mode="r", directorySyncBatch=None):
+        """
+        Opens the given file for reading ("r") or writing ("w"),
+        according to the current options; in atomic mode, writing returns
+        an AtomicFileWriter, syncing the directory via "directorySyncBatch", if passed
+        """
+        if self._binary:
+            mode += "b"
+            textArgs = {}
+        else:
+            textArgs = {
+                "encoding": self._encoding,
+                "errors": self._errors,
+                "newline": "" if self._preserveNewlines else None,
+            }
+
+        if self._atomic and "w" in mode:
+            return AtomicFileWriter(
+                filePath,
+                mode,
+                buffering=self._bufferSize,
+                directorySyncBatch=directorySyncBatch,
+                **textArgs
+            )
+
+        return open(filePath, mode, buffering=self._bufferSize, **textArgs)
+
+    def compilePattern(self, pattern):
+        """
+        Compiles the given regex - a string or a compiled pattern - so that it can be
+        applied to the content of the files: in binary mode, str patterns are encoded
+        """
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+
+        if self._binary and isinstance(pattern.pattern, str):
+            return re.compile(
+                pattern.pattern.encode(self._encoding or "utf-8"),
+                pattern.flags & ~re.UNICODE,
+            )
+
+        return pattern
+
+
+class ProgressReporter:
+    """
+    Prints the progress of a FileTreeProcessor - with throughput and,
+    if the expected file count is known, ETA - at most once every "interval" seconds,
+    as well as a final report
+    """
+
+    def __init__(self, interval=1.0, expectedFileCount=None, output=None):
+        """
+        --expectedFileCount: the number of files expected to be processed - for example,
+          the count of a previous run; the ETA is omitted if it is None, because files
+          are matched lazily, while being processed
+
+        --output: the text stream receiving the progress; by default, sys.stderr
+        """
+        self._interval = interval
+        self._expectedFileCount = expectedFileCount
+        self._output = output
+        self._lastReportTime = None
+
+    def _print(self, text):
+        print(text, file=self._output if self._output is not None else sys.stderr)
+
+    def update(self, metrics):
+        """
+        Prints the current progress, unless it was printed less than "interval" seconds ago
+        """
+        currentTime = time.monotonic()
+
+        if (
+            self._lastReportTime is not None
+            and currentTime - self._lastReportTime < self._interval
+        ):
+            return
+
+        self._lastReportTime = currentTime
+
+        elapsedTime = metrics.getElapsedTime()
+        completedCount = metrics.getProcessedCount() + metrics.getSkippedCount()
+
+        if elapsedTime <= 0 or completedCount == 0:
+            return
+
+        filesPerSecond = completedCount / elapsedTime
+
+        progressText = "{0} files done ({1:.1f} files/s, {2:.2f} MiB/s)".format(
+            completedCount,
+            filesPerSecond,
+            metrics.getBytesRead() / 1024 / 1024 / elapsedTime,
+        )
+
+        if self._expectedFileCount is not None:
+            remainingSeconds = (
+                max(self._expectedFileCount - completedCount, 0) / filesPerSecond
+            )
+            progressText += " - ETA {0}".format(_formatDuration(remainingSeconds))
+
+        self._print(progressText)
+
+    def finish(self, metrics):
+        """
+        Prints the final report of the given FileTreeMetrics
+        """
+        self._print(metrics.getReport())
+
+
+def _formatDuration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return "{0:02}:{1:02}:{2:02}".format(hours, minutes, seconds)
+
+
+class FileTreeMetrics:
+    """
+    Counters describing the runs of a FileTreeProcessor - scanned, matched,
+    changed and skipped files, bytes read and written, time spent walking the tree
+    and processing files, as well as the CPU time, telling CPU-bound runs
+    from I/O-bound ones.
+
+    Skipped files are the matched ones rejected by the "onProcessing" field.
+
+    All the counters are thread-safe and accumulate across runs;
+    the optional ProgressReporter is notified after every file.
+    """
+
+    def __init__(self, progressReporter=None):
+        self._progressReporter = progressReporter
+        self._lock = threading.Lock()
+
+        self._scannedCount = 0
+        self._matchedCount = 0
+        self._skippedCount = 0
+        self._processedCount = 0
+        self._changedCount = 0
+        self._bytesRead = 0
+        self._bytesWritten = 0
+        self._walkTime = 0.0
+        self._processingTime = 0.0
+
+        self._elapsedTime = 0.0
+        self._cpuTime = 0.0
+        self._startTimes = None
+
+    def getProgressReporter(self):
+        return self._progressReporter
+
+    def start(self):
+        """
+        Called when a run starts
+        """
+        self._startTimes = (time.perf_counter(), time.process_time())
+
+    def finish(self):
+        """
+        Called when a run ends - successfully or not: notifies the ProgressReporter, if any
+        """
+        if self._startTimes is not None:
+            self._elapsedTime += time.perf_counter() - self._startTimes[0]
+            self._cpuTime += time.process_time() - self._startTimes[1]
+            self._startTimes = None
+
+        if self._progressReporter is not None:
+            self._progressReporter.finish(self)
+
+    def recordWalk(self, elapsedTime, fileCount):
+        """
+        Records the listing of a directory containing "fileCount" files
+        """
+        with self._lock:
+            self._walkTime += elapsedTime
+            self._scannedCount += fileCount
+
+    def recordMatch(self):
+        with self._lock:
+            self._matchedCount += 1
+
+    def recordSkip(self):
+        with self._lock:
+            self._skippedCount += 1
+
+        self._notifyProgress()
+
+    def recordProcessing(self, elapsedTime, changed, bytesRead, bytesWritten):
+        """
+        Records the processing of a file
+        """
+        with self._lock:
+            self._processingTime += elapsedTime
+            self._processedCount += 1
+            self._bytesRead += bytesRead
+
+            if changed:
+                self._changedCount += 1
+                self._bytesWritten += bytesWritten
+
+        self._notifyProgress()
+
+    def _notifyProgress(self):
+        if self._progressReporter is not None:
+            self._progressReporter.update(self)
+
+    def getScannedCount(self):
+        return self._scannedCount
+
+    def getMatchedCount(self):
+        return self._matchedCount
+
+    def getSkippedCount(self):
+        return self._skippedCount
+
+    def getProcessedCount(self):
+        return self._processedCount
+
+    def getChangedCount(self):
+        return self._changedCount
+
+    def getBytesRead(self):
+        return self._bytesRead
+
+    def getBytesWritten(self):
+        return self._bytesWritten
+
+    def getWalkTime(self):
+        """
+        Returns the seconds spent listing directories
+        """
+        return self._walkTime
+
+    def getProcessingTime(self):
+        """
+        Returns the seconds spent processing files - summed across threads, if concurrent
+        """
+        return self._processingTime
+
+    def getElapsedTime(self):
+        """
+        Returns the wall-clock seconds of the runs, including the current one
+        """
+        if self._startTimes is None:
+            return self._elapsedTime
+
+        return self._elapsedTime + time.perf_counter() - self._startTimes[0]
+
+    def getCpuTime(self):
+        """
+        Returns the CPU seconds consumed by the process during the completed runs:
+        values close to the elapsed time denote CPU-bound runs
+        """
+        return self._cpuTime
+
+    def getReport(self):
+        """
+        Returns a multi-line summary of the metrics
+        """
+        elapsedTime = self.getElapsedTime()
+
+        lines = [
+            "Files: {0} scanned, {1} matched, {2} changed, {3} skipped".format(
+                self._scannedCount,
+                self._matchedCount,
+                self._changedCount,
+                self._skippedCount,
+            ),
+            "Data: {0:.2f} MiB read, {1:.2f} MiB written".format(
+                self._bytesRead / 1024 / 1024, self._bytesWritten / 1024 / 1024
+            ),
+            "Time: {0:.3f}s elapsed - walking {1:.3f}s, processing {2:.3f}s, CPU {3:.3f}s".format(
+                elapsedTime, self._walkTime, self._processingTime, self._cpuTime
+            ),
+        ]
+
+        if elapsedTime > 0:
+            lines.append(
+                "Throughput: {0:.1f} files/s, {1:.2f} MiB/s".format(
+                    self._processedCount / elapsedTime,
+                    self._bytesRead / 1024 / 1024 / elapsedTime,
+                )
+            )
+
+        return "\n".join(lines)
 
 
 class FileTreeProcessor:
@@ -15,34 +374,147 @@ class FileTreeProcessor:
 
     The "onProcessing" field is a function called just before a file path is going to be processed;
     it must only receive the file path and return a True-like value if the file should be processed.
+
+    The "metrics" field can be set to a FileTreeMetrics, updated while processing.
     """
 
-    def __init__(self, filePathPattern):
+    def __init__(self, filePathPattern, fileAccess=None):
         """
         --filePathPattern: the regex describing the file paths to be processed
+
+        --fileAccess: the FileAccessOptions used to read and write files
         """
         if isinstance(filePathPattern, str):
             self._filePathPattern = re.compile(filePathPattern)
         else:
             self._filePathPattern = filePathPattern
 
+        self._fileAccess = fileAccess if fileAccess is not None else FileAccessOptions()
+
+        # Per-thread state of the file being processed, as runs can overlap
+        self._processingState = threading.local()
+
         self.onProcessing = lambda filePath: True
+        self.metrics = None
+
+    def getFileAccess(self):
+        return self._fileAccess
 
     def applyTo(self, rootDir):
+        """
+        Processes the matching files below "rootDir"; in atomic mode,
+        every directory is synced just once, at the end
+        """
         if not os.path.isdir(rootDir):
             raise ValueError("Root dir must be a directory")
 
-        for dirPath, dirNames, fileNames in os.walk(rootDir):
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.start()
+
+        try:
+            with DirectorySyncBatch() as directorySyncBatch:
+                for filePath in self._listMatchingFiles(rootDir):
+                    self._processMatchingFile(filePath, directorySyncBatch)
+        finally:
+            if metrics is not None:
+                metrics.finish()
+
+    def _listMatchingFiles(self, rootDir):
+        """
+        Iterates over the paths of the matching files below "rootDir", updating the metrics
+        """
+        metrics = self.metrics
+        walker = os.walk(rootDir)
+
+        while True:
+            walkStartTime = time.perf_counter()
+            dirTuple = next(walker, None)
+
+            if dirTuple is None:
+                return
+
+            dirPath, _, fileNames = dirTuple
+
+            if metrics is not None:
+                metrics.recordWalk(time.perf_counter() - walkStartTime, len(fileNames))
+
             for fileName in fileNames:
                 filePath = os.path.join(dirPath, fileName)
 
-                if self._filePathPattern.match(filePath) is not None:
-                    if self.onProcessing(filePath):
-                        self._processFile(filePath)
+                if self._matches(filePath):
+                    if metrics is not None:
+                        metrics.recordMatch()
+
+                    yield filePath
+
+    def _processMatchingFile(self, filePath, directorySyncBatch=None):
+        """
+        Calls "onProcessing" and then _processFile(), updating the metrics;
+        returns None if the file was skipped, otherwise whether it was changed
+        """
+        metrics = self.metrics
+
+        if not self.onProcessing(filePath):
+            if metrics is not None:
+                metrics.recordSkip()
+
+            return None
+
+        if metrics is None:
+            return self._runProcessFile(filePath, directorySyncBatch)
+
+        bytesRead = os.stat(filePath).st_size
+        processingStartTime = time.perf_counter()
+
+        changed = self._runProcessFile(filePath, directorySyncBatch)
+
+        elapsedTime = time.perf_counter() - processingStartTime
+        bytesWritten = os.stat(filePath).st_size if changed else 0
+
+        metrics.recordProcessing(elapsedTime, changed, bytesRead, bytesWritten)
+
+        return changed
+
+    def _runProcessFile(self, filePath, directorySyncBatch):
+        """
+        Calls _processFile() - while it runs, _getDirectorySyncBatch() returns
+        "directorySyncBatch" on the current thread - and returns whether the file changed
+        """
+        processingState = self._processingState
+        previousDirectorySyncBatch = getattr(
+            processingState, "directorySyncBatch", None
+        )
+        processingState.directorySyncBatch = directorySyncBatch
+
+        try:
+            return self._processFile(filePath) is not False
+        finally:
+            processingState.directorySyncBatch = previousDirectorySyncBatch
+
+    def _matches(self, filePath):
+        """
+        Returns True if the file path matches the pattern of the processor
+        """
+        return self._filePathPattern.match(filePath) is not None
+
+    def _openTargetFile(self, filePath):
+        """
+        Opens the given file for writing, according to the FileAccessOptions
+        """
+        return self._fileAccess.openFile(filePath, "w", self._getDirectorySyncBatch())
+
+    def _getDirectorySyncBatch(self):
+        """
+        Returns the DirectorySyncBatch of the run processing a file on the current thread,
+        or None
+        """
+        return getattr(self._processingState, "directorySyncBatch", None)
 
     def _processFile(self, filePath):
         """
-        Performs the actual file processing; can return None
+        Performs the actual file processing, returning True if the file was changed
+        and False otherwise; None is considered as True
         """
         raise NotImplementedError
 
@@ -66,44 +538,75 @@ class HeaderRemover(FileTreeProcessor):
     Removes any file header ending with the "trailingPattern" regex
     """
 
-    def __init__(self, filePathPattern, trailingPattern):
-        super().__init__(filePathPattern)
+    def __init__(self, filePathPattern, trailingPattern, fileAccess=None):
+        super().__init__(filePathPattern, fileAccess)
 
-        if isinstance(trailingPattern, str):
-            self._trailingPattern = re.compile(trailingPattern)
-        else:
-            self._trailingPattern = trailingPattern
+        self._trailingPattern = self._fileAccess.compilePattern(trailingPattern)
 
     def _processFile(self, filePath):
-        with open(filePath, "r") as sourceFile:
+        with self._fileAccess.openFile(filePath) as sourceFile:
             fileContent = sourceFile.read()
             trailingMatch = self._trailingPattern.match(fileContent)
 
-        if trailingMatch is not None:
-            fileContent = fileContent[trailingMatch.end() :]
+        if trailingMatch is None:
+            return False
+
+        fileContent = fileContent[trailingMatch.end() :]
 
-            with open(filePath, "w") as targetFile:
-                targetFile.write(fileContent)
+        with self._openTargetFile(filePath) as targetFile:
+            targetFile.write(fileContent)
+
+        return True
 
 
 class FileTreeLineProcessor(FileTreeProcessor):
     """
-    Adds a granularity level to FileTreeProcessor, by introducing line filtering
+    Adds a granularity level to FileTreeProcessor, by introducing line filtering.
+
+    Lines are str objects - or bytes objects, when the FileAccessOptions are binary.
+
+    Files are read in batches of lines, passed to _processLines(): by default,
+    it calls _processLine() on every line, but subclasses can override it
+    to transform a whole batch at once - for example, via str.join() and a regex.
     """
 
+    # The approximate size, in characters or bytes, of each batch of lines
+    _batchSizeHint = 1024 * 1024
+
     def _processFile(self, filePath):
-        with open(filePath, "r") as sourceFile:
-            processedLines = [
-                processedLine
-                for processedLine in (
-                    self._processLine(sourceLine) for sourceLine in sourceFile
-                )
-                if processedLine is not None
-            ]
+        changed = False
+        processedLines = []
+
+        with self._fileAccess.openFile(filePath) as sourceFile:
+            while True:
+                sourceLines = sourceFile.readlines(self._batchSizeHint)
+                if not sourceLines:
+                    break
+
+                processedBatch = list(self._processLines(sourceLines))
+                changed = changed or processedBatch != sourceLines
+
+                processedLines.extend(processedBatch)
+
+        if not changed:
+            return False
 
-        with open(filePath, "w") as targetFile:
+        with self._openTargetFile(filePath) as targetFile:
             targetFile.writelines(processedLines)
 
+        return True
+
+    def _processLines(self, lines):
+        """
+        Returns an iterable of the processed lines - which can be more or fewer
+        than the given ones, and are written without separators
+        """
+        return [
+            processedLine
+            for processedLine in map(self._processLine, lines)
+            if processedLine is not None
+        ]
+
     def _processLine(self, line):
         """
         Returns the modified version of the line, or None if the line must be skipped
@@ -113,11 +616,294 @@ class FileTreeLineProcessor(FileTreeProcessor):
 
 class TrailingSpaceRemover(FileTreeLineProcessor):
     """
-    Removes trailing spaces from every line in the given file set, leaving each line's last newline if it's present
+    Removes trailing spaces from every line in the given file set, leaving each line's last newline if it's present.
+
+    In binary mode, only ASCII whitespace is removed.
+
+    Unless newlines are preserved in text mode, every file is processed as a whole
+    - splitting it, stripping its lines and joining them via C-level loops -
+    and rewritten only if it actually changed.
     """
 
+    # For binary content having "\r": the "\r" of every "\r\n" is kept
+    _binaryTrailingSpacePattern = re.compile(
+        rb"(?:[ \t\x0b\x0c]|\r(?!\n))+(?=\r?\n|\Z)"
+    )
+
+    def _processFile(self, filePath):
+        fileAccess = self._fileAccess
+
+        if fileAccess.isPreservingNewlines() and not fileAccess.isBinary():
+            return super()._processFile(filePath)
+
+        with fileAccess.openFile(filePath) as sourceFile:
+            fileContent = sourceFile.read()
+
+        if not isinstance(fileContent, bytes):
+            processedContent = "\n".join(map(str.rstrip, fileContent.split("\n")))
+        elif b"\r" in fileContent:
+            processedContent = self._binaryTrailingSpacePattern.sub(b"", fileContent)
+        else:
+            processedContent = b"\n".join(map(bytes.rstrip, fileContent.split(b"\n")))
+
+        if processedContent == fileContent:
+            return False
+
+        with self._openTargetFile(filePath) as targetFile:
+            targetFile.write(processedContent)
+
+        return True
+
     def _processLine(self, line):
-        if line.endswith("\n"):
-            return line.rstrip() + "\n"
+        # When newlines are preserved, a lone "\r" terminates a line as well
+        if isinstance(line, bytes):
+            newlines = (b"\r\n", b"\n", b"\r")
         else:
-            return line.rstrip()
+            newlines = ("\r\n", "\n", "\r")
+
+        for newline in newlines:
+            if line.endswith(newline):
+                return line.rstrip() + newline
+
+        return line.rstrip()
+
+
+class SearchReplaceProcessor(FileTreeProcessor):
+    """
+    Applies many replacements to every file, rewriting it only if it changed.
+
+    All the literal replacements are performed in a single pass, via one regex
+    alternating the literals - longest first, so that the longest match wins -
+    and a dictionary lookup of the replacement; the regex replacements are then
+    applied in order.
+
+    The literal pass is skipped for the files containing none of the literals,
+    detected via C-level substring checks - performed only when there are
+    at most _maxPrefilterLiteralCount literals, as each check scans the whole file.
+
+    The regex replacements, instead, are always applied to every matching file:
+    expensive patterns should be restricted via "filePathPattern".
+    """
+
+    # Beyond this number of literals, the substring checks cost more than the pass they skip
+    _maxPrefilterLiteralCount = 16
+
+    def __init__(
+        self,
+        filePathPattern,
+        literalReplacements=None,
+        regexReplacements=None,
+        fileAccess=None,
+    ):
+        """
+        --literalReplacements: a dictionary mapping each literal to its replacement
+
+        --regexReplacements: an iterable of (regex, replacement) pairs, where each regex
+          can be a string or a compiled pattern and each replacement is passed to re.sub()
+        """
+        super().__init__(filePathPattern, fileAccess)
+
+        encodeText = self._encodeText
+
+        self._literalReplacements = {
+            encodeText(literal): encodeText(replacement)
+            for literal, replacement in (literalReplacements or {}).items()
+            if literal
+        }
+
+        if self._literalReplacements:
+            self._literalPattern = re.compile(
+                encodeText("|").join(
+                    re.escape(literal)
+                    for literal in sorted(
+                        self._literalReplacements, key=len, reverse=True
+                    )
+                )
+            )
+        else:
+            self._literalPattern = None
+
+        if len(self._literalReplacements) <= self._maxPrefilterLiteralCount:
+            self._prefilterLiterals = tuple(self._literalReplacements)
+        else:
+            self._prefilterLiterals = None
+
+        self._regexReplacements = [
+            (
+                self._fileAccess.compilePattern(pattern),
+                replacement if callable(replacement) else encodeText(replacement),
+            )
+            for pattern, replacement in (regexReplacements or [])
+        ]
+
+    def _encodeText(self, text):
+        """
+        Encodes the given str in binary mode; otherwise, returns it unchanged
+        """
+        if self._fileAccess.isBinary() and isinstance(text, str):
+            return text.encode(self._fileAccess.getEncoding() or "utf-8")
+
+        return text
+
+    def _replaceLiteral(self, literalMatch):
+        return self._literalReplacements[literalMatch.group(0)]
+
+    def _processFile(self, filePath):
+        with self._fileAccess.openFile(filePath) as sourceFile:
+            fileContent = sourceFile.read()
+
+        processedContent = fileContent
+
+        literalPattern = self._literalPattern
+        prefilterLiterals = self._prefilterLiterals
+
+        if literalPattern is not None and (
+            prefilterLiterals is None
+            or any(literal in fileContent for literal in prefilterLiterals)
+        ):
+            processedContent = literalPattern.sub(
+                self._replaceLiteral, processedContent
+            )
+
+        for pattern, replacement in self._regexReplacements:
+            processedContent = pattern.sub(replacement, processedContent)
+
+        if processedContent == fileContent:
+            return False
+
+        with self._openTargetFile(filePath) as targetFile:
+            targetFile.write(processedContent)
+
+        return True
+
+
+class AsyncFileTreeDriver:
+    """
+    Applies a FileTreeProcessor from asyncio code, overlapping the listing
+    of the directories with the processing of up to "maxConcurrency" files at a time:
+    all the I/O is performed on a thread pool, so the event loop is never blocked
+    - which is especially convenient on high-latency network file systems.
+    """
+
+    def __init__(self, processor, maxConcurrency=8, executor=None):
+        """
+        --processor: the FileTreeProcessor whose onProcessing and _processFile() are called
+
+        --maxConcurrency: the maximum number of files processed at the same time
+
+        --executor: the executor running the I/O; by default, a dedicated
+          ThreadPoolExecutor is created - and shut down - by every run
+        """
+        self._processor = processor
+        self._maxConcurrency = maxConcurrency
+        self._executor = executor
+
+    def _processFile(self, filePath, directorySyncBatch):
+        """
+        Runs on the executor, returning a PathOperationResult - or None
+        if the file was rejected by the "onProcessing" field of the processor
+        """
+        try:
+            if (
+                self._processor._processMatchingFile(filePath, directorySyncBatch)
+                is None
+            ):
+                return None
+
+            return PathOperationResult(filePath, True)
+        except Exception as ex:
+            return PathOperationResult(filePath, False, ex)
+
+    async def iterate(self, rootDir):
+        """
+        Asynchronous generator processing the matching files below "rootDir"
+        and yielding a PathOperationResult for each processed file, as soon as it is ready;
+        the results of failed files carry the raised exception
+        """
+        if not os.path.isdir(rootDir):
+            raise ValueError("Root dir must be a directory")
+
+        loop = getRunningLoop()
+        processor = self._processor
+
+        ownedExecutor = None
+        executor = self._executor
+        if executor is None:
+            ownedExecutor = executor = ThreadPoolExecutor(self._maxConcurrency + 1)
+
+        directorySyncBatch = DirectorySyncBatch()
+
+        metrics = processor.metrics
+        if metrics is not None:
+            metrics.start()
+
+        pathQueue = asyncio.Queue(self._maxConcurrency * 2)
+        resultQueue = asyncio.Queue()
+
+        async def listFiles():
+            matchingFiles = processor._listMatchingFiles(rootDir)
+
+            while True:
+                filePath = await loop.run_in_executor(
+                    executor, next, matchingFiles, None
+                )
+                if filePath is None:
+                    return
+
+                await pathQueue.put(filePath)
+
+        async def processFiles():
+            while True:
+                filePath = await pathQueue.get()
+
+                try:
+                    result = await loop.run_in_executor(
+                        executor, self._processFile, filePath, directorySyncBatch
+                    )
+
+                    if result is not None:
+                        resultQueue.put_nowait(result)
+                finally:
+                    pathQueue.task_done()
+
+        async def awaitCompletion():
+            try:
+                await listingTask
+                await pathQueue.join()
+            finally:
+                resultQueue.put_nowait(None)
+
+        listingTask = asyncio.ensure_future(listFiles())
+        tasks = [listingTask, asyncio.ensure_future(awaitCompletion())] + [
+            asyncio.ensure_future(processFiles()) for _ in range(self._maxConcurrency)
+        ]
+
+        try:
+            while True:
+                result = await resultQueue.get()
+                if result is None:
+                    break
+
+                yield result
+
+            listingTask.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            if ownedExecutor is not None:
+                # Waits for the files still being processed after an early exit
+                await loop.run_in_executor(None, ownedExecutor.shutdown)
+
+            await loop.run_in_executor(self._executor, directorySyncBatch.sync)
+
+            if metrics is not None:
+                metrics.finish()
+
+    async def applyTo(self, rootDir):
+        """
+        Processes the matching files below "rootDir", returning the list of the results
+        """
+        return [result async for result in self.iterate(rootDir)]
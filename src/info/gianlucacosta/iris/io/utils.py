@@ -4,8 +4,19 @@ I/O utilities
 :copyright: Copyright (C) 2013-2022 Gianluca Costa.
 :license: LGPLv3, see LICENSE for details.
 """
+import errno
 import os
 import shutil
+import stat
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 class PathOperations:
@@ -63,6 +74,292 @@ class PathOperations:
 
         return not os.path.exists(rootPath)
 
+    @staticmethod
+    def runInParallel(operation, items, maxWorkers=None):
+        """
+        Applies operation(item) to every item on a thread pool having at most
+        "maxWorkers" threads (1 means no thread pool), returning the list of
+        PathOperationResult's, in the same order as the items: each item is
+        successful unless the operation raises an OSError
+        """
+
+        def runOperation(item):
+            try:
+                operation(item)
+                return PathOperationResult(item, True)
+            except OSError as ex:
+                return PathOperationResult(item, False, ex)
+
+        if maxWorkers == 1:
+            return [runOperation(item) for item in items]
+
+        with ThreadPoolExecutor(maxWorkers) as executor:
+            return list(executor.map(runOperation, items))
+
+    @staticmethod
+    def _getLeafPaths(paths):
+        """
+        Returns the normalized paths that are not ancestors of other paths in the set
+        """
+        normalizedPaths = {os.path.normpath(path) for path in paths}
+        ancestorPaths = set()
+
+        for path in normalizedPaths:
+            parentPath = os.path.dirname(path)
+
+            while parentPath and parentPath not in ancestorPaths:
+                ancestorPaths.add(parentPath)
+
+                grandParentPath = os.path.dirname(parentPath)
+                if grandParentPath == parentPath:
+                    break
+
+                parentPath = grandParentPath
+
+        return sorted(normalizedPaths - ancestorPaths)
+
+    @staticmethod
+    def bulkMakeDirs(paths, mode=0o777, maxWorkers=None):
+        """
+        Creates all the given directory paths - with their intermediate directories -
+        in parallel, returning a list of PathOperationResult's, one per path:
+        a result is successful if the directory exists at the end of the operation.
+
+        Duplicate paths, as well as paths that are ancestors of other paths,
+        are created just once.
+        """
+        paths = list(paths)
+
+        leafResults = {
+            result.getPath(): result
+            for result in PathOperations.runInParallel(
+                lambda path: os.makedirs(path, mode, exist_ok=True),
+                PathOperations._getLeafPaths(paths),
+                maxWorkers,
+            )
+        }
+
+        results = []
+
+        for path in paths:
+            leafResult = leafResults.get(os.path.normpath(path))
+
+            if leafResult is not None:
+                results.append(
+                    PathOperationResult(
+                        path, leafResult.isSuccessful(), leafResult.getError()
+                    )
+                )
+            else:
+                results.append(PathOperationResult(path, os.path.isdir(path)))
+
+        return results
+
+    @staticmethod
+    def _makeParentDirs(paths, maxWorkers):
+        parentDirPaths = {os.path.dirname(path) for path in paths} - {""}
+
+        PathOperations.bulkMakeDirs(parentDirPaths, maxWorkers=maxWorkers)
+
+    @staticmethod
+    def bulkTouch(paths, maxWorkers=None):
+        """
+        Parallel version of touch(), creating the parent directories just once;
+        returns a list of PathOperationResult's, one per path
+        """
+        paths = list(paths)
+
+        PathOperations._makeParentDirs(paths, maxWorkers)
+
+        def touchFile(path):
+            with open(path, "wb"):
+                pass
+
+        return PathOperations.runInParallel(touchFile, paths, maxWorkers)
+
+    @staticmethod
+    def bulkRemove(paths, maxWorkers=None):
+        """
+        Removes all the given files in parallel, returning a list
+        of PathOperationResult's, one per path
+        """
+        return PathOperations.runInParallel(os.remove, list(paths), maxWorkers)
+
+    @staticmethod
+    def bulkCopy(sourceTargetPairs, maxWorkers=None):
+        """
+        Copies files - with their metadata - in parallel, given an iterable
+        of (source path, target path) pairs; the parent directories of the targets
+        are created just once. Returns a list of PathOperationResult's,
+        whose paths are the (source path, target path) pairs.
+        """
+        sourceTargetPairs = list(sourceTargetPairs)
+
+        PathOperations._makeParentDirs(
+            [targetPath for _, targetPath in sourceTargetPairs], maxWorkers
+        )
+
+        return PathOperations.runInParallel(
+            lambda pair: shutil.copy2(pair[0], pair[1]),
+            sourceTargetPairs,
+            maxWorkers,
+        )
+
+    @staticmethod
+    def parallelRmTree(rootPath, maxWorkers=None):
+        """
+        Deletes a tree, removing the subtrees of its root directory in parallel;
+        returns a list of PathOperationResult's - one for each entry of the root
+        directory, followed by one for the root itself
+        """
+
+        def removeEntry(entryPath):
+            if os.path.isdir(entryPath) and not os.path.islink(entryPath):
+                shutil.rmtree(entryPath)
+            else:
+                os.remove(entryPath)
+
+        try:
+            entryPaths = [
+                os.path.join(rootPath, entryName) for entryName in os.listdir(rootPath)
+            ]
+        except OSError as ex:
+            return [PathOperationResult(rootPath, False, ex)]
+
+        results = PathOperations.runInParallel(removeEntry, entryPaths, maxWorkers)
+
+        try:
+            os.rmdir(rootPath)
+            results.append(PathOperationResult(rootPath, True))
+        except OSError as ex:
+            results.append(PathOperationResult(rootPath, False, ex))
+
+        return results
+
+    # The FICLONE ioctl of Linux, creating a reflink on copy-on-write file systems
+    _FICLONE = 0x40049409
+
+    @staticmethod
+    def fastCopyFile(sourcePath, targetPath):
+        """
+        Copies the content and the metadata of a file, trying the fastest
+        technique available: a reflink (on copy-on-write file systems),
+        then os.copy_file_range(), os.sendfile() and, finally, a copy via userspace.
+
+        The copy is written to a temporary file in the target's directory, then renamed
+        over "targetPath": an interrupted copy never leaves a truncated target, and
+        a symbolic link at "targetPath" is replaced - instead of its destination.
+
+        Returns the name of the technique that performed the copy:
+        "reflink", "copy_file_range", "sendfile" or "userspace".
+        """
+        tempPath = AtomicFileWriter._getTempPath(targetPath)
+
+        try:
+            with open(sourcePath, "rb") as sourceFile, open(tempPath, "xb") as tempFile:
+                copyTechnique = PathOperations._copyFileContent(sourceFile, tempFile)
+
+            shutil.copystat(sourcePath, tempPath)
+            os.replace(tempPath, targetPath)
+        except BaseException:
+            PathOperations.safeRemove(tempPath)
+            raise
+
+        return copyTechnique
+
+    @staticmethod
+    def _copyFileContent(sourceFile, targetFile):
+        sourceFd = sourceFile.fileno()
+        targetFd = targetFile.fileno()
+
+        if fcntl is not None and sys.platform.startswith("linux"):
+            try:
+                fcntl.ioctl(targetFd, PathOperations._FICLONE, sourceFd)
+                return "reflink"
+            except OSError:
+                pass
+
+        fileSize = os.fstat(sourceFd).st_size
+
+        if hasattr(os, "copy_file_range"):
+            try:
+                PathOperations._copyWithKernel(
+                    lambda remaining: os.copy_file_range(sourceFd, targetFd, remaining),
+                    fileSize,
+                )
+                return "copy_file_range"
+            except OSError:
+                os.lseek(sourceFd, 0, os.SEEK_SET)
+                os.lseek(targetFd, 0, os.SEEK_SET)
+                os.ftruncate(targetFd, 0)
+
+        if hasattr(os, "sendfile"):
+            try:
+                PathOperations._copyWithKernel(
+                    lambda remaining: os.sendfile(targetFd, sourceFd, None, remaining),
+                    fileSize,
+                )
+                return "sendfile"
+            except OSError:
+                os.lseek(sourceFd, 0, os.SEEK_SET)
+                os.lseek(targetFd, 0, os.SEEK_SET)
+                os.ftruncate(targetFd, 0)
+
+        shutil.copyfileobj(sourceFile, targetFile, 1024 * 1024)
+        return "userspace"
+
+    @staticmethod
+    def _copyWithKernel(copyChunk, fileSize):
+        """
+        Calls copyChunk(remaining bytes) - returning the bytes copied - until the copy is complete
+        """
+        remaining = fileSize
+
+        while remaining > 0:
+            copiedBytes = copyChunk(min(remaining, 1 << 30))
+
+            if copiedBytes == 0:
+                break
+
+            remaining -= copiedBytes
+
+    @staticmethod
+    def fsyncDirectory(dirPath):
+        """
+        Flushes to disk the entries of the given directory - for example,
+        after creating, renaming or removing files in it. Returns False
+        if the platform does not support the operation.
+        """
+        try:
+            dirFd = os.open(dirPath, os.O_RDONLY)
+        except OSError:
+            return False
+
+        try:
+            os.fsync(dirFd)
+            return True
+        except OSError:
+            return False
+        finally:
+            os.close(dirFd)
+
+    @staticmethod
+    def atomicWrite(path, content, fsync=True, directorySyncBatch=None):
+        """
+        Atomically replaces the content of the given file with "content"
+        - a str, written as UTF-8, or bytes - via AtomicFileWriter
+        """
+        isText = isinstance(content, str)
+
+        with AtomicFileWriter(
+            path,
+            "w" if isText else "wb",
+            encoding="utf-8" if isText else None,
+            fsync=fsync,
+            directorySyncBatch=directorySyncBatch,
+        ) as targetFile:
+            targetFile.write(content)
+
     @staticmethod
     def linearWalk(rootPath, currentDirFilter=None):
         """
@@ -94,6 +391,156 @@ class PathOperations:
                 yield LinearWalkItem(dirPath, fileName)
 
 
+class TreeSynchronizer:
+    """
+    Mirrors the files of a source tree into a target tree, copying only the files
+    whose size or modification time differ, in parallel and via PathOperations.fastCopyFile().
+
+    Only files are synchronized: empty source directories are not replicated.
+    """
+
+    def __init__(
+        self,
+        maxWorkers=None,
+        deleteExtraneous=False,
+        modifyWindow=0,
+        currentDirFilter=None,
+    ):
+        """
+        --maxWorkers: the maximum number of concurrent copies
+
+        --deleteExtraneous: if True, target files missing from the source tree are deleted
+
+        --modifyWindow: the maximum difference, in seconds, between modification times
+          still considered equal - useful for file systems having coarse timestamps
+
+        --currentDirFilter: passed to PathOperations.linearWalk() when walking the source tree
+        """
+        self._maxWorkers = maxWorkers
+        self._deleteExtraneous = deleteExtraneous
+        self._modifyWindowNs = int(modifyWindow * 1e9)
+        self._currentDirFilter = currentDirFilter
+
+    def _isUpToDate(self, sourceStat, targetPath):
+        try:
+            targetStat = os.lstat(targetPath)
+        except OSError:
+            return False
+
+        return (
+            stat.S_ISREG(targetStat.st_mode)
+            and sourceStat.st_size == targetStat.st_size
+            and abs(sourceStat.st_mtime_ns - targetStat.st_mtime_ns)
+            <= self._modifyWindowNs
+        )
+
+    def sync(self, sourceRootPath, targetRootPath):
+        """
+        Synchronizes the target tree with the source tree, returning a TreeSyncReport
+        """
+        if not os.path.isdir(sourceRootPath):
+            raise ValueError("Source root must be a directory")
+
+        copyPairs = []
+        sourceRelativePaths = set()
+        skippedCount = 0
+
+        for item in PathOperations.linearWalk(sourceRootPath, self._currentDirFilter):
+            sourcePath = item.getPath()
+            relativePath = os.path.relpath(sourcePath, sourceRootPath)
+            targetPath = os.path.join(targetRootPath, relativePath)
+
+            sourceRelativePaths.add(relativePath)
+
+            if self._isUpToDate(os.stat(sourcePath), targetPath):
+                skippedCount += 1
+            else:
+                copyPairs.append((sourcePath, targetPath))
+
+        PathOperations._makeParentDirs(
+            [targetPath for _, targetPath in copyPairs], self._maxWorkers
+        )
+
+        copyTechniques = {}
+
+        def copyFile(pair):
+            copyTechniques[pair] = PathOperations.fastCopyFile(*pair)
+
+        copyResults = PathOperations.runInParallel(
+            copyFile, copyPairs, self._maxWorkers
+        )
+
+        deletionResults = []
+
+        if self._deleteExtraneous and os.path.isdir(targetRootPath):
+            extraneousPaths = [
+                item.getPath()
+                for item in PathOperations.linearWalk(targetRootPath)
+                if os.path.relpath(item.getPath(), targetRootPath)
+                not in sourceRelativePaths
+            ]
+
+            deletionResults = PathOperations.bulkRemove(
+                extraneousPaths, self._maxWorkers
+            )
+
+        return TreeSyncReport(
+            copyResults, copyTechniques, skippedCount, deletionResults
+        )
+
+
+class TreeSyncReport:
+    """
+    Describes the outcome of TreeSynchronizer.sync()
+    """
+
+    def __init__(self, copyResults, copyTechniques, skippedCount, deletionResults):
+        self._copyResults = copyResults
+        self._copyTechniques = copyTechniques
+        self._skippedCount = skippedCount
+        self._deletionResults = deletionResults
+
+    def getCopyResults(self):
+        """
+        Returns the PathOperationResult's of the copies, whose paths are
+        (source path, target path) pairs
+        """
+        return self._copyResults
+
+    def getCopiedCount(self):
+        return sum(1 for result in self._copyResults if result.isSuccessful())
+
+    def getSkippedCount(self):
+        """
+        Returns the number of files skipped because already up to date
+        """
+        return self._skippedCount
+
+    def getDeletionResults(self):
+        """
+        Returns the PathOperationResult's of the deletions of extraneous target files
+        """
+        return self._deletionResults
+
+    def getFailedResults(self):
+        return [
+            result
+            for result in self._copyResults + self._deletionResults
+            if not result.isSuccessful()
+        ]
+
+    def getCopyTechniqueCounts(self):
+        """
+        Returns a dict mapping each copy technique to the number of files it copied
+        """
+        result = {}
+
+        for copyTechnique in self._copyTechniques.values():
+            result[copyTechnique] = result.get(copyTechnique, 0) + 1
+
+        return result
+
+
 class LinearWalkItem:
     """
     An item created by PathOperations.linearWalk()
@@ -108,3 +555,257 @@ class LinearWalkItem:
         Returns the path of the item, obtained by joining its dir path and its basename
         """
         return os.path.join(self.dirPath, self.baseName)
+
+
+class PathOperationResult:
+    """
+    The outcome of a bulk operation on a single path
+    """
+
+    def __init__(self, path, successful, error=None):
+        self._path = path
+        self._successful = successful
+        self._error = error
+
+    def getPath(self):
+        return self._path
+
+    def isSuccessful(self):
+        return self._successful
+
+    def getError(self):
+        """
+        Returns the OSError raised by the operation, or None
+        """
+        return self._error
+
+    def __repr__(self):
+        return "PathOperationResult({0!r}, {1!r}, {2!r})".format(
+            self._path, self._successful, self._error
+        )
+
+
+class DirectorySyncBatch:
+    """
+    Collects directories whose entries must be flushed to disk,
+    so that each one is synced just once - by sync() or on context exit -
+    however many files were atomically written into it
+    """
+
+    def __init__(self):
+        self._dirPaths = set()
+        self._lock = threading.Lock()
+
+    def add(self, dirPath):
+        with self._lock:
+            self._dirPaths.add(dirPath)
+
+    def sync(self):
+        """
+        Syncs every collected directory, then empties the batch
+        """
+        with self._lock:
+            dirPaths = self._dirPaths
+            self._dirPaths = set()
+
+        for dirPath in dirPaths:
+            PathOperations.fsyncDirectory(dirPath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.sync()
+
+
+class AtomicFileWriter:
+    """
+    Context manager returning a file object that writes to a temporary file
+    in the same directory as "path": on successful exit, the temporary file
+    is flushed, synced to disk, given the permissions of the original file
+    (if any) and renamed over "path"; on error, it is simply deleted.
+
+    Readers therefore see either the old or the new content, even after a crash.
+
+    Symbolic links are preserved, as the file they point to is the one replaced;
+    files having more than one hard link are rejected with an OSError (EMLINK),
+    because the replacement would detach "path" from its other links.
+
+    The directory entry is synced too - immediately, or via the given DirectorySyncBatch.
+    """
+
+    _tempFileSuffix = ".tmp"
+
+    @staticmethod
+    def isTempFileName(fileName):
+        """
+        Returns True if the given basename belongs to a temporary file
+        created by AtomicFileWriter
+        """
+        return fileName.startswith(".") and fileName.endswith(
+            AtomicFileWriter._tempFileSuffix
+        )
+
+    @staticmethod
+    def _getTempPath(path):
+        """
+        Returns a unique temporary path, in the same directory as "path"
+        """
+        dirPath, baseName = os.path.split(path)
+
+        return os.path.join(
+            dirPath,
+            ".{0}.{1}{2}".format(
+                baseName, uuid.uuid4().hex, AtomicFileWriter._tempFileSuffix
+            ),
+        )
+
+    def __init__(
+        self,
+        path,
+        mode="w",
+        encoding=None,
+        errors=None,
+        newline=None,
+        buffering=-1,
+        fsync=True,
+        directorySyncBatch=None,
+    ):
+        assert "w" in mode
+
+        self._path = path
+        self._mode = mode
+        self._encoding = encoding
+        self._errors = errors
+        self._newline = newline
+        self._buffering = buffering
+        self._fsync = fsync
+        self._directorySyncBatch = directorySyncBatch
+
+        self._targetPath = None
+        self._tempPath = None
+        self._tempFile = None
+
+    def __enter__(self):
+        self._targetPath = os.path.realpath(self._path)
+
+        try:
+            linkCount = os.stat(self._targetPath).st_nlink
+        except FileNotFoundError:
+            linkCount = 1
+
+        if linkCount > 1:
+            raise OSError(
+                errno.EMLINK,
+                "Atomic writes would break the hard links of the file",
+                self._path,
+            )
+
+        self._tempPath = self._getTempPath(self._targetPath)
+
+        tempFd = os.open(
+            self._tempPath,
+            os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0),
+            0o666,
+        )
+
+        try:
+            self._tempFile = open(
+                tempFd,
+                self._mode,
+                buffering=self._buffering,
+                encoding=self._encoding,
+                errors=self._errors,
+                newline=self._newline,
+            )
+        except Exception:
+            os.close(tempFd)
+            os.remove(self._tempPath)
+            raise
+
+        return self._tempFile
+
+    def __exit__(self, excType, excValue, traceback):
+        tempFile = self._tempFile
+
+        if excType is not None:
+            tempFile.close()
+            PathOperations.safeRemove(self._tempPath)
+            return False
+
+        try:
+            tempFile.flush()
+
+            if self._fsync:
+                os.fsync(tempFile.fileno())
+
+            tempFile.close()
+
+            try:
+                os.chmod(self._tempPath, os.stat(self._targetPath).st_mode & 0o7777)
+            except FileNotFoundError:
+                pass
+
+            os.replace(self._tempPath, self._targetPath)
+        except BaseException:
+            tempFile.close()
+            PathOperations.safeRemove(self._tempPath)
+            raise
+
+        if self._fsync:
+            dirPath = os.path.dirname(self._targetPath)
+
+            if self._directorySyncBatch is not None:
+                self._directorySyncBatch.add(dirPath)
+            else:
+                PathOperations.fsyncDirectory(dirPath)
+
+        return False
+
+
+class DirectoryLock:
+    """
+    Context manager holding an exclusive, advisory lock on a directory:
+    it is based on flock() - hence effective across processes - where available,
+    otherwise it only serializes the threads of the current process.
+
+    The lock is not reentrant.
+    """
+
+    _localLocks = {}
+    _localLocksLock = threading.Lock()
+
+    def __init__(self, dirPath):
+        self._dirPath = dirPath
+        self._dirFd = None
+
+        with DirectoryLock._localLocksLock:
+            self._localLock = DirectoryLock._localLocks.setdefault(
+                os.path.realpath(dirPath), threading.Lock()
+            )
+
+    def __enter__(self):
+        self._localLock.acquire()
+
+        if fcntl is not None:
+            try:
+                self._dirFd = os.open(self._dirPath, os.O_RDONLY)
+                fcntl.flock(self._dirFd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._dirFd is not None:
+                    os.close(self._dirFd)
+                    self._dirFd = None
+
+                self._localLock.release()
+                raise
+
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if self._dirFd is not None:
+            os.close(self._dirFd)
+            self._dirFd = None
+
+        self._localLock.release()
+
+        return False
@@ -0,0 +1,424 @@
+"""
+Directory-watching utilities
+
+:copyright: Copyright (C) 2013-2022 Gianluca Costa.
+:license: LGPLv3, see LICENSE for details.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+
+class DirectoryWatcher:
+    """
+    Keeps an in-memory set of the names of the entries in a directory,
+    notifying listeners whenever an entry appears or disappears.
+
+    Subclasses detect the changes in a background daemon thread,
+    started by start() and stopped by stop(); the set is replaced atomically
+    on every change, so reading it requires no locking.
+
+    If "ignoreDirs" is True, subdirectories are not part of the entry set.
+    """
+
+    @staticmethod
+    def create(dirPath, pollInterval=0.1, ignoreDirs=False):
+        """
+        Returns an InotifyDirectoryWatcher, if inotify is supported,
+        or a PollingDirectoryWatcher checking the directory every "pollInterval" seconds
+        """
+        if InotifyDirectoryWatcher.isSupported():
+            return InotifyDirectoryWatcher(dirPath, ignoreDirs)
+
+        return PollingDirectoryWatcher(dirPath, pollInterval, ignoreDirs)
+
+    def __init__(self, dirPath, ignoreDirs=False):
+        self._dirPath = dirPath
+        self._ignoreDirs = ignoreDirs
+        self._entryNames = frozenset()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+    def getDirPath(self):
+        return self._dirPath
+
+    def start(self):
+        """
+        Scans the directory and starts watching it
+        """
+        self._stopEvent.clear()
+        self._startWatching()
+        self._rescan()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops watching the directory, waiting for the background thread to end
+        """
+        self._stopEvent.set()
+        self._stopWatching()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def isRunning(self):
+        """
+        Returns True if the watching thread is alive - for example,
+        it ends when the watched directory is removed
+        """
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def contains(self, entryName):
+        """
+        Returns True if the given entry name is currently in the directory
+        """
+        return entryName in self._entryNames
+
+    def getEntryNames(self):
+        """
+        Returns the frozenset of the entry names currently in the directory
+        """
+        return self._entryNames
+
+    def addListener(self, listener):
+        """
+        Registers a function called as listener(entryName, exists)
+        whenever an entry appears or disappears
+        """
+        with self._lock:
+            self._listeners = self._listeners + [listener]
+
+    def removeListener(self, listener):
+        with self._lock:
+            self._listeners = [
+                currentListener
+                for currentListener in self._listeners
+                if currentListener is not listener
+            ]
+
+    def notifyChange(self, entryName, exists):
+        """
+        Updates the entry set, notifying the listeners if it actually changed;
+        besides being called by the watching thread, it can be called to make
+        a change performed by the current process visible without delay
+        """
+        with self._lock:
+            if (entryName in self._entryNames) == exists:
+                return
+
+            if exists:
+                self._entryNames = self._entryNames.union((entryName,))
+            else:
+                self._entryNames = self._entryNames.difference((entryName,))
+
+            listeners = self._listeners
+
+        for listener in listeners:
+            listener(entryName, exists)
+
+    def _rescan(self):
+        """
+        Lists the directory, notifying the differences with the current entry set
+        """
+        try:
+            if self._ignoreDirs:
+                with os.scandir(self._dirPath) as entries:
+                    newEntryNames = frozenset(
+                        entry.name
+                        for entry in entries
+                        if not entry.is_dir(follow_symlinks=False)
+                    )
+            else:
+                newEntryNames = frozenset(os.listdir(self._dirPath))
+        except OSError:
+            newEntryNames = frozenset()
+
+        currentEntryNames = self._entryNames
+
+        for entryName in currentEntryNames - newEntryNames:
+            self.notifyChange(entryName, False)
+
+        for entryName in newEntryNames - currentEntryNames:
+            self.notifyChange(entryName, True)
+
+    def _startWatching(self):
+        """
+        Called by start(), just before the initial scan
+        """
+        pass
+
+    def _stopWatching(self):
+        """
+        Called by stop(), to wake up the watching thread
+        """
+        pass
+
+    def _run(self):
+        """
+        The body of the watching thread
+        """
+        raise NotImplementedError
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.stop()
+
+
+class PollingDirectoryWatcher(DirectoryWatcher):
+    """
+    Portable DirectoryWatcher, checking the modification time of the directory
+    every "pollInterval" seconds and listing it only when it might have changed
+    """
+
+    # Changes occurring within the timestamp granularity of the file system
+    # do not alter the modification time: recently-modified directories are always listed
+    _RECENT_CHANGE_WINDOW = 1.0
+
+    def __init__(self, dirPath, pollInterval=0.1, ignoreDirs=False):
+        super().__init__(dirPath, ignoreDirs)
+
+        self._pollInterval = pollInterval
+        self._lastModificationTime = None
+
+    def _rescan(self):
+        try:
+            self._lastModificationTime = os.stat(self._dirPath).st_mtime_ns
+        except OSError:
+            self._lastModificationTime = None
+
+        super()._rescan()
+
+    def _run(self):
+        while not self._stopEvent.wait(self._pollInterval):
+            try:
+                modificationTime = os.stat(self._dirPath).st_mtime_ns
+            except OSError:
+                modificationTime = None
+
+            isRecentlyModified = (
+                modificationTime is not None
+                and time.time() - modificationTime / 1e9 < self._RECENT_CHANGE_WINDOW
+            )
+
+            if modificationTime != self._lastModificationTime or isRecentlyModified:
+                self._rescan()
+
+
+class InotifyDirectoryWatcher(DirectoryWatcher):
+    """
+    DirectoryWatcher relying on Linux's inotify, loaded via ctypes:
+    changes are detected as soon as they happen, without polling
+    """
+
+    _IN_MOVED_FROM = 0x00000040
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_DELETE_SELF = 0x00000400
+    _IN_MOVE_SELF = 0x00000800
+    _IN_Q_OVERFLOW = 0x00004000
+    _IN_ONLYDIR = 0x01000000
+    _IN_ISDIR = 0x40000000
+    _IN_NONBLOCK = 0o4000
+    _IN_CLOEXEC = 0o2000000
+
+    _eventHeader = struct.Struct("iIII")
+
+    _libc = None
+    _libcLoaded = False
+
+    @classmethod
+    def _loadLibc(cls):
+        if not cls._libcLoaded:
+            try:
+                libc = ctypes.CDLL(
+                    ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+                )
+
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [
+                    ctypes.c_int,
+                    ctypes.c_char_p,
+                    ctypes.c_uint32,
+                ]
+
+                cls._libc = libc
+            except (OSError, AttributeError):
+                cls._libc = None
+
+            cls._libcLoaded = True
+
+        return cls._libc
+
+    @classmethod
+    def isSupported(cls):
+        """
+        Returns True if inotify is available on the current platform
+        """
+        return cls._loadLibc() is not None
+
+    def __init__(self, dirPath, ignoreDirs=False):
+        super().__init__(dirPath, ignoreDirs)
+
+        self._inotifyFd = None
+        self._wakeUpPipe = None
+
+    def _startWatching(self):
+        libc = self._loadLibc()
+
+        inotifyFd = libc.inotify_init1(self._IN_NONBLOCK | self._IN_CLOEXEC)
+        if inotifyFd < 0:
+            errorNumber = ctypes.get_errno()
+            raise OSError(errorNumber, os.strerror(errorNumber))
+
+        watchDescriptor = libc.inotify_add_watch(
+            inotifyFd,
+            os.fsencode(self._dirPath),
+            self._IN_CREATE
+            | self._IN_DELETE
+            | self._IN_MOVED_FROM
+            | self._IN_MOVED_TO
+            | self._IN_DELETE_SELF
+            | self._IN_MOVE_SELF
+            | self._IN_ONLYDIR,
+        )
+        if watchDescriptor < 0:
+            errorNumber = ctypes.get_errno()
+            os.close(inotifyFd)
+            raise OSError(errorNumber, os.strerror(errorNumber), self._dirPath)
+
+        self._inotifyFd = inotifyFd
+        self._wakeUpPipe = os.pipe()
+
+    def _stopWatching(self):
+        wakeUpPipe = self._wakeUpPipe
+
+        if wakeUpPipe is not None:
+            try:
+                os.write(wakeUpPipe[1], b"\0")
+            except OSError:
+                pass
+
+    def _run(self):
+        inotifyFd = self._inotifyFd
+        wakeUpFd = self._wakeUpPipe[0]
+
+        try:
+            while not self._stopEvent.is_set():
+                readyFds, _, _ = select.select([inotifyFd, wakeUpFd], [], [])
+
+                if inotifyFd in readyFds and not self._processEvents(inotifyFd):
+                    break
+        finally:
+            os.close(inotifyFd)
+            os.close(self._wakeUpPipe[0])
+            os.close(self._wakeUpPipe[1])
+            self._inotifyFd = None
+            self._wakeUpPipe = None
+
+    def _processEvents(self, inotifyFd):
+        """
+        Applies the pending inotify events; returns False if the directory
+        is no more available for watching
+        """
+        try:
+            buffer = os.read(inotifyFd, 64 * 1024)
+        except BlockingIOError:
+            return True
+
+        headerSize = self._eventHeader.size
+        offset = 0
+
+        while offset + headerSize <= len(buffer):
+            _, mask, _, nameLength = self._eventHeader.unpack_from(buffer, offset)
+            offset += headerSize
+
+            entryName = os.fsdecode(buffer[offset : offset + nameLength].rstrip(b"\0"))
+            offset += nameLength
+
+            if mask & self._IN_Q_OVERFLOW:
+                self._rescan()
+            elif mask & (self._IN_DELETE_SELF | self._IN_MOVE_SELF):
+                self._rescan()
+                return False
+            elif self._ignoreDirs and mask & self._IN_ISDIR:
+                continue
+            elif mask & (self._IN_CREATE | self._IN_MOVED_TO):
+                self.notifyChange(entryName, True)
+            elif mask & (self._IN_DELETE | self._IN_MOVED_FROM):
+                self.notifyChange(entryName, False)
+
+        return True
+
+
+class SharedDirectoryWatchers:
+    """
+    Process-wide registry of running InotifyDirectoryWatcher objects,
+    shared - via reference counting - by all the clients watching the same directory;
+    such watchers ignore subdirectories
+    """
+
+    _lock = threading.Lock()
+    _entries = {}
+
+    @classmethod
+    def acquire(cls, dirPath):
+        """
+        Returns a running watcher for the given directory, or None if inotify
+        is not supported or the directory cannot be watched;
+        every returned watcher must be passed to release() when no more needed
+        """
+        if not InotifyDirectoryWatcher.isSupported():
+            return None
+
+        key = os.path.realpath(dirPath)
+
+        with cls._lock:
+            entry = cls._entries.get(key)
+
+            if entry is not None and entry[0].isRunning():
+                entry[1] += 1
+                return entry[0]
+
+            watcher = InotifyDirectoryWatcher(dirPath, ignoreDirs=True)
+
+            try:
+                watcher.start()
+            except OSError:
+                return None
+
+            cls._entries[key] = [watcher, 1]
+
+            return watcher
+
+    @classmethod
+    def release(cls, watcher):
+        """
+        Releases a watcher returned by acquire(), stopping it when no more in use
+        """
+        with cls._lock:
+            for key, entry in list(cls._entries.items()):
+                if entry[0] is watcher:
+                    entry[1] -= 1
+
+                    if entry[1] > 0:
+                        return
+
+                    del cls._entries[key]
+                    break
+
+        watcher.stop()
@@ -4,6 +4,12 @@ Inversion of Control utilities
 :copyright: Copyright (C) 2013-2022 Gianluca Costa.
 :license: LGPLv3, see LICENSE for details.
 """
+import bisect
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 
 class ContainerRegistration:
@@ -25,6 +31,21 @@ class ContainerRegistration:
         """
         raise NotImplementedError
 
+    def getDependencies(self):
+        """
+        Returns the keys explicitly declared as dependencies of the registration;
+        they are merged with the ones recorded by the container at resolution time
+        """
+        return ()
+
+    def warmUp(self, container, key):
+        """
+        Called by the container's warmUp() method: registrations creating
+        eager-capable instances (such as singletons) should create them
+        and return True; the default implementation does nothing and returns False
+        """
+        return False
+
 
 class TransientRegistration(ContainerRegistration):
     """
@@ -33,22 +54,34 @@ class TransientRegistration(ContainerRegistration):
     disposal of every instance is left to the client.
     """
 
-    def __init__(self, factoryMethod):
+    def __init__(self, factoryMethod, dependencies=None):
         """
         The passed factory method will be called to create each object instance;
         the arguments passed each time are (container, key)
+
+        "dependencies" is an optional iterable of the keys resolved by the factory method
         """
         if factoryMethod is None:
             raise ValueError("Invalid factory method")
 
         self._factoryMethod = factoryMethod
+        self._dependencies = tuple(dependencies) if dependencies is not None else ()
 
     def resolve(self, container, key):
-        return self._factoryMethod(container, key)
+        # Outside factory methods, a transient instance is nobody's dependency, so no
+        # bookkeeping is needed: its own dependencies are recorded whenever
+        # it is resolved from within another factory method
+        if not container._resolutionStacks and container._instrumentation is None:
+            return self._factoryMethod(container, key)
+
+        return _callFactory(container, key, self, self._factoryMethod)
 
     def dispose(self):
         pass
 
+    def getDependencies(self):
+        return self._dependencies
+
 
 class SingletonRegistration(ContainerRegistration):
     """
@@ -56,26 +89,39 @@ class SingletonRegistration(ContainerRegistration):
     for the first time: subsequent calls to resolve() will return the same instance.
     """
 
-    def __init__(self, factoryMethod, disposeMethod=None):
+    def __init__(self, factoryMethod, disposeMethod=None, dependencies=None):
         """
         --factoryMethod is the factory method called when the singleton instance is created:
           its parameters are (container, key)
 
         --disposeMethod is optional. If specified, it's called, if the instance was created,
           when the container's dispose() method is called; it takes a single parameter: (instance)
+
+        --dependencies is optional: an iterable of the keys resolved by the factory method,
+          employed by the container's warmUp() to schedule the instantiation
         """
         if factoryMethod is None:
             raise ValueError("Invalid factory method")
 
         self._factoryMethod = factoryMethod
         self._disposeMethod = disposeMethod
+        self._dependencies = tuple(dependencies) if dependencies is not None else ()
         self._instance = None
+        self._lock = threading.RLock()
 
     def resolve(self, container, key):
-        if self._instance is None:
-            self._instance = self._factoryMethod(container, key)
+        instance = self._instance
 
-        return self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = _callFactory(
+                        container, key, self, self._factoryMethod
+                    )
+
+                instance = self._instance
+
+        return instance
 
     def dispose(self):
         instance = self._instance
@@ -83,6 +129,292 @@ class SingletonRegistration(ContainerRegistration):
         if (instance is not None) and (self._disposeMethod is not None):
             self._disposeMethod(instance)
 
+    def getDependencies(self):
+        return self._dependencies
+
+    def warmUp(self, container, key):
+        self.resolve(container, key)
+        return True
+
+
+def _callFactory(container, key, registration, factoryMethod):
+    """
+    Calls factoryMethod(container, key), letting the container record the dependencies
+    resolved meanwhile and notifying the container's instrumentation, if any
+    """
+    instrumentation = container.getInstrumentation()
+
+    if instrumentation is None:
+        return container._runFactory(key, factoryMethod)
+
+    startTime = time.perf_counter()
+    try:
+        result = container._runFactory(key, factoryMethod)
+    except Exception as ex:
+        instrumentation.onFactoryCalled(
+            key, registration, time.perf_counter() - startTime, ex
+        )
+        raise
+
+    instrumentation.onFactoryCalled(
+        key, registration, time.perf_counter() - startTime, None
+    )
+
+    return result
+
+
+class ContainerInstrumentation:
+    """
+    Hooks notified by a container having instrumentation enabled.
+
+    Every method does nothing by default, so that subclasses - for example,
+    adapters to a tracing or metrics library - only need to override
+    the hooks they are interested in.
+    """
+
+    def onResolved(self, key, elapsedTime, error):
+        """
+        Called after every call to the container's resolve() method, with the time
+        it took in seconds; "error" is the raised exception, or None on success
+        """
+        pass
+
+    def onFactoryCalled(self, key, registration, elapsedTime, error):
+        """
+        Called after every call to the factory method of a registration,
+        with the time it took in seconds; "error" is the raised exception, or None on success
+        """
+        pass
+
+
+class CompositeInstrumentation(ContainerInstrumentation):
+    """
+    Forwards every notification to each of the given instrumentations, in order
+    """
+
+    def __init__(self, *instrumentations):
+        self._instrumentations = instrumentations
+
+    def onResolved(self, key, elapsedTime, error):
+        for instrumentation in self._instrumentations:
+            instrumentation.onResolved(key, elapsedTime, error)
+
+    def onFactoryCalled(self, key, registration, elapsedTime, error):
+        for instrumentation in self._instrumentations:
+            instrumentation.onFactoryCalled(key, registration, elapsedTime, error)
+
+
+class ResolutionStatistics(ContainerInstrumentation):
+    """
+    Instrumentation collecting, for each key: the number of resolutions,
+    the number of transient instances created and a histogram of factory latencies.
+
+    The histogram buckets are defined by "bucketBounds", a sorted sequence of
+    upper bounds in seconds; an additional bucket counts the slower calls.
+    """
+
+    DEFAULT_BUCKET_BOUNDS = (0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+
+    def __init__(self, bucketBounds=DEFAULT_BUCKET_BOUNDS):
+        self._bucketBounds = tuple(bucketBounds)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Discards all the collected data
+        """
+        with self._lock:
+            self._resolveCounts = {}
+            self._transientCounts = {}
+            self._factoryHistograms = {}
+            self._factoryTimes = {}
+
+    def onResolved(self, key, elapsedTime, error):
+        with self._lock:
+            self._resolveCounts[key] = self._resolveCounts.get(key, 0) + 1
+
+    def onFactoryCalled(self, key, registration, elapsedTime, error):
+        bucketIndex = bisect.bisect_left(self._bucketBounds, elapsedTime)
+
+        with self._lock:
+            histogram = self._factoryHistograms.get(key)
+            if histogram is None:
+                histogram = [0] * (len(self._bucketBounds) + 1)
+                self._factoryHistograms[key] = histogram
+
+            histogram[bucketIndex] += 1
+
+            self._factoryTimes[key] = self._factoryTimes.get(key, 0) + elapsedTime
+
+            if error is None and isinstance(registration, TransientRegistration):
+                self._transientCounts[key] = self._transientCounts.get(key, 0) + 1
+
+    def getBucketBounds(self):
+        """
+        Returns the upper bounds, in seconds, of the histogram buckets
+        """
+        return self._bucketBounds
+
+    def getResolveCounts(self):
+        """
+        Returns a dict mapping each key to the number of times it was resolved
+        """
+        with self._lock:
+            return dict(self._resolveCounts)
+
+    def getTransientCounts(self):
+        """
+        Returns a dict mapping each transient key to the number of instances created
+        """
+        with self._lock:
+            return dict(self._transientCounts)
+
+    def getFactoryHistograms(self):
+        """
+        Returns a dict mapping each key to the list of factory call counts per bucket
+        """
+        with self._lock:
+            return {
+                key: list(histogram)
+                for key, histogram in self._factoryHistograms.items()
+            }
+
+    def getFactoryTimes(self):
+        """
+        Returns a dict mapping each key to the overall seconds spent in its factory method
+        """
+        with self._lock:
+            return dict(self._factoryTimes)
+
+    def __str__(self):
+        resolveCounts = self.getResolveCounts()
+        transientCounts = self.getTransientCounts()
+        factoryTimes = self.getFactoryTimes()
+
+        lines = ["Resolutions  Transients  Factory time  Key"]
+
+        for key in sorted(
+            set(resolveCounts).union(factoryTimes),
+            key=lambda key: factoryTimes.get(key, 0),
+            reverse=True,
+        ):
+            lines.append(
+                "{0:>11}  {1:>10}  {2:>11.3f}s  {3!r}".format(
+                    resolveCounts.get(key, 0),
+                    transientCounts.get(key, 0),
+                    factoryTimes.get(key, 0),
+                    key,
+                )
+            )
+
+        return "\n".join(lines)
+
+
+class WarmUpReport:
+    """
+    Describes the outcome of Container.warmUp()
+    """
+
+    def __init__(self, levels, timings, totalTime):
+        self._levels = levels
+        self._timings = timings
+        self._totalTime = totalTime
+
+    def getLevels(self):
+        """
+        Returns the list of levels - each being a list of keys - in topological order:
+        the keys belonging to the same level were warmed up in parallel
+        """
+        return self._levels
+
+    def getTimings(self):
+        """
+        Returns a dict mapping each warmed-up key to the seconds spent creating its instance
+        """
+        return self._timings
+
+    def getTotalTime(self):
+        """
+        Returns the overall duration of the warmup, in seconds
+        """
+        return self._totalTime
+
+    def __str__(self):
+        return _formatTimings(
+            "Warmup completed in {0:.3f}s".format(self._totalTime), self._timings
+        )
+
+
+class DisposalReport:
+    """
+    Describes the outcome of Container.dispose()
+    """
+
+    def __init__(self, order, timings, timedOutKeys, errors, totalTime):
+        self._order = order
+        self._timings = timings
+        self._timedOutKeys = timedOutKeys
+        self._errors = errors
+        self._totalTime = totalTime
+
+    def getOrder(self):
+        """
+        Returns the list of keys, in the order their disposal started
+        """
+        return self._order
+
+    def getTimings(self):
+        """
+        Returns a dict mapping each key whose disposal completed
+        to the seconds it required
+        """
+        return self._timings
+
+    def getTimedOutKeys(self):
+        """
+        Returns the list of keys whose disposal exceeded the timeout
+        """
+        return self._timedOutKeys
+
+    def getErrors(self):
+        """
+        Returns a dict mapping each key whose disposal failed to the raised exception
+        """
+        return self._errors
+
+    def getTotalTime(self):
+        """
+        Returns the overall duration of the disposal, in seconds
+        """
+        return self._totalTime
+
+    def __str__(self):
+        lines = [
+            _formatTimings(
+                "Disposal completed in {0:.3f}s".format(self._totalTime), self._timings
+            )
+        ]
+
+        for key in self._timedOutKeys:
+            lines.append("  TIMEOUT  {0!r}".format(key))
+
+        for key, error in self._errors.items():
+            lines.append("  ERROR  {0!r}: {1}".format(key, error))
+
+        return "\n".join(lines)
+
+
+def _formatTimings(title, timings):
+    lines = [title]
+
+    for key, elapsedTime in sorted(
+        timings.items(), key=lambda item: item[1], reverse=True
+    ):
+        lines.append("  {0:.3f}s  {1!r}".format(elapsedTime, key))
+
+    return "\n".join(lines)
+
 
 class Container:
     """
@@ -90,8 +422,29 @@ class Container:
     but new registrations types can be created via OOP.
     """
 
-    def __init__(self):
+    def __init__(self, instrumentation=None):
+        """
+        "instrumentation" is an optional ContainerInstrumentation, notified
+        about resolutions and factory calls; when it is None, no measurement is performed
+        """
         self._registrations = {}
+        self._instrumentation = instrumentation
+        self._recordedDependencies = {}
+        self._resolvedKeys = OrderedDict()
+        # Maps the ident of every thread running factory methods to its stack of keys
+        self._resolutionStacks = {}
+
+    def getInstrumentation(self):
+        """
+        Returns the current ContainerInstrumentation, or None
+        """
+        return self._instrumentation
+
+    def setInstrumentation(self, instrumentation):
+        """
+        Sets the ContainerInstrumentation - or None, to disable instrumentation
+        """
+        self._instrumentation = instrumentation
 
     def addRegistration(self, key, registration):
         """
@@ -106,17 +459,23 @@ class Container:
         self._registrations[key] = registration
         return self
 
-    def registerTransient(self, key, factoryMethod):
+    def registerTransient(self, key, factoryMethod, dependencies=None):
         """
         Binds a factory method to a key: whenever the requested key is resolved,
         a new instance is created by calling factoryMethod(container, key).
 
         Transient instances are not managed by the container - it's up to the client
         to dispose of them.
+
+        "dependencies" optionally declares the keys resolved by the factory method.
         """
-        return self.addRegistration(key, TransientRegistration(factoryMethod))
+        return self.addRegistration(
+            key, TransientRegistration(factoryMethod, dependencies)
+        )
 
-    def registerSingleton(self, key, factoryMethod, disposeMethod=None):
+    def registerSingleton(
+        self, key, factoryMethod, disposeMethod=None, dependencies=None
+    ):
         """
         Binds a singleton instance to a key: whenever the requested key is resolved,
         if the instance is still None, it is created by calling factoryMethod(container, key);
@@ -124,9 +483,12 @@ class Container:
 
         When the client calls dispose() on the container, disposeMethod(instance) is called
         if the instance was previously created.
+
+        "dependencies" optionally declares the keys resolved by the factory method,
+        so that warmUp() can schedule the instantiation before any resolution took place.
         """
         return self.addRegistration(
-            key, SingletonRegistration(factoryMethod, disposeMethod)
+            key, SingletonRegistration(factoryMethod, disposeMethod, dependencies)
         )
 
     def resolve(self, key):
@@ -138,13 +500,349 @@ class Container:
         if registration is None:
             raise KeyError("Unknown key: '{0}'".format(key))
 
-        return registration.resolve(self, key)
+        if self._resolutionStacks:
+            self._recordDependency(key)
 
-    def dispose(self):
+        instrumentation = self._instrumentation
+
+        if instrumentation is None:
+            return registration.resolve(self, key)
+
+        startTime = time.perf_counter()
+        try:
+            result = registration.resolve(self, key)
+        except Exception as ex:
+            instrumentation.onResolved(key, time.perf_counter() - startTime, ex)
+            raise
+
+        instrumentation.onResolved(key, time.perf_counter() - startTime, None)
+
+        return result
+
+    def _recordDependency(self, key):
+        """
+        Records the key as a dependency of the key whose factory method
+        is running on the current thread, if any
+        """
+        resolutionStack = self._resolutionStacks.get(threading.get_ident())
+
+        if resolutionStack:
+            self._recordedDependencies.setdefault(resolutionStack[-1], set()).add(key)
+
+    def _runFactory(self, key, factoryMethod):
+        """
+        Calls factoryMethod(container, key), keeping track of the key so that
+        the keys resolved meanwhile are recorded as its dependencies;
+        the key is then recorded as resolved.
+
+        Only factory calls are tracked: resolving an existing instance costs no bookkeeping.
+        Each thread only alters its own entry of the stack dictionary, so no locking is needed.
+        """
+        threadId = threading.get_ident()
+        resolutionStacks = self._resolutionStacks
+        resolutionStack = resolutionStacks.get(threadId)
+
+        if resolutionStack is None:
+            resolutionStacks[threadId] = [key]
+            try:
+                result = factoryMethod(self, key)
+            finally:
+                del resolutionStacks[threadId]
+        else:
+            resolutionStack.append(key)
+            try:
+                result = factoryMethod(self, key)
+            finally:
+                resolutionStack.pop()
+
+        if key not in self._resolvedKeys:
+            self._resolvedKeys[key] = None
+
+        return result
+
+    def getDependencyGraph(self):
+        """
+        Returns a dict mapping each registered key to the set of keys it depends on:
+        both the dependencies declared by the registrations and the ones recorded
+        while resolving keys from within factory methods are included
+        """
+        return {
+            key: set(registration.getDependencies()).union(
+                self._recordedDependencies.get(key, ())
+            )
+            for key, registration in self._registrations.items()
+        }
+
+    def _computeWarmUpLevels(self):
+        """
+        Sorts the registered keys topologically, grouping in the same level
+        the keys whose dependencies all belong to previous levels
         """
-        Disposes every performed registration; the container can then be used again
+        dependencyGraph = self.getDependencyGraph()
+
+        for key, dependencies in dependencyGraph.items():
+            for dependency in dependencies:
+                if dependency not in dependencyGraph:
+                    raise KeyError(
+                        "Unknown dependency '{0}' of key '{1}'".format(dependency, key)
+                    )
+
+        levels = []
+        remainingGraph = dict(dependencyGraph)
+
+        while remainingGraph:
+            level = [
+                key
+                for key, dependencies in remainingGraph.items()
+                if not any(dependency in remainingGraph for dependency in dependencies)
+            ]
+
+            if not level:
+                raise ValueError(
+                    "Circular dependency among keys: {0}".format(
+                        ", ".join(repr(key) for key in remainingGraph)
+                    )
+                )
+
+            for key in level:
+                del remainingGraph[key]
+
+            levels.append(level)
+
+        return levels
+
+    def _warmUpKey(self, key):
+        registration = self._registrations[key]
+
+        startTime = time.perf_counter()
+        warmedUp = registration.warmUp(self, key)
+
+        return warmedUp, time.perf_counter() - startTime
+
+    def warmUp(self, maxWorkers=None):
         """
-        for registration in self._registrations.values():
-            registration.dispose()
+        Eagerly creates the instances of the registrations supporting it (such as singletons),
+        following the dependency graph returned by getDependencyGraph() in topological order:
+        the keys not depending on each other are warmed up in parallel, on a thread pool
+        having at most "maxWorkers" threads (1 means that no thread pool is used).
+
+        Dependencies that are neither declared nor recorded yet are simply resolved,
+        as usual, by the factory methods requiring them.
+
+        Returns a WarmUpReport, with the time spent on every warmed-up key.
+        """
+        startTime = time.perf_counter()
+
+        levels = self._computeWarmUpLevels()
+        timings = {}
+
+        if maxWorkers == 1:
+            for level in levels:
+                for key in level:
+                    warmedUp, elapsedTime = self._warmUpKey(key)
+
+                    if warmedUp:
+                        timings[key] = elapsedTime
+        else:
+            with ThreadPoolExecutor(maxWorkers) as executor:
+                for level in levels:
+                    futures = [
+                        (key, executor.submit(self._warmUpKey, key)) for key in level
+                    ]
+
+                    for key, future in futures:
+                        warmedUp, elapsedTime = future.result()
+
+                        if warmedUp:
+                            timings[key] = elapsedTime
+
+        return WarmUpReport(levels, timings, time.perf_counter() - startTime)
+
+    def _computeDisposalOrder(self):
+        """
+        Sorts the registered keys topologically, so that every instance is disposed
+        before its dependencies; ties are broken by disposing first the keys resolved last,
+        while the keys never resolved come last. Keys in circular dependencies
+        simply follow such tie-breaking order.
+        """
+        resolvedKeys = [key for key in self._resolvedKeys if key in self._registrations]
+        resolvedKeys.reverse()
+
+        tieBreakingOrder = resolvedKeys + [
+            key for key in self._registrations if key not in self._resolvedKeys
+        ]
+
+        dependencyGraph = self.getDependencyGraph()
+
+        pendingDependents = {key: 0 for key in tieBreakingOrder}
+        for dependencies in dependencyGraph.values():
+            for dependency in dependencies:
+                if dependency in pendingDependents:
+                    pendingDependents[dependency] += 1
+
+        result = []
+        remainingKeys = list(tieBreakingOrder)
+
+        while remainingKeys:
+            nextKey = next(
+                (key for key in remainingKeys if pendingDependents[key] <= 0),
+                remainingKeys[0],
+            )
+
+            remainingKeys.remove(nextKey)
+            result.append(nextKey)
+
+            for dependency in dependencyGraph[nextKey]:
+                if dependency in pendingDependents:
+                    pendingDependents[dependency] -= 1
+
+        return result
+
+    def _disposeSequentially(self, disposalOrder, timings, errors):
+        for key in disposalOrder:
+            startTime = time.perf_counter()
+
+            try:
+                self._registrations[key].dispose()
+                timings[key] = time.perf_counter() - startTime
+            except Exception as ex:
+                errors[key] = ex
+
+        return list(disposalOrder)
+
+    def _disposeConcurrently(
+        self, disposalOrder, maxWorkers, timeout, timings, timedOutKeys, errors
+    ):
+        """
+        Disposes every key - on a dedicated daemon thread - as soon as all the keys
+        depending on it have been disposed (or have failed, or have timed out);
+        disposers exceeding the timeout are abandoned and keep running in background
+        """
+        dependencyGraph = self.getDependencyGraph()
+
+        pendingDependents = {key: 0 for key in disposalOrder}
+        for dependencies in dependencyGraph.values():
+            for dependency in dependencies:
+                if dependency in pendingDependents:
+                    pendingDependents[dependency] += 1
+
+        remainingKeys = list(disposalOrder)
+        startedKeys = []
+        runningKeys = {}
+        completions = queue.Queue()
+
+        def runDisposer(key, registration):
+            startTime = time.perf_counter()
+
+            try:
+                registration.dispose()
+                completions.put((key, time.perf_counter() - startTime, None))
+            except Exception as ex:
+                completions.put((key, None, ex))
+
+        def release(key):
+            del runningKeys[key]
+
+            for dependency in dependencyGraph[key]:
+                if dependency in pendingDependents:
+                    pendingDependents[dependency] -= 1
+
+        while remainingKeys or runningKeys:
+            readyKeys = [key for key in remainingKeys if pendingDependents[key] <= 0]
+
+            if not readyKeys and not runningKeys:
+                # Circular dependencies: falling back to the disposal order
+                readyKeys = remainingKeys[:1]
+
+            if maxWorkers is not None:
+                readyKeys = readyKeys[: max(0, maxWorkers - len(runningKeys))]
+
+            for key in readyKeys:
+                remainingKeys.remove(key)
+                startedKeys.append(key)
+                runningKeys[key] = time.perf_counter()
+
+                threading.Thread(
+                    target=runDisposer,
+                    args=(key, self._registrations[key]),
+                    daemon=True,
+                ).start()
+
+            if timeout is None:
+                waitTimeout = None
+            else:
+                now = time.perf_counter()
+                waitTimeout = max(0, min(runningKeys.values()) + timeout - now)
+
+            try:
+                completion = completions.get(timeout=waitTimeout)
+
+                while True:
+                    key, elapsedTime, error = completion
+
+                    if key in runningKeys:
+                        if error is None:
+                            timings[key] = elapsedTime
+                        else:
+                            errors[key] = error
+
+                        release(key)
+
+                    completion = completions.get_nowait()
+            except queue.Empty:
+                pass
+
+            if timeout is not None:
+                now = time.perf_counter()
+
+                for key, startTime in list(runningKeys.items()):
+                    if now - startTime >= timeout:
+                        timedOutKeys.append(key)
+                        release(key)
+
+        return startedKeys
+
+    def dispose(self, maxWorkers=1, timeout=None, collectErrors=False):
+        """
+        Disposes every performed registration; the container can then be used again.
+
+        Registrations are disposed following the dependency graph returned by
+        getDependencyGraph(), so that instances are disposed before the instances
+        they depend on; independent registrations are disposed in reverse order
+        of their first resolution, and registrations never resolved are disposed last.
+
+        If "maxWorkers" is greater than 1 - or None, meaning no limit - or if "timeout"
+        is passed, independent branches of the dependency graph returned by
+        getDependencyGraph() are disposed concurrently, on daemon threads;
+        every disposer taking more than "timeout" seconds is abandoned,
+        without stalling the others.
+
+        Errors raised by disposers do not stop the disposal process: once every
+        registration has been disposed, the first error - in disposal order - is re-raised,
+        unless "collectErrors" is True; in that case, errors are just collected
+        in the returned DisposalReport, together with the timing of each disposer.
+        """
+        startTime = time.perf_counter()
+
+        disposalOrder = self._computeDisposalOrder()
+        timings = {}
+        timedOutKeys = []
+        errors = {}
+
+        if maxWorkers == 1 and timeout is None:
+            startedKeys = self._disposeSequentially(disposalOrder, timings, errors)
+        else:
+            startedKeys = self._disposeConcurrently(
+                disposalOrder, maxWorkers, timeout, timings, timedOutKeys, errors
+            )
 
         self._registrations = {}
+        self._recordedDependencies = {}
+        self._resolvedKeys = OrderedDict()
+
+        if errors and not collectErrors:
+            raise next(errors[key] for key in startedKeys if key in errors)
+
+        return DisposalReport(
+            startedKeys, timings, timedOutKeys, errors, time.perf_counter() - startTime
+        )
@@ -6,6 +6,7 @@ Maven utilities
 """
 import os
 
+from .io.diskusage import DiskUsageAggregator
 from .versioning import Version, VersionDirectory
 
 
@@ -111,6 +112,7 @@ class MavenRepository:
         """
 
         self._rootPath = rootPath
+        self._diskUsageAggregator = None
 
     def getRootPath(self):
         """
@@ -139,3 +141,93 @@ class MavenRepository:
         artifactVersionDirectory = VersionDirectory(artifactPath)
 
         return artifactVersionDirectory.getLatestVersion()
+
+    def getDiskUsage(self, maxWorkers=None, fullRescan=False):
+        """
+        Returns a MavenDiskUsage describing the space taken by the repository.
+
+        The underlying DiskUsageAggregator is kept by the repository,
+        so repeated calls only list the directories that changed in the meantime;
+        "maxWorkers" applies to each call.
+        """
+        if self._diskUsageAggregator is None:
+            self._diskUsageAggregator = DiskUsageAggregator(self._rootPath)
+
+        rootUsage = self._diskUsageAggregator.refresh(fullRescan, maxWorkers)
+
+        return MavenDiskUsage(rootUsage)
+
+
+class MavenDiskUsage:
+    """
+    The disk usage of a Maven repository, per groupId, artifactId and version.
+
+    Version directories are recognized as the directories containing files
+    but no subdirectories, at least 3 levels below the root of the repository:
+    their parent is the artifact directory, whose own parent is the group directory.
+    """
+
+    def __init__(self, rootUsage):
+        self._rootUsage = rootUsage
+
+        self._groupSizes = {}
+        self._artifactSizes = {}
+        self._versionSizes = {}
+
+        if rootUsage is None:
+            return
+
+        rootPath = rootUsage.getPath()
+
+        for usage in rootUsage.walk():
+            if usage.getChildren() or not usage.getOwnFileCount():
+                continue
+
+            components = os.path.relpath(usage.getPath(), rootPath).split(os.sep)
+            if len(components) < 3:
+                continue
+
+            groupId = ".".join(components[:-2])
+            artifactId = components[-2]
+            version = components[-1]
+
+            self._versionSizes[(groupId, artifactId, version)] = usage.getTotalSize()
+
+            artifactKey = (groupId, artifactId)
+            if artifactKey not in self._artifactSizes:
+                artifactUsage = rootUsage.find(os.path.join(*components[:-1]))
+                artifactSize = artifactUsage.getTotalSize()
+
+                self._artifactSizes[artifactKey] = artifactSize
+                self._groupSizes[groupId] = (
+                    self._groupSizes.get(groupId, 0) + artifactSize
+                )
+
+    def getRootUsage(self):
+        """
+        Returns the DirectoryUsage of the root of the repository,
+        or None if the repository does not exist
+        """
+        return self._rootUsage
+
+    def getTotalSize(self):
+        return self._rootUsage.getTotalSize() if self._rootUsage is not None else 0
+
+    def getGroupSizes(self):
+        """
+        Returns a dictionary mapping each groupId to the size of its artifacts
+        """
+        return self._groupSizes
+
+    def getArtifactSizes(self):
+        """
+        Returns a dictionary mapping each (groupId, artifactId) to the size of its directory
+        """
+        return self._artifactSizes
+
+    def getVersionSizes(self):
+        """
+        Returns a dictionary mapping each (groupId, artifactId, version)
+        to the size of its directory
+        """
+        return self._versionSizes
@@ -5,7 +5,18 @@ Rendering-oriented utilities
 :license: LGPLv3, see LICENSE for details.
 """
 
+import os
 import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from string import Template
+from types import MappingProxyType
+
+from ._compat import getRunningLoop
 
 
 class Model:
@@ -18,6 +29,33 @@ class Model:
 
     _getterPattern = re.compile("^(?:get|is)([A-Z]+.*)$")
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        cls._accessorPlan = cls._compileAccessorPlan()
+        cls._gettersByVarName = dict(cls._accessorPlan)
+
+    @classmethod
+    def _compileAccessorPlan(cls):
+        """
+        Returns the tuple of (variable name, getter name) pairs
+        for every getter declared by the class
+        """
+        result = []
+
+        for itemName in map(str, dir(cls)):
+            match = cls._getterPattern.match(itemName)
+
+            if match is None:
+                continue
+
+            propertyName = match.group(1)
+            varName = propertyName[0].lower() + propertyName[1:]
+
+            result.append((varName, itemName))
+
+        return tuple(result)
+
     def __init__(self, cacheVars=True):
         """
         Creates the model.
@@ -27,55 +65,373 @@ class Model:
         is performed by subsequent calls.
         """
         self._vars = None
+        self._varsView = None
         self._explicitVars = {}
         self._cacheVars = cacheVars
 
     def setVar(self, name, value):
         """
-        Sets a variable in the model
+        Sets a variable in the model, invalidating the cached variables
         """
         self._explicitVars[name] = value
+        self.invalidateVars()
+
+    def invalidateVars(self):
+        """
+        Discards the variables cached by findVars(), so that the getters
+        are called again by its next call
+        """
+        self._vars = None
+        self._varsView = None
+
+    def __getstate__(self):
+        """
+        The cached variables are not pickled - they include a read-only view,
+        which is not picklable - so the unpickled model computes them again
+        """
+        state = self.__dict__.copy()
+        state["_vars"] = None
+        state["_varsView"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def lazyVars(self):
+        """
+        Returns a LazyVars mapping, providing the same variables as findVars()
+        but calling each getter only on first access: a new mapping should be
+        requested for each rendering, as its values are memoized
+        """
+        return LazyVars(self)
 
     def findVars(self):
         """
         Returns the dict of model variables, as follows:
 
         --each getProperty() and isProperty() getter method
-          is called, and a "property" key is added to the result
+          is called, and a "property" key is added to the result;
+          the getters are detected just once per class, when the class is created
 
         --variables set via setVar() are added to the result,
           overwriting any value already provided by a getter
 
         The variables can be cached, to avoid further processing,
         by setting the related constructor parameter: in this case,
-        findVars() returns a copy of the cached vars dictionary.
+        findVars() returns a read-only view - whose "vars" key references
+        the view itself - of the cached vars dictionary, without copying it;
+        the cache is invalidated by setVar() and invalidateVars().
         """
         if self._cacheVars and (self._vars is not None):
-            return dict(self._vars)
+            return self._varsView
 
-        result = {}
+        result = {
+            varName: getattr(self, getterName)()
+            for varName, getterName in self._accessorPlan
+        }
 
-        for itemName in map(str, dir(self)):
-            match = self._getterPattern.match(itemName)
+        result.update(self._explicitVars)
 
-            if match is None:
-                continue
+        if self._cacheVars:
+            varsView = MappingProxyType(result)
+            result["vars"] = varsView
 
-            propertyName = match.group(1)
-            varName = propertyName[0].lower() + propertyName[1:]
+            self._vars = result
+            self._varsView = varsView
 
-            varValue = getattr(self, itemName)()
+            return varsView
 
-            result[varName] = varValue
+        result["vars"] = result
 
-        result.update(self._explicitVars)
+        return result
 
-        result["vars"] = result
 
-        if self._cacheVars:
-            self._vars = dict(result)
+Model._accessorPlan = Model._compileAccessorPlan()
+Model._gettersByVarName = dict(Model._accessorPlan)
 
-        return result
+
+class LazyVars(Mapping):
+    """
+    Read-only mapping providing the same variables as Model.findVars(),
+    but calling each getter only when its variable is accessed for the first time;
+    the result is then memoized for the lifetime of the mapping.
+
+    Checking the existence of a key, or iterating over the keys, calls no getter.
+    """
+
+    def __init__(self, model):
+        self._model = model
+        self._explicitVars = dict(model._explicitVars)
+        self._gettersByVarName = model._gettersByVarName
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key == "vars":
+            return self
+
+        explicitVars = self._explicitVars
+        if key in explicitVars:
+            return explicitVars[key]
+
+        values = self._values
+        if key in values:
+            return values[key]
+
+        getterName = self._gettersByVarName.get(key)
+        if getterName is None:
+            raise KeyError(key)
+
+        value = getattr(self._model, getterName)()
+        values[key] = value
+
+        return value
+
+    def __contains__(self, key):
+        return (
+            key == "vars" or key in self._explicitVars or key in self._gettersByVarName
+        )
+
+    def __iter__(self):
+        for varName in self._gettersByVarName:
+            if varName not in self._explicitVars and varName != "vars":
+                yield varName
+
+        for varName in self._explicitVars:
+            if varName != "vars":
+                yield varName
+
+        yield "vars"
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class CompiledTemplate:
+    """
+    A template already processed by a RenderEngine, ready to be rendered
+    any number of times
+    """
+
+    def render(self, vars):
+        """
+        Returns the output string, given the mapping of variables
+        - usually returned by Model.findVars() or Model.lazyVars()
+        """
+        raise NotImplementedError
+
+    def generate(self, vars):
+        """
+        Yields the output as a sequence of string chunks; by default,
+        the whole output returned by render() is yielded as a single chunk
+        """
+        yield self.render(vars)
+
+    def __call__(self, vars):
+        return self.render(vars)
+
+
+class RenderEngine:
+    """
+    Abstraction over a templating technology: it compiles template sources
+    to CompiledTemplate objects, that are cached by TemplateCache
+    """
+
+    def compile(self, templateSource, templatePath):
+        """
+        Returns a CompiledTemplate, given the template source string
+        and the path it was read from
+        """
+        raise NotImplementedError
+
+
+class StringTemplate(CompiledTemplate):
+    """
+    Template compiled by StringTemplateEngine: the source is split just once
+    into literal chunks and placeholders
+    """
+
+    def __init__(self, literals, placeholders):
+        """
+        --literals: the list of literal chunks, one more than the placeholders
+
+        --placeholders: the list of (variable name, placeholder source) pairs
+        """
+        self._literals = literals
+        self._placeholders = placeholders
+
+    def render(self, vars):
+        literals = self._literals
+        outputChunks = [literals[0]]
+
+        for index, (varName, placeholderSource) in enumerate(self._placeholders):
+            try:
+                outputChunks.append(str(vars[varName]))
+            except KeyError:
+                outputChunks.append(placeholderSource)
+
+            outputChunks.append(literals[index + 1])
+
+        return "".join(outputChunks)
+
+    def generate(self, vars):
+        literals = self._literals
+        yield literals[0]
+
+        for index, (varName, placeholderSource) in enumerate(self._placeholders):
+            try:
+                yield str(vars[varName])
+            except KeyError:
+                yield placeholderSource
+
+            yield literals[index + 1]
+
+
+class StringTemplateEngine(RenderEngine):
+    """
+    RenderEngine supporting the $-based placeholders of string.Template,
+    with the same semantics of its safe_substitute() method:
+    placeholders referencing missing variables are left untouched
+    """
+
+    def compile(self, templateSource, templatePath):
+        literals = []
+        placeholders = []
+        currentLiteral = []
+        position = 0
+
+        for match in Template.pattern.finditer(templateSource):
+            currentLiteral.append(templateSource[position : match.start()])
+            position = match.end()
+
+            varName = match.group("named") or match.group("braced")
+
+            if varName is not None:
+                literals.append("".join(currentLiteral))
+                placeholders.append((varName, match.group()))
+                currentLiteral = []
+            elif match.group("escaped") is not None:
+                currentLiteral.append(Template.delimiter)
+            else:
+                currentLiteral.append(match.group())
+
+        currentLiteral.append(templateSource[position:])
+        literals.append("".join(currentLiteral))
+
+        return StringTemplate(literals, placeholders)
+
+
+class TemplateCache:
+    """
+    Thread-safe cache of CompiledTemplate objects, keyed by template path and RenderEngine.
+
+    Entries are recompiled whenever the modification time or the size of the template file
+    change; to avoid disk I/O in steady state, a file is checked at most once
+    every "checkInterval" seconds. Least recently used entries are evicted as soon as
+    there are more than "maxEntries" entries, or their sources exceed "maxTotalSize" characters.
+    """
+
+    def __init__(
+        self,
+        maxEntries=256,
+        maxTotalSize=64 * 1024 * 1024,
+        checkInterval=1.0,
+        encoding="utf-8",
+    ):
+        self._maxEntries = maxEntries
+        self._maxTotalSize = maxTotalSize
+        self._checkInterval = checkInterval
+        self._encoding = encoding
+
+        self._entries = OrderedDict()
+        self._totalSize = 0
+        self._lock = threading.Lock()
+
+    def getTemplate(self, templatePath, renderEngine):
+        """
+        Returns the CompiledTemplate for the given path and engine,
+        reading and compiling the template file only if needed
+        """
+        key = (templatePath, renderEngine)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+                if now - entry.checkTime < self._checkInterval:
+                    return entry.compiledTemplate
+
+        fileStat = os.stat(templatePath)
+
+        if (
+            entry is not None
+            and entry.mtime == fileStat.st_mtime_ns
+            and entry.fileSize == fileStat.st_size
+        ):
+            entry.checkTime = now
+            return entry.compiledTemplate
+
+        with open(templatePath, "r", encoding=self._encoding) as templateFile:
+            templateSource = templateFile.read()
+
+        compiledTemplate = renderEngine.compile(templateSource, templatePath)
+
+        newEntry = _TemplateCacheEntry(
+            compiledTemplate,
+            fileStat.st_mtime_ns,
+            fileStat.st_size,
+            len(templateSource),
+            now,
+        )
+
+        with self._lock:
+            self._removeEntry(key)
+
+            self._entries[key] = newEntry
+            self._totalSize += newEntry.sourceSize
+
+            while len(self._entries) > 1 and (
+                len(self._entries) > self._maxEntries
+                or self._totalSize > self._maxTotalSize
+            ):
+                self._removeEntry(next(iter(self._entries)))
+
+        return compiledTemplate
+
+    def _removeEntry(self, key):
+        entry = self._entries.pop(key, None)
+
+        if entry is not None:
+            self._totalSize -= entry.sourceSize
+
+    def invalidate(self, templatePath=None):
+        """
+        Removes from the cache the entries related to the given path
+        - or all the entries, if no path is passed
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if templatePath is None or key[0] == templatePath:
+                    self._removeEntry(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _TemplateCacheEntry:
+    def __init__(self, compiledTemplate, mtime, fileSize, sourceSize, checkTime):
+        self.compiledTemplate = compiledTemplate
+        self.mtime = mtime
+        self.fileSize = fileSize
+        self.sourceSize = sourceSize
+        self.checkTime = checkTime
+
+
+defaultRenderEngine = StringTemplateEngine()
+
+defaultTemplateCache = TemplateCache()
 
 
 class View:
@@ -89,6 +445,59 @@ class View:
 
         self._model = model
 
+    def render(self):
+        """
+        Returns the output string, created on the basis of the model
+        """
+        raise NotImplementedError
+
+    def generate(self):
+        """
+        Yields the output as a sequence of string chunks, so that it
+        never needs to be entirely in memory; by default, the whole output
+        returned by render() is yielded as a single chunk
+        """
+        yield self.render()
+
+    def renderTo(self, outputFile, encoding="utf-8", bufferSize=64 * 1024):
+        """
+        Writes the output, encoded, to the given binary file-like object,
+        coalescing the chunks returned by generate() into blocks
+        of about "bufferSize" characters; returns the number of bytes written
+        """
+        chunks = self.generate()
+        bytesWritten = 0
+
+        while True:
+            block = _joinChunks(chunks, bufferSize)
+
+            if not block:
+                return bytesWritten
+
+            encodedBlock = block.encode(encoding)
+            outputFile.write(encodedBlock)
+            bytesWritten += len(encodedBlock)
+
+    async def generateAsync(self, bufferSize=64 * 1024, executor=None):
+        """
+        Asynchronous generator yielding the output in blocks of about "bufferSize" characters:
+        the chunks returned by generate() are produced on the given executor
+        - by default, the event loop's one - so that slow getters and template loading
+        never block the event loop
+        """
+        loop = getRunningLoop()
+        chunks = self.generate()
+
+        while True:
+            block = await loop.run_in_executor(
+                executor, _joinChunks, chunks, bufferSize
+            )
+
+            if not block:
+                return
+
+            yield block
+
 
 class TemplateView(View):
     """
@@ -96,8 +505,220 @@ class TemplateView(View):
     by a templating engine.
     """
 
-    def __init__(self, model, templatePath):
+    def __init__(self, model, templatePath, renderEngine=None, templateCache=None):
+        """
+        --renderEngine: the RenderEngine compiling the template;
+          by default, defaultRenderEngine - a StringTemplateEngine
+
+        --templateCache: the TemplateCache providing the compiled template;
+          by default, the process-wide defaultTemplateCache
+        """
         super(TemplateView, self).__init__(model)
 
         assert templatePath is not None
         self._templatePath = templatePath
+        self._renderEngine = (
+            renderEngine if renderEngine is not None else defaultRenderEngine
+        )
+        self._templateCache = (
+            templateCache if templateCache is not None else defaultTemplateCache
+        )
+
+    def getCompiledTemplate(self):
+        """
+        Returns the CompiledTemplate, retrieved via the template cache
+        """
+        return self._templateCache.getTemplate(self._templatePath, self._renderEngine)
+
+    def render(self):
+        """
+        Renders the compiled template, passing the variables returned by the model's findVars()
+        """
+        return self.getCompiledTemplate().render(self._model.findVars())
+
+    def generate(self):
+        """
+        Yields the chunks returned by the compiled template's generate() method
+        """
+        compiledTemplate = self.getCompiledTemplate()
+
+        yield from compiledTemplate.generate(self._model.findVars())
+
+
+class BatchRenderResult:
+    """
+    The outcome of rendering one model via BatchRenderer
+    """
+
+    def __init__(self, index, output, findVarsTime, renderTime):
+        self._index = index
+        self._output = output
+        self._findVarsTime = findVarsTime
+        self._renderTime = renderTime
+
+    def getIndex(self):
+        """
+        Returns the position of the model in the rendered sequence
+        """
+        return self._index
+
+    def getOutput(self):
+        """
+        Returns the rendered string
+        """
+        return self._output
+
+    def getFindVarsTime(self):
+        """
+        Returns the seconds spent by the model's findVars()
+        """
+        return self._findVarsTime
+
+    def getRenderTime(self):
+        """
+        Returns the seconds spent rendering the compiled template
+        """
+        return self._renderTime
+
+
+class BatchRenderer:
+    """
+    Renders a sequence of models with the same template, spreading the work
+    across a pool of processes: each worker compiles the template just once,
+    via its process-wide defaultTemplateCache.
+
+    As the render engine is pickled with every task, each worker keeps
+    the first copy it receives - keyed by a token identifying the BatchRenderer -
+    so that all the tasks share the cached compiled template.
+
+    Models and the render engine must be picklable.
+    """
+
+    def __init__(
+        self,
+        templatePath,
+        renderEngine=None,
+        maxWorkers=None,
+        maxInFlight=None,
+        executor=None,
+    ):
+        """
+        --maxWorkers: the number of processes - by default, the number of CPUs
+
+        --maxInFlight: the maximum number of models submitted but not yet
+          returned to the caller - by default, twice the number of workers
+
+        --executor: an optional concurrent.futures executor to use
+          instead of creating a dedicated process pool; it is not shut down
+        """
+        assert templatePath is not None
+
+        self._templatePath = templatePath
+        self._renderEngine = (
+            renderEngine if renderEngine is not None else defaultRenderEngine
+        )
+        self._maxWorkers = maxWorkers
+        self._maxInFlight = (
+            maxInFlight
+            if maxInFlight is not None
+            else 2 * (maxWorkers or os.cpu_count() or 1)
+        )
+        self._executor = executor
+        self._renderEngineToken = uuid.uuid4().hex
+
+    def render(self, models):
+        """
+        Yields a BatchRenderResult for each of the given models, in the same order;
+        models are consumed from the iterable only as in-flight work completes
+        """
+        executor = (
+            self._executor
+            if self._executor is not None
+            else ProcessPoolExecutor(self._maxWorkers)
+        )
+
+        pendingFutures = deque()
+
+        try:
+            for index, model in enumerate(models):
+                if len(pendingFutures) >= self._maxInFlight:
+                    yield pendingFutures.popleft().result()
+
+                pendingFutures.append(
+                    executor.submit(
+                        _renderBatchItem,
+                        self._templatePath,
+                        self._renderEngineToken,
+                        self._renderEngine,
+                        index,
+                        model,
+                    )
+                )
+
+            while pendingFutures:
+                yield pendingFutures.popleft().result()
+        finally:
+            for future in pendingFutures:
+                future.cancel()
+
+            if executor is not self._executor:
+                executor.shutdown()
+
+
+# The render engines received by the current worker process, by BatchRenderer token
+_batchRenderEngines = OrderedDict()
+_batchRenderEnginesLock = threading.Lock()
+_maxBatchRenderEngines = 16
+
+
+def _getBatchRenderEngine(renderEngineToken, renderEngine):
+    """
+    Returns the first render engine received for the given token,
+    so that its compiled templates can be found in the template cache
+    """
+    with _batchRenderEnginesLock:
+        knownRenderEngine = _batchRenderEngines.get(renderEngineToken)
+
+        if knownRenderEngine is not None:
+            _batchRenderEngines.move_to_end(renderEngineToken)
+            return knownRenderEngine
+
+        _batchRenderEngines[renderEngineToken] = renderEngine
+
+        if len(_batchRenderEngines) > _maxBatchRenderEngines:
+            _batchRenderEngines.popitem(last=False)
+
+        return renderEngine
+
+
+def _renderBatchItem(templatePath, renderEngineToken, renderEngine, index, model):
+    renderEngine = _getBatchRenderEngine(renderEngineToken, renderEngine)
+    compiledTemplate = defaultTemplateCache.getTemplate(templatePath, renderEngine)
+
+    startTime = time.perf_counter()
+    vars = model.findVars()
+    findVarsTime = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    output = compiledTemplate.render(vars)
+    renderTime = time.perf_counter() - startTime
+
+    return BatchRenderResult(index, output, findVarsTime, renderTime)
+
+
+def _joinChunks(chunks, minSize):
+    """
+    Joins the next chunks provided by the given iterator, until their size
+    reaches "minSize" or the iterator is exhausted
+    """
+    block = []
+    blockSize = 0
+
+    for chunk in chunks:
+        block.append(chunk)
+        blockSize += len(chunk)
+
+        if blockSize >= minSize:
+            break
+
+    return "".join(block)
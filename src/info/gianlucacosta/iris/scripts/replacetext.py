@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""
+Utility script employing SearchReplaceProcessor
+
+:copyright: Copyright (C) 2013-2022 Gianluca Costa.
+:license: LGPLv3, see LICENSE for details.
+"""
+
+
+import os
+import sys
+import re
+
+from ..io.filetree import (
+    SearchReplaceProcessor,
+    DefaultOnProcessingFunctions,
+)
+
+
+class Program:
+    def _printUsage(self):
+        print(
+            "Arguments: <root dir> <file path regex> [-r] <search> <replacement> [[-r] <search> <replacement> ...]"
+        )
+        print("(-r: the following search string is a regex)")
+        sys.exit(1)
+
+    def run(self, args):
+        if len(args) < 4:
+            self._printUsage()
+
+        rootDir = args[0]
+
+        if not os.path.isdir(rootDir):
+            self._printUsage()
+
+        filePathPattern = re.compile(args[1])
+
+        literalReplacements = {}
+        regexReplacements = []
+
+        replacementArgs = args[2:]
+
+        while replacementArgs:
+            isRegex = replacementArgs[0] == "-r"
+            if isRegex:
+                replacementArgs = replacementArgs[1:]
+
+            if len(replacementArgs) < 2:
+                self._printUsage()
+
+            search, replacement = replacementArgs[:2]
+            replacementArgs = replacementArgs[2:]
+
+            if isRegex:
+                regexReplacements.append((re.compile(search), replacement))
+            else:
+                literalReplacements[search] = replacement
+
+        searchReplaceProcessor = SearchReplaceProcessor(
+            filePathPattern, literalReplacements, regexReplacements
+        )
+        searchReplaceProcessor.onProcessing = (
+            DefaultOnProcessingFunctions.printProcessedFile
+        )
+        searchReplaceProcessor.applyTo(rootDir)
+
+
+def main():
+    Program().run(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -4,45 +4,266 @@ File-based management of variables.
 :copyright: Copyright (C) 2013-2022 Gianluca Costa.
 :license: LGPLv3, see LICENSE for details.
 """
+import asyncio
+import json
+import mmap
 import os
+import stat
+import struct
+import threading
+import time
 
-from .io.utils import PathOperations
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ._compat import getRunningLoop
+from .io.utils import (
+    DirectoryLock,
+    DirectorySyncBatch,
+    PathOperations,
+)
+from .io.watching import DirectoryWatcher, SharedDirectoryWatchers
 
 
 class VariablesService:
     """
-    Centralizes several file-based variables in one directory
+    Centralizes several file-based variables in one directory.
+
+    Flags are the regular files directly contained in the directory, whereas
+    typed variables - strings, JSON objects and counters - are stored in its
+    ".variables" subdirectory, so that they never appear as flags.
     """
 
-    def __init__(self, variablesDirPath):
+    _TYPED_VARIABLES_DIR_NAME = ".variables"
+
+    def __init__(self, variablesDirPath, watched=False, pollInterval=0.1):
         """
         Instantiates the service, receiving the directory that
-        will contain the variable-related files
+        will contain the variable-related files.
+
+        In watched mode, the directory is created if missing and a DirectoryWatcher
+        - based on inotify if available, otherwise checking the directory every
+        "pollInterval" seconds - keeps the set of active flags in memory:
+        the flags returned by getFlag() then check their state without any I/O,
+        and subscribe() can be used to be notified of flag changes.
+        close() must be called to stop watching.
         """
         self._variablesDirPath = variablesDirPath
 
+        if watched:
+            PathOperations.safeMakeDirs(variablesDirPath)
+
+            self._watcher = DirectoryWatcher.create(
+                variablesDirPath, pollInterval, ignoreDirs=True
+            )
+            self._watcher.start()
+        else:
+            self._watcher = None
+
+    def isWatched(self):
+        return self._watcher is not None
+
     def getFlag(self, flagName):
         """
-        Creates a flag having path <variables dir path><os.sep><flagName>
+        Creates a flag having path <variables dir path><os.sep><flagName>;
+        in watched mode, only the flags directly contained in the variables directory
+        rely on the watcher, while nested ones check the file system
         """
         assert len(flagName) > 0
 
-        return Flag(os.path.join(self._variablesDirPath, flagName))
+        return Flag(
+            os.path.join(self._variablesDirPath, flagName),
+            self._watcher if not os.path.dirname(flagName) else None,
+        )
+
+    def snapshot(self, flagNames=None):
+        """
+        Returns a dict mapping flag names to their values, obtained by listing
+        the variables directory just once - or, in watched mode, without any I/O.
+
+        If "flagNames" is None, the result contains every active flag;
+        otherwise, it contains exactly the given flags, active or not.
+
+        Just like Flag.isActive(), every entry but directories is an active flag
+        - symbolic links included, without following them.
+        """
+        if self._watcher is not None:
+            activeFlagNames = self._watcher.getEntryNames()
+        else:
+            try:
+                with os.scandir(self._variablesDirPath) as entries:
+                    activeFlagNames = {
+                        entry.name
+                        for entry in entries
+                        if not entry.is_dir(follow_symlinks=False)
+                    }
+            except FileNotFoundError:
+                activeFlagNames = set()
+
+        if flagNames is None:
+            return {flagName: True for flagName in activeFlagNames}
+
+        return {flagName: flagName in activeFlagNames for flagName in flagNames}
+
+    def activateAll(self, flagNames):
+        """
+        Activates all the given flags, syncing the variables directory just once;
+        returns the set of the flags that were previously inactive
+        """
+        PathOperations.safeMakeDirs(self._variablesDirPath)
+
+        activatedFlagNames = set()
+
+        for flagName in flagNames:
+            assert len(flagName) > 0
+
+            try:
+                os.close(
+                    os.open(
+                        os.path.join(self._variablesDirPath, flagName),
+                        os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                    )
+                )
+            except FileExistsError:
+                continue
+
+            activatedFlagNames.add(flagName)
+
+        self._completeBulkChange(activatedFlagNames, True)
+
+        return activatedFlagNames
+
+    def deactivateAll(self, flagNames):
+        """
+        Deactivates all the given flags, syncing the variables directory just once;
+        returns the set of the flags that were previously active
+        """
+        deactivatedFlagNames = set()
+
+        for flagName in flagNames:
+            assert len(flagName) > 0
+
+            if PathOperations.safeRemove(
+                os.path.join(self._variablesDirPath, flagName)
+            ):
+                deactivatedFlagNames.add(flagName)
+
+        self._completeBulkChange(deactivatedFlagNames, False)
+
+        return deactivatedFlagNames
+
+    def _completeBulkChange(self, flagNames, isActive):
+        if not flagNames:
+            return
+
+        PathOperations.fsyncDirectory(self._variablesDirPath)
+
+        if self._watcher is not None:
+            for flagName in flagNames:
+                if not os.path.dirname(flagName):
+                    self._watcher.notifyChange(flagName, isActive)
+
+    def getString(self, variableName):
+        """
+        Creates a StringVariable having path
+        <variables dir path><os.sep>.variables<os.sep><variableName>
+        """
+        return StringVariable(self._getTypedVariablePath(variableName))
+
+    def getJson(self, variableName):
+        """
+        Creates a JsonVariable having path
+        <variables dir path><os.sep>.variables<os.sep><variableName>
+        """
+        return JsonVariable(self._getTypedVariablePath(variableName))
+
+    def getCounter(self, variableName):
+        """
+        Creates a Counter having path
+        <variables dir path><os.sep>.variables<os.sep><variableName>
+        """
+        return Counter(self._getTypedVariablePath(variableName))
+
+    def _getTypedVariablePath(self, variableName):
+        assert len(variableName) > 0
+
+        return os.path.join(
+            self._variablesDirPath, self._TYPED_VARIABLES_DIR_NAME, variableName
+        )
+
+    def setValues(self, assignments):
+        """
+        Atomically writes the value of many variables, syncing the variables
+        directory just once; "assignments" is an iterable of (variable, value) pairs
+        - or a dict mapping variables to values.
+
+        Each variable is updated atomically, but the batch as a whole is not.
+        """
+        if isinstance(assignments, dict):
+            assignments = assignments.items()
+
+        with DirectorySyncBatch() as directorySyncBatch:
+            for variable, value in assignments:
+                variable.set(value, directorySyncBatch)
+
+    def subscribe(self, listener):
+        """
+        In watched mode, registers a function called as listener(flagName, isActive)
+        whenever a flag is activated or deactivated - by any process
+        """
+        if self._watcher is None:
+            raise RuntimeError("Subscriptions require watched mode")
+
+        self._watcher.addListener(listener)
+
+    def unsubscribe(self, listener):
+        if self._watcher is not None:
+            self._watcher.removeListener(listener)
+
+    def close(self):
+        """
+        Stops watching the variables directory, if in watched mode
+        """
+        if self._watcher is not None:
+            self._watcher.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
 
 
 class Flag:
     """
     A Flag is a boolean variable whose value depends
     on the existence of the underlying path: isActive()
-    returns true if and only if that path exists.
+    returns true if and only if that path exists and is not a directory
+    - symbolic links being never followed.
 
     This concept can be very handy when using different
     technologies, that use files as a simple communication
     means.
     """
 
-    def __init__(self, path):
+    # Bounds of the adaptive backoff, used when the directory cannot be watched
+    _MIN_POLL_INTERVAL = 0.001
+    _MAX_POLL_INTERVAL = 0.1
+    _POLL_BACKOFF_FACTOR = 2
+
+    # While waiting on a watcher, it is periodically checked to be still running
+    _WATCHER_CHECK_INTERVAL = 1.0
+
+    def __init__(self, path, watcher=None):
+        """
+        --watcher: an optional, running DirectoryWatcher of the flag's parent
+          directory, used by isActive() instead of checking the file system
+        """
         self._path = path
+        self._name = os.path.basename(path)
+        self._watcher = watcher
 
     def getPath(self):
         return self._path
@@ -51,7 +272,10 @@ class Flag:
         """
         Returns the value of the flag
         """
-        return os.path.exists(self._path)
+        if self._watcher is not None:
+            return self._watcher.contains(self._name)
+
+        return self._readState()
 
     def activate(self):
         """
@@ -59,17 +283,643 @@ class Flag:
         """
         PathOperations.touch(self._path)
 
+        if self._watcher is not None:
+            self._watcher.notifyChange(self._name, True)
+
     def deactivate(self):
         """
         Sets the flag's value to false
         """
         PathOperations.safeRemove(self._path)
 
+        if self._watcher is not None:
+            self._watcher.notifyChange(self._name, False)
+
+    def tryActivate(self):
+        """
+        Atomically activates the flag - via O_CREAT | O_EXCL - returning True
+        only if it was inactive: among concurrent callers, just one obtains True
+        """
+        PathOperations.safeMakeDirs(os.path.dirname(self._path))
+
+        try:
+            os.close(os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            return False
+
+        if self._watcher is not None:
+            self._watcher.notifyChange(self._name, True)
+
+        return True
+
+    def tryDeactivate(self):
+        """
+        Atomically deactivates the flag, returning True only if it was active:
+        among concurrent callers, just one obtains True
+        """
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            return False
+
+        if self._watcher is not None:
+            self._watcher.notifyChange(self._name, False)
+
+        return True
+
+    def _readState(self):
+        """
+        Reads the flag's value from its storage, bypassing any watcher
+        """
+        try:
+            return not stat.S_ISDIR(os.lstat(self._path).st_mode)
+        except OSError:
+            return False
+
+    def _acquireWatcher(self):
+        """
+        Returns a (watcher, isShared) pair: the flag's own watcher, if any,
+        or a watcher shared by all the waiters on the same directory;
+        the watcher is None if the directory cannot be watched
+        """
+        if self._watcher is not None:
+            return self._watcher, False
+
+        watcher = SharedDirectoryWatchers.acquire(os.path.dirname(self._path) or ".")
+
+        return watcher, watcher is not None
+
+    def _releaseWatcher(self, watcher, isShared):
+        if isShared:
+            SharedDirectoryWatchers.release(watcher)
+
+    @staticmethod
+    def _getSleepTime(deadline, maxSleepTime):
+        """
+        Returns how long to sleep before checking again - 0 if the deadline expired
+        """
+        if deadline is None:
+            return maxSleepTime
+
+        return min(maxSleepTime, max(0, deadline - time.monotonic()))
+
+    @staticmethod
+    def _getDeadline(timeout):
+        return time.monotonic() + timeout if timeout is not None else None
+
+    def wait(self, timeout=None, active=True):
+        """
+        Blocks until the flag becomes active - or inactive, if "active" is False -
+        or until "timeout" seconds elapse, if a timeout is passed;
+        returns True if the expected state was reached.
+
+        The flag's directory is watched via inotify where available - with one watcher
+        shared by all the waiters - otherwise its state is polled with adaptive backoff.
+        """
+        if self.isActive() == active:
+            return True
+
+        deadline = self._getDeadline(timeout)
+        watcher, isShared = self._acquireWatcher()
+
+        if watcher is None:
+            return self._pollUntil(active, deadline)
+
+        changeEvent = threading.Event()
+
+        def listener(entryName, exists):
+            if entryName == self._name:
+                changeEvent.set()
+
+        watcher.addListener(listener)
+        try:
+            while watcher.isRunning():
+                if watcher.contains(self._name) == active:
+                    return True
+
+                sleepTime = self._getSleepTime(deadline, self._WATCHER_CHECK_INTERVAL)
+                if sleepTime == 0:
+                    return False
+
+                changeEvent.wait(sleepTime)
+                changeEvent.clear()
+        finally:
+            watcher.removeListener(listener)
+            self._releaseWatcher(watcher, isShared)
+
+        return self._pollUntil(active, deadline)
+
+    async def waitAsync(self, timeout=None, active=True):
+        """
+        Asynchronous version of wait(), suspending the calling coroutine
+        without blocking the event loop
+        """
+        if self.isActive() == active:
+            return True
+
+        deadline = self._getDeadline(timeout)
+        watcher, isShared = self._acquireWatcher()
+
+        if watcher is None:
+            return await self._pollUntilAsync(active, deadline)
+
+        loop = getRunningLoop()
+        changeEvent = asyncio.Event()
+
+        def listener(entryName, exists):
+            if entryName == self._name:
+                loop.call_soon_threadsafe(changeEvent.set)
+
+        watcher.addListener(listener)
+        try:
+            while watcher.isRunning():
+                if watcher.contains(self._name) == active:
+                    return True
+
+                sleepTime = self._getSleepTime(deadline, self._WATCHER_CHECK_INTERVAL)
+                if sleepTime == 0:
+                    return False
+
+                try:
+                    await asyncio.wait_for(changeEvent.wait(), sleepTime)
+                except asyncio.TimeoutError:
+                    pass
+
+                changeEvent.clear()
+        finally:
+            watcher.removeListener(listener)
+            self._releaseWatcher(watcher, isShared)
+
+        return await self._pollUntilAsync(active, deadline)
+
+    def _getPollIntervals(self):
+        pollInterval = self._MIN_POLL_INTERVAL
+
+        while True:
+            yield pollInterval
+            pollInterval = min(
+                pollInterval * self._POLL_BACKOFF_FACTOR, self._MAX_POLL_INTERVAL
+            )
+
+    def _pollUntil(self, active, deadline):
+        for pollInterval in self._getPollIntervals():
+            if self._readState() == active:
+                return True
+
+            sleepTime = self._getSleepTime(deadline, pollInterval)
+            if sleepTime == 0:
+                return False
+
+            time.sleep(sleepTime)
+
+    async def _pollUntilAsync(self, active, deadline):
+        for pollInterval in self._getPollIntervals():
+            if self._readState() == active:
+                return True
+
+            sleepTime = self._getSleepTime(deadline, pollInterval)
+            if sleepTime == 0:
+                return False
+
+            await asyncio.sleep(sleepTime)
+
     def flip(self):
         """
-        Flips the state of the flag
+        Flips the state of the flag, returning its new value.
+
+        The check and the change happen while holding a DirectoryLock
+        on the flag's directory, so concurrent flips never get lost.
+        """
+        dirPath = os.path.dirname(self._path) or "."
+        PathOperations.safeMakeDirs(dirPath)
+
+        with DirectoryLock(dirPath):
+            if self.tryDeactivate():
+                return False
+
+            self.tryActivate()
+            return True
+
+
+class MappedVariablesService:
+    """
+    Alternative to VariablesService, storing all the flags in one memory-mapped file
+    with a fixed-slot layout: reading or writing a flag is a single-byte memory access,
+    immediately visible to every process on the same host mapping the file.
+
+    Each slot contains the state byte, the length of the flag name (0 for free slots)
+    and the UTF-8 name itself, up to MAX_NAME_LENGTH bytes; slots are allocated
+    - while holding a lock on the file - when a flag is requested for the first time.
+    """
+
+    MAX_NAME_LENGTH = 62
+
+    _magic = b"IRISVARS"
+    _layoutVersion = 1
+    _header = struct.Struct("<8sHHI")
+    _slotSize = 64
+
+    def __init__(self, filePath, slotCount=1024):
+        """
+        Opens - or creates, with the given number of slots - the variables file
         """
-        if self.isActive():
-            self.deactivate()
-        else:
-            self.activate()
+        self._filePath = filePath
+        self._localLock = threading.Lock()
+        self._slotOffsets = {}
+
+        PathOperations.safeMakeDirs(os.path.dirname(filePath))
+
+        self._fd = os.open(filePath, os.O_RDWR | os.O_CREAT, 0o666)
+
+        try:
+            with self._lockFile():
+                if os.fstat(self._fd).st_size == 0:
+                    self._initializeFile(slotCount)
+
+                self._slotCount = self._readHeader()
+
+            self._map = mmap.mmap(
+                self._fd, self._header.size + self._slotCount * self._slotSize
+            )
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def _initializeFile(self, slotCount):
+        header = self._header.pack(
+            self._magic, self._layoutVersion, self._slotSize, slotCount
+        )
+
+        os.write(self._fd, header + bytes(slotCount * self._slotSize))
+        os.fsync(self._fd)
+
+    def _readHeader(self):
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        header = os.read(self._fd, self._header.size)
+
+        if len(header) < self._header.size:
+            raise ValueError("Truncated variables file: {0}".format(self._filePath))
+
+        magic, layoutVersion, slotSize, slotCount = self._header.unpack(header)
+
+        if (
+            magic != self._magic
+            or layoutVersion != self._layoutVersion
+            or slotSize != self._slotSize
+        ):
+            raise ValueError("Unsupported variables file: {0}".format(self._filePath))
+
+        return slotCount
+
+    def _lockFile(self):
+        """
+        Returns a context manager holding an exclusive lock on the variables file
+        """
+        return _MappedFileLock(self._fd, self._localLock)
+
+    def getFilePath(self):
+        return self._filePath
+
+    def getSlotCount(self):
+        return self._slotCount
+
+    def _readSlotName(self, offset):
+        nameLength = self._map[offset + 1]
+
+        if nameLength == 0:
+            return None
+
+        return self._map[offset + 2 : offset + 2 + nameLength].decode("utf-8")
+
+    def _scanSlots(self):
+        """
+        Refreshes the cache of allocated slots; returns the offset
+        of the first free slot, or None if all the slots are in use
+        """
+        freeSlotOffset = None
+
+        for slotIndex in range(self._slotCount):
+            offset = self._header.size + slotIndex * self._slotSize
+            name = self._readSlotName(offset)
+
+            if name is None:
+                if freeSlotOffset is None:
+                    freeSlotOffset = offset
+            else:
+                self._slotOffsets[name] = offset
+
+        return freeSlotOffset
+
+    def _getSlotOffset(self, flagName):
+        offset = self._slotOffsets.get(flagName)
+
+        if offset is not None:
+            return offset
+
+        encodedName = flagName.encode("utf-8")
+        if len(encodedName) > self.MAX_NAME_LENGTH:
+            raise ValueError(
+                "Flag names cannot exceed {0} bytes".format(self.MAX_NAME_LENGTH)
+            )
+
+        with self._lockFile():
+            freeSlotOffset = self._scanSlots()
+
+            offset = self._slotOffsets.get(flagName)
+            if offset is not None:
+                return offset
+
+            if freeSlotOffset is None:
+                raise RuntimeError("No free slot in {0}".format(self._filePath))
+
+            # The name length is written last, publishing the slot
+            self._map[freeSlotOffset] = 0
+            self._map[
+                freeSlotOffset + 2 : freeSlotOffset + 2 + len(encodedName)
+            ] = encodedName
+            self._map[freeSlotOffset + 1] = len(encodedName)
+
+            self._slotOffsets[flagName] = freeSlotOffset
+
+            return freeSlotOffset
+
+    def getFlag(self, flagName):
+        """
+        Returns a MappedFlag, allocating its slot if needed
+        """
+        assert len(flagName) > 0
+
+        return MappedFlag(self, flagName, self._getSlotOffset(flagName))
+
+    def snapshot(self, flagNames=None):
+        """
+        Returns a dict mapping flag names to their values, as in VariablesService.snapshot()
+        """
+        with self._lockFile():
+            self._scanSlots()
+            slotOffsets = dict(self._slotOffsets)
+
+        if flagNames is None:
+            return {
+                flagName: True
+                for flagName, offset in slotOffsets.items()
+                if self._map[offset] == 1
+            }
+
+        return {
+            flagName: flagName in slotOffsets and self._map[slotOffsets[flagName]] == 1
+            for flagName in flagNames
+        }
+
+    def activateAll(self, flagNames):
+        """
+        Activates all the given flags, returning the set of the ones previously inactive
+        """
+        return {
+            flagName for flagName in flagNames if self.getFlag(flagName).tryActivate()
+        }
+
+    def deactivateAll(self, flagNames):
+        """
+        Deactivates all the given flags, returning the set of the ones previously active
+        """
+        return {
+            flagName for flagName in flagNames if self.getFlag(flagName).tryDeactivate()
+        }
+
+    def getFlagNames(self):
+        """
+        Returns the sorted list of the names of the allocated flags
+        """
+        with self._lockFile():
+            self._scanSlots()
+
+            return sorted(self._slotOffsets)
+
+    def close(self):
+        """
+        Unmaps and closes the variables file; flags must not be used afterwards
+        """
+        self._map.close()
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+
+class _MappedFileLock:
+    def __init__(self, fd, localLock):
+        self._fd = fd
+        self._localLock = localLock
+
+    def __enter__(self):
+        self._localLock.acquire()
+
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._localLock.release()
+                raise
+
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self._localLock.release()
+
+        return False
+
+
+class MappedFlag(Flag):
+    """
+    Flag stored in a slot of a MappedVariablesService; its path is the one
+    of the variables file. Waiting on it polls the memory with adaptive backoff.
+    """
+
+    def __init__(self, service, name, offset):
+        super().__init__(service.getFilePath())
+
+        self._service = service
+        self._name = name
+        self._map = service._map
+        self._offset = offset
+
+    def getName(self):
+        return self._name
+
+    def isActive(self):
+        return self._map[self._offset] == 1
+
+    def _readState(self):
+        return self._map[self._offset] == 1
+
+    def activate(self):
+        self._map[self._offset] = 1
+
+    def deactivate(self):
+        self._map[self._offset] = 0
+
+    def tryActivate(self):
+        with self._service._lockFile():
+            if self._map[self._offset] == 1:
+                return False
+
+            self._map[self._offset] = 1
+            return True
+
+    def tryDeactivate(self):
+        with self._service._lockFile():
+            if self._map[self._offset] == 0:
+                return False
+
+            self._map[self._offset] = 0
+            return True
+
+    def flip(self):
+        with self._service._lockFile():
+            newValue = self._map[self._offset] == 0
+            self._map[self._offset] = 1 if newValue else 0
+
+            return newValue
+
+    def _acquireWatcher(self):
+        return None, False
+
+
+class FileVariable:
+    """
+    A variable whose value is stored in the underlying file.
+
+    Writes are atomic - via AtomicFileWriter - so readers always see
+    a complete value; reads are cached, and the file is parsed again only
+    when its identity, size or modification time change.
+
+    Subclasses define how values are converted to and from text.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._cachedStat = None
+        self._cachedValue = None
+
+    def getPath(self):
+        return self._path
+
+    def _serialize(self, value):
+        """
+        Returns the text to be stored for the given value
+        """
+        raise NotImplementedError
+
+    def _deserialize(self, text):
+        """
+        Returns the value described by the stored text
+        """
+        raise NotImplementedError
+
+    def exists(self):
+        return os.path.exists(self._path)
+
+    def get(self, default=None):
+        """
+        Returns the value of the variable, or "default" if the file does not exist
+        """
+        try:
+            fileStat = os.stat(self._path)
+        except FileNotFoundError:
+            return default
+
+        statKey = (fileStat.st_ino, fileStat.st_size, fileStat.st_mtime_ns)
+
+        if statKey != self._cachedStat:
+            try:
+                with open(self._path, "r", encoding="utf-8") as sourceFile:
+                    value = self._deserialize(sourceFile.read())
+            except FileNotFoundError:
+                return default
+
+            self._cachedValue = value
+            self._cachedStat = statKey
+
+        return self._cachedValue
+
+    def set(self, value, directorySyncBatch=None):
+        """
+        Atomically replaces the value of the variable; the directory sync
+        can be deferred by passing a DirectorySyncBatch
+        """
+        PathOperations.safeMakeDirs(os.path.dirname(self._path))
+
+        PathOperations.atomicWrite(
+            self._path,
+            self._serialize(value),
+            directorySyncBatch=directorySyncBatch,
+        )
+
+    def delete(self):
+        """
+        Removes the underlying file, returning True if it existed
+        """
+        return PathOperations.safeRemove(self._path)
+
+
+class StringVariable(FileVariable):
+    """
+    A variable whose value is an arbitrary string
+    """
+
+    def _serialize(self, value):
+        return value
+
+    def _deserialize(self, text):
+        return text
+
+
+class JsonVariable(FileVariable):
+    """
+    A variable whose value is any JSON-serializable object.
+
+    As the cached value is returned by get(), mutable values should not be modified in place.
+    """
+
+    def _serialize(self, value):
+        return json.dumps(value)
+
+    def _deserialize(self, text):
+        return json.loads(text)
+
+
+class Counter(FileVariable):
+    """
+    An integer variable that can be atomically incremented,
+    even by concurrent processes
+    """
+
+    def _serialize(self, value):
+        return str(int(value))
+
+    def _deserialize(self, text):
+        return int(text)
+
+    def get(self, default=0):
+        return super().get(default)
+
+    def increment(self, delta=1):
+        """
+        Atomically adds "delta" to the counter - starting from 0 if it does not exist -
+        while holding a DirectoryLock on its directory; returns the new value
+        """
+        dirPath = os.path.dirname(self._path) or "."
+        PathOperations.safeMakeDirs(dirPath)
+
+        with DirectoryLock(dirPath):
+            newValue = self.get() + delta
+            self.set(newValue)
+
+        return newValue
@@ -0,0 +1,102 @@
+"""
+:copyright: Copyright (C) 2013-2022 Gianluca Costa.
+:license: LGPLv3, see LICENSE for details.
+"""
+
+import os
+import threading
+
+from info.gianlucacosta.iris.io.diskusage import DiskUsageAggregator
+
+from . import AbstractIoTestCase
+
+
+class DiskUsageAggregatorTests(AbstractIoTestCase):
+    def _writeFile(self, relativePath, size):
+        path = os.path.join(self._tempTestPath, *relativePath.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "wb") as outputFile:
+            outputFile.write(b"X" * size)
+
+    def setUp(self):
+        super().setUp()
+
+        self._writeFile("R1", 1)
+        self._writeFile("alpha/A1", 10)
+        self._writeFile("alpha/A2", 20)
+        self._writeFile("alpha/gamma/G1", 100)
+        self._writeFile("beta/B1", 1000)
+        os.makedirs(os.path.join(self._tempTestPath, "empty"))
+
+        self._aggregator = DiskUsageAggregator(self._tempTestPath, apparentSize=True)
+
+    def testRollUp(self):
+        usage = self._aggregator.getUsage()
+
+        self.assertEqual(1131, usage.getTotalSize())
+        self.assertEqual(1, usage.getOwnSize())
+        self.assertEqual(5, usage.getTotalFileCount())
+        self.assertEqual(["alpha", "beta", "empty"], sorted(usage.getChildren()))
+
+        alphaUsage = usage.find("alpha")
+        self.assertEqual(30, alphaUsage.getOwnSize())
+        self.assertEqual(130, alphaUsage.getTotalSize())
+        self.assertEqual(100, usage.find("alpha/gamma").getTotalSize())
+        self.assertEqual(0, usage.find("empty").getTotalSize())
+        self.assertIsNone(usage.find("INEXISTENT"))
+
+    def testWalk(self):
+        paths = [usage.getPath() for usage in self._aggregator.getUsage().walk()]
+
+        self.assertEqual(5, len(paths))
+        self.assertEqual(self._tempTestPath, paths[0])
+
+    def testRefreshDetectsChanges(self):
+        self._aggregator.refresh()
+
+        self._writeFile("alpha/gamma/G2", 5000)
+        os.remove(os.path.join(self._tempTestPath, "beta", "B1"))
+
+        usage = self._aggregator.refresh()
+
+        self.assertEqual(5131, usage.getTotalSize())
+        self.assertEqual(0, usage.find("beta").getTotalSize())
+
+    def testRefreshReusesUnchangedDirectories(self):
+        self._aggregator.refresh()
+
+        with open(os.path.join(self._tempTestPath, "beta", "B1"), "ab") as inPlace:
+            inPlace.write(b"X" * 1000)
+
+        self.assertEqual(1131, self._aggregator.refresh().getTotalSize())
+        self.assertEqual(2131, self._aggregator.refresh(fullRescan=True).getTotalSize())
+
+    def testInexistentRoot(self):
+        aggregator = DiskUsageAggregator(os.path.join(self._tempTestPath, "INEXISTENT"))
+
+        self.assertIsNone(aggregator.refresh())
+
+    def testSequentialScan(self):
+        aggregator = DiskUsageAggregator(
+            self._tempTestPath, maxWorkers=1, apparentSize=True
+        )
+
+        self.assertEqual(1131, aggregator.getUsage().getTotalSize())
+
+    def testMaxWorkersPerRefresh(self):
+        scanThreads = set()
+
+        class RecordingAggregator(DiskUsageAggregator):
+            def _scanTree(self, dirPath, oldCache, newCache):
+                scanThreads.add(threading.current_thread())
+                return super()._scanTree(dirPath, oldCache, newCache)
+
+        aggregator = RecordingAggregator(self._tempTestPath, apparentSize=True)
+        aggregator.refresh()
+        scanThreads.clear()
+
+        usage = aggregator.refresh(fullRescan=True, maxWorkers=1)
+
+        self.assertEqual(1131, usage.getTotalSize())
+        self.assertEqual({threading.current_thread()}, scanThreads)
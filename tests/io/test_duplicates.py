@@ -0,0 +1,87 @@
+"""
+:copyright: Copyright (C) 2013-2022 Gianluca Costa.
+:license: LGPLv3, see LICENSE for details.
+"""
+
+import os
+
+from info.gianlucacosta.iris.io.duplicates import DuplicateFinder
+
+from . import AbstractIoTestCase
+
+
+class DuplicateFinderTests(AbstractIoTestCase):
+    def _writeFile(self, relativePath, content):
+        path = os.path.join(self._tempTestPath, *relativePath.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "wb") as outputFile:
+            outputFile.write(content)
+
+        return path
+
+    def setUp(self):
+        super().setUp()
+
+        largeContent = bytes(range(256)) * 40
+
+        self._smallDuplicates = [
+            self._writeFile("alpha/S1", b"Small content"),
+            self._writeFile("beta/S2", b"Small content"),
+        ]
+        self._largeDuplicates = [
+            self._writeFile("alpha/L1", largeContent),
+            self._writeFile("beta/gamma/L2", largeContent),
+            self._writeFile("L3", largeContent),
+        ]
+
+        self._writeFile("alpha/DIFFERENT_START", b"X" + largeContent[1:])
+        self._writeFile("beta/DIFFERENT_END", largeContent[:-1] + b"X")
+        self._writeFile("UNIQUE_SIZE", b"Unique")
+        self._writeFile("alpha/EMPTY", b"")
+        self._writeFile("beta/EMPTY", b"")
+
+    def testFind(self):
+        report = DuplicateFinder(blockSize=1024).find(self._tempTestPath)
+
+        self.assertEqual(
+            [sorted(self._largeDuplicates), sorted(self._smallDuplicates)],
+            report.getGroups(),
+        )
+        self.assertEqual(2 * 10240 + 13, report.getReclaimableSize())
+        self.assertEqual([], report.getErrors())
+
+    def testMostFilesAreNotFullyHashed(self):
+        report = DuplicateFinder(blockSize=1024, maxWorkers=1).find(self._tempTestPath)
+
+        self.assertEqual(10, report.getScannedCount())
+        self.assertEqual(7, report.getPartiallyHashedCount())
+        self.assertEqual(4, report.getFullyHashedCount())
+
+    def testHardLinksAreScannedOnce(self):
+        os.link(
+            self._largeDuplicates[0],
+            os.path.join(self._tempTestPath, "HARD_LINK"),
+        )
+
+        report = DuplicateFinder(blockSize=1024).find(self._tempTestPath)
+
+        self.assertEqual(10, report.getScannedCount())
+        self.assertEqual(3, len(report.getGroups()[0]))
+
+    def testHardLinkDuplicates(self):
+        finder = DuplicateFinder(blockSize=1024)
+        report = finder.find(self._tempTestPath)
+
+        results = DuplicateFinder.hardLinkDuplicates(report)
+
+        self.assertEqual(3, len(results))
+        self.assertTrue(all(result.isSuccessful() for result in results))
+
+        largeGroup = report.getGroups()[0]
+        self.assertEqual(1, len({os.stat(path).st_ino for path in largeGroup}))
+        self.assertEqual(
+            [],
+            [name for name in os.listdir(self._tempTestPath) if name.endswith(".tmp")],
+        )
+        self.assertEqual([], finder.find(self._tempTestPath).getGroups())
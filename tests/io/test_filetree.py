@@ -3,10 +3,23 @@
 :license: LGPLv3, see LICENSE for details.
 """
 
+import asyncio
+import io
 import os
+import re
 import shutil
-
-from info.gianlucacosta.iris.io.filetree import HeaderRemover, TrailingSpaceRemover
+import stat
+
+from info.gianlucacosta.iris.io.filetree import (
+    AsyncFileTreeDriver,
+    FileAccessOptions,
+    FileTreeLineProcessor,
+    FileTreeMetrics,
+    HeaderRemover,
+    ProgressReporter,
+    SearchReplaceProcessor,
+    TrailingSpaceRemover,
+)
 
 from . import AbstractIoTestCase
 
@@ -108,6 +121,14 @@ class TrailingSpaceRemoverTests(FileTreeTestCase):
 
         self.assertListEqual(expectedLines, processedLines)
 
+    def testApplyTo_WithoutTrailingSpaces(self):
+        filePath = os.path.join(self._tempFileTreePath, "alpha", "beta", "ni.java")
+        os.utime(filePath, ns=(1000000000, 1000000000))
+
+        self._trailingSpaceRemover.applyTo(self._tempFileTreePath)
+
+        self.assertEqual(1000000000, os.stat(filePath).st_mtime_ns)
+
     def testApplyTo_WithPlainTextFile(self):
         self._trailingSpaceRemover.applyTo(self._tempFileTreePath)
 
@@ -127,3 +148,517 @@ class TrailingSpaceRemoverTests(FileTreeTestCase):
         ]
 
         self.assertListEqual(expectedLines, processedLines)
+
+
+class FileTreeLineProcessorTests(FileTreeTestCase):
+    def _readLines(self, *relativeComponents):
+        with open(
+            os.path.join(self._tempFileTreePath, *relativeComponents), "r"
+        ) as sourceFile:
+            return sourceFile.readlines()
+
+    def testProcessLinesReceivesBatches(self):
+        class BatchUpperCaser(FileTreeLineProcessor):
+            _batchSizeHint = 16
+
+            def __init__(self, filePathPattern):
+                super().__init__(filePathPattern)
+                self.batchSizes = []
+
+            def _processLines(self, lines):
+                self.batchSizes.append(len(lines))
+                return "".join(lines).upper().splitlines(keepends=True)
+
+        processor = BatchUpperCaser(r".*lambda\.java$")
+        expectedLines = [
+            line.upper() for line in self._readLines("alpha", "beta", "lambda.java")
+        ]
+
+        processor.applyTo(self._tempFileTreePath)
+
+        self.assertEqual(expectedLines, self._readLines("alpha", "beta", "lambda.java"))
+        self.assertGreater(len(processor.batchSizes), 1)
+        self.assertEqual(len(expectedLines), sum(processor.batchSizes))
+
+    def testProcessLineFallback(self):
+        class EmptyLineRemover(FileTreeLineProcessor):
+            _batchSizeHint = 1
+
+            def _processLine(self, line):
+                return line if line.strip() else None
+
+        EmptyLineRemover(r".*ni\.java$").applyTo(self._tempFileTreePath)
+
+        self.assertEqual(
+            ["package test;\n", "class Hello2 {}\n"],
+            self._readLines("alpha", "beta", "ni.java"),
+        )
+
+
+class FileAccessOptionsTests(FileTreeTestCase):
+    def _getFilePath(self, *relativeComponents):
+        return os.path.join(self._tempFileTreePath, *relativeComponents)
+
+    def _writeBytes(self, content, *relativeComponents):
+        with open(self._getFilePath(*relativeComponents), "wb") as targetFile:
+            targetFile.write(content)
+
+    def _readBytes(self, *relativeComponents):
+        with open(self._getFilePath(*relativeComponents), "rb") as sourceFile:
+            return sourceFile.read()
+
+    def testBinaryTrailingSpaceRemoverMatchesTextMode(self):
+        TrailingSpaceRemover(r".*\.java$").applyTo(self._tempFileTreePath)
+        expectedContent = self._readBytes("gamma", "spaces.java")
+
+        shutil.rmtree(self._tempFileTreePath)
+        shutil.copytree(
+            os.path.join(self._ioTestPath, "filetree"), self._tempFileTreePath
+        )
+
+        TrailingSpaceRemover(
+            r".*\.java$", FileAccessOptions(binary=True, bufferSize=1024 * 1024)
+        ).applyTo(self._tempFileTreePath)
+
+        self.assertEqual(expectedContent, self._readBytes("gamma", "spaces.java"))
+
+    def testBinaryTrailingSpaceRemoverPreservesNewlines(self):
+        self._writeBytes(b"Alpha  \r\nBeta\t\r\n\xe8 \nGamma ", "crlf.java")
+
+        TrailingSpaceRemover(r".*\.java$", FileAccessOptions(binary=True)).applyTo(
+            self._tempFileTreePath
+        )
+
+        self.assertEqual(b"Alpha\r\nBeta\r\n\xe8\nGamma", self._readBytes("crlf.java"))
+
+    def testTextModePreservingNewlines(self):
+        self._writeBytes(b"Alpha  \r\nBeta\n", "crlf.java")
+
+        TrailingSpaceRemover(
+            r".*\.java$", FileAccessOptions(encoding="utf-8", preserveNewlines=True)
+        ).applyTo(self._tempFileTreePath)
+
+        self.assertEqual(b"Alpha\r\nBeta\n", self._readBytes("crlf.java"))
+
+    def testTextModePreservingCarriageReturnNewlines(self):
+        self._writeBytes(b"one  \rtwo \rthree\r", "cr.java")
+
+        TrailingSpaceRemover(
+            r".*\.java$", FileAccessOptions(encoding="utf-8", preserveNewlines=True)
+        ).applyTo(self._tempFileTreePath)
+
+        self.assertEqual(b"one\rtwo\rthree\r", self._readBytes("cr.java"))
+
+    def testTextModeWithErrorHandler(self):
+        self._writeBytes(b"Caf\xe9  \nCaf\xc3\xa9 \n", "mixed.java")
+
+        TrailingSpaceRemover(
+            r".*\.java$",
+            FileAccessOptions(
+                encoding="utf-8", errors="surrogateescape", preserveNewlines=True
+            ),
+        ).applyTo(self._tempFileTreePath)
+
+        self.assertEqual(b"Caf\xe9\nCaf\xc3\xa9\n", self._readBytes("mixed.java"))
+
+    def testBinaryHeaderRemover(self):
+        HeaderRemover(
+            r".*\.java$",
+            r"(?s)^.*==========================%##\s+\*/[\r\n]+",
+            FileAccessOptions(binary=True),
+        ).applyTo(self._tempFileTreePath)
+
+        self.assertEqual(
+            b"package test;\n\nclass Hello {}\n",
+            self._readBytes("alpha", "beta", "lambda.java"),
+        )
+
+
+class AtomicFileAccessTests(FileTreeTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self._spacesPath = os.path.join(self._tempFileTreePath, "gamma", "spaces.java")
+
+    def _getTempFileNames(self):
+        return [
+            fileName
+            for _, _, fileNames in os.walk(self._tempFileTreePath)
+            for fileName in fileNames
+            if fileName.endswith(".tmp")
+        ]
+
+    def testAtomicRewritePreservesPermissions(self):
+        os.chmod(self._spacesPath, 0o640)
+
+        TrailingSpaceRemover(r".*\.java$", FileAccessOptions(atomic=True)).applyTo(
+            self._tempFileTreePath
+        )
+
+        with open(self._spacesPath, "r") as sourceFile:
+            self.assertEqual("This file\n", sourceFile.readline())
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(self._spacesPath).st_mode))
+        self.assertEqual([], self._getTempFileNames())
+
+    def testAtomicRewriteThroughSymbolicLink(self):
+        linkPath = os.path.join(self._tempFileTreePath, "spacesLink.java")
+        os.symlink(self._spacesPath, linkPath)
+
+        TrailingSpaceRemover(
+            r".*spacesLink\.java$", FileAccessOptions(atomic=True)
+        ).applyTo(self._tempFileTreePath)
+
+        self.assertTrue(os.path.islink(linkPath))
+        with open(self._spacesPath, "r") as sourceFile:
+            self.assertEqual("This file\n", sourceFile.readline())
+
+    def testFailedAtomicRewriteLeavesTheOriginal(self):
+        class FailingProcessor(FileTreeLineProcessor):
+            def _processLines(self, lines):
+                return lines + [None]
+
+        with open(self._spacesPath, "r") as sourceFile:
+            originalContent = sourceFile.read()
+
+        with self.assertRaises(TypeError):
+            FailingProcessor(
+                r".*spaces\.java$", FileAccessOptions(atomic=True)
+            ).applyTo(self._tempFileTreePath)
+
+        with open(self._spacesPath, "r") as sourceFile:
+            self.assertEqual(originalContent, sourceFile.read())
+        self.assertEqual([], self._getTempFileNames())
+
+    def testDirectorySyncsAreBatched(self):
+        class BatchRecorder(TrailingSpaceRemover):
+            def __init__(self, filePathPattern, fileAccess):
+                super().__init__(filePathPattern, fileAccess)
+                self.batches = []
+
+            def _processFile(self, filePath):
+                self.batches.append(self._getDirectorySyncBatch())
+                super()._processFile(filePath)
+
+        processor = BatchRecorder(r".*\.java$", FileAccessOptions(atomic=True))
+        processor.applyTo(self._tempFileTreePath)
+
+        self.assertGreater(len(processor.batches), 1)
+        self.assertIsNotNone(processor.batches[0])
+        self.assertEqual(1, len(set(map(id, processor.batches))))
+        self.assertIsNone(processor._getDirectorySyncBatch())
+
+    def testOverlappingRunsKeepTheirOwnBatches(self):
+        otherTreePath = os.path.join(self._tempTestPath, "other")
+        shutil.copytree(self._tempFileTreePath, otherTreePath)
+
+        class OverlappingRunner(TrailingSpaceRemover):
+            def __init__(self, filePathPattern, fileAccess):
+                super().__init__(filePathPattern, fileAccess)
+                self.batchPairs = []
+
+            def _processFile(self, filePath):
+                if filePath.startswith(otherTreePath):
+                    return super()._processFile(filePath)
+
+                outerBatch = self._getDirectorySyncBatch()
+                self.applyTo(otherTreePath)
+                self.batchPairs.append((outerBatch, self._getDirectorySyncBatch()))
+
+                return super()._processFile(filePath)
+
+        processor = OverlappingRunner(
+            r".*spaces\.java$", FileAccessOptions(atomic=True)
+        )
+        processor.applyTo(self._tempFileTreePath)
+
+        self.assertEqual(1, len(processor.batchPairs))
+        outerBatch, batchAfterOverlap = processor.batchPairs[0]
+        self.assertIsNotNone(outerBatch)
+        self.assertIs(outerBatch, batchAfterOverlap)
+
+
+class SearchReplaceProcessorTests(FileTreeTestCase):
+    def _getFilePath(self, *relativeComponents):
+        return os.path.join(self._tempFileTreePath, *relativeComponents)
+
+    def _readFile(self, *relativeComponents):
+        with open(self._getFilePath(*relativeComponents), "r") as sourceFile:
+            return sourceFile.read()
+
+    def testLiteralReplacementsInOnePass(self):
+        SearchReplaceProcessor(
+            r".*lambda\.java$",
+            {"test": "demo", "Hello": "Greeting", "Hell": "WRONG", "demo": "WRONG"},
+        ).applyTo(self._tempFileTreePath)
+
+        self.assertTrue(
+            self._readFile("alpha", "beta", "lambda.java").endswith(
+                "package demo;\n\nclass Greeting {}\n"
+            )
+        )
+
+    def testRegexReplacementsAfterLiterals(self):
+        SearchReplaceProcessor(
+            r".*ni\.java$",
+            {"Hello2": "World"},
+            [(r"class (\w+)", r"interface \1"), (re.compile(r"^package \w+;"), "")],
+        ).applyTo(self._tempFileTreePath)
+
+        self.assertEqual(
+            "\n\ninterface World {}\n", self._readFile("alpha", "beta", "ni.java")
+        )
+
+    def testFilesWithoutMatchesAreNotRewritten(self):
+        filePath = self._getFilePath("alpha", "beta", "ni.java")
+        os.utime(filePath, ns=(1000000000, 1000000000))
+
+        SearchReplaceProcessor(
+            r".*\.java$", {"INEXISTENT": "X"}, [(r"MISSING\d+", "Y")]
+        ).applyTo(self._tempFileTreePath)
+
+        self.assertEqual(1000000000, os.stat(filePath).st_mtime_ns)
+
+    def testManyLiteralsWithoutPrefilter(self):
+        literalReplacements = {
+            "MISSING{0}".format(index): "X"
+            for index in range(SearchReplaceProcessor._maxPrefilterLiteralCount)
+        }
+        literalReplacements["Hello2"] = "World"
+
+        processor = SearchReplaceProcessor(r".*ni\.java$", literalReplacements)
+        processor.applyTo(self._tempFileTreePath)
+
+        self.assertIsNone(processor._prefilterLiterals)
+        self.assertTrue(
+            self._readFile("alpha", "beta", "ni.java").endswith("class World {}\n")
+        )
+
+    def testBinaryMode(self):
+        SearchReplaceProcessor(
+            r".*ni\.java$",
+            {"Hello2": "World"},
+            [(r"^package", b"module")],
+            FileAccessOptions(binary=True),
+        ).applyTo(self._tempFileTreePath)
+
+        self.assertEqual(
+            "module test;\n\nclass World {}\n",
+            self._readFile("alpha", "beta", "ni.java"),
+        )
+
+
+class AsyncFileTreeDriverTests(FileTreeTestCase):
+    def _runAsync(self, coroutine):
+        eventLoop = asyncio.new_event_loop()
+        try:
+            return eventLoop.run_until_complete(coroutine)
+        finally:
+            eventLoop.close()
+
+    def _getMatchingPaths(self, filePathPattern):
+        return sorted(
+            os.path.join(dirPath, fileName)
+            for dirPath, _, fileNames in os.walk(self._tempFileTreePath)
+            for fileName in fileNames
+            if re.match(filePathPattern, os.path.join(dirPath, fileName))
+        )
+
+    def testApplyTo(self):
+        filePathPattern = r".*\.(java|cs|js|c|cpp)$"
+        driver = AsyncFileTreeDriver(
+            TrailingSpaceRemover(filePathPattern), maxConcurrency=2
+        )
+
+        results = self._runAsync(driver.applyTo(self._tempFileTreePath))
+
+        self.assertEqual(
+            self._getMatchingPaths(filePathPattern),
+            sorted(result.getPath() for result in results),
+        )
+        self.assertTrue(all(result.isSuccessful() for result in results))
+
+        with open(
+            os.path.join(self._tempFileTreePath, "gamma", "spaces.java"), "r"
+        ) as sourceFile:
+            self.assertEqual("This file\n", sourceFile.readline())
+
+    def testIterateReportsFailures(self):
+        class FailingProcessor(FileTreeLineProcessor):
+            def _processLine(self, line):
+                raise ValueError("Failure")
+
+        driver = AsyncFileTreeDriver(FailingProcessor(r".*\.java$"))
+
+        async def collectErrors():
+            return [
+                result.getError()
+                async for result in driver.iterate(self._tempFileTreePath)
+            ]
+
+        errors = self._runAsync(collectErrors())
+
+        self.assertGreater(len(errors), 0)
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+
+    def testOnProcessingCanRejectFiles(self):
+        processor = TrailingSpaceRemover(r".*\.java$")
+        processor.onProcessing = lambda filePath: "gamma" in filePath
+
+        results = self._runAsync(
+            AsyncFileTreeDriver(processor).applyTo(self._tempFileTreePath)
+        )
+
+        self.assertEqual(
+            self._getMatchingPaths(r".*gamma.*\.java$"),
+            sorted(result.getPath() for result in results),
+        )
+
+    def testEarlyExit(self):
+        driver = AsyncFileTreeDriver(TrailingSpaceRemover(r".*"), maxConcurrency=1)
+
+        async def takeFirst():
+            results = driver.iterate(self._tempFileTreePath)
+
+            try:
+                async for result in results:
+                    return result
+            finally:
+                await results.aclose()
+
+        self.assertTrue(self._runAsync(takeFirst()).isSuccessful())
+
+    def testApplyToNonDirectory(self):
+        driver = AsyncFileTreeDriver(TrailingSpaceRemover(r".*"))
+
+        with self.assertRaises(ValueError):
+            self._runAsync(
+                driver.applyTo(os.path.join(self._tempFileTreePath, "INEXISTENT"))
+            )
+
+
+class FileTreeMetricsTests(FileTreeTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self._allFilePaths = [
+            os.path.join(dirPath, fileName)
+            for dirPath, _, fileNames in os.walk(self._tempFileTreePath)
+            for fileName in fileNames
+        ]
+        self._javaFilePaths = [
+            filePath for filePath in self._allFilePaths if filePath.endswith(".java")
+        ]
+
+    def testCounters(self):
+        processor = TrailingSpaceRemover(r".*\.java$")
+        processor.onProcessing = lambda filePath: not filePath.endswith("ni.java")
+        processor.metrics = FileTreeMetrics()
+
+        spacesPath = os.path.join(self._tempFileTreePath, "gamma", "spaces.java")
+        spacesSize = os.path.getsize(spacesPath)
+
+        processor.applyTo(self._tempFileTreePath)
+
+        metrics = processor.metrics
+        self.assertEqual(len(self._allFilePaths), metrics.getScannedCount())
+        self.assertEqual(len(self._javaFilePaths), metrics.getMatchedCount())
+        self.assertEqual(1, metrics.getSkippedCount())
+        self.assertEqual(len(self._javaFilePaths) - 1, metrics.getProcessedCount())
+        self.assertEqual(1, metrics.getChangedCount())
+        self.assertEqual(os.path.getsize(spacesPath), metrics.getBytesWritten())
+        self.assertGreaterEqual(metrics.getBytesRead(), spacesSize)
+        self.assertGreater(metrics.getElapsedTime(), 0)
+        self.assertGreaterEqual(
+            metrics.getElapsedTime(),
+            metrics.getWalkTime() + metrics.getProcessingTime(),
+        )
+
+    def testProcessorsReportChanges(self):
+        processor = TrailingSpaceRemover(r".*\.java$")
+        processor.metrics = FileTreeMetrics()
+
+        processor.applyTo(self._tempFileTreePath)
+        processor.applyTo(self._tempFileTreePath)
+
+        self.assertEqual(1, processor.metrics.getChangedCount())
+        self.assertEqual(
+            2 * len(self._javaFilePaths), processor.metrics.getProcessedCount()
+        )
+
+    def testLineProcessorReportsUnchangedFiles(self):
+        class IdentityProcessor(FileTreeLineProcessor):
+            def _processLine(self, line):
+                return line
+
+        processor = IdentityProcessor(r".*\.java$")
+        processor.metrics = FileTreeMetrics()
+
+        processor.applyTo(self._tempFileTreePath)
+
+        self.assertEqual(0, processor.metrics.getChangedCount())
+        self.assertEqual(0, processor.metrics.getBytesWritten())
+
+    def testProgressReporter(self):
+        output = io.StringIO()
+
+        processor = TrailingSpaceRemover(r".*\.java$")
+        processor.metrics = FileTreeMetrics(
+            ProgressReporter(interval=0, expectedFileCount=100, output=output)
+        )
+
+        processor.applyTo(self._tempFileTreePath)
+
+        outputLines = output.getvalue().splitlines()
+        self.assertTrue(outputLines[0].startswith("1 files done ("))
+        self.assertIn("ETA", outputLines[0])
+        self.assertEqual(
+            processor.metrics.getReport().splitlines(),
+            outputLines[-len(processor.metrics.getReport().splitlines()) :],
+        )
+
+    def testProgressWithoutExpectedFileCountOmitsTheEta(self):
+        output = io.StringIO()
+
+        processor = TrailingSpaceRemover(r".*\.java$")
+        processor.metrics = FileTreeMetrics(ProgressReporter(interval=0, output=output))
+
+        processor.applyTo(self._tempFileTreePath)
+
+        progressLines = [
+            line for line in output.getvalue().splitlines() if "files done" in line
+        ]
+        self.assertGreater(len(progressLines), 0)
+        self.assertFalse(any("ETA" in line for line in progressLines))
+
+    def testProgressIsRateLimited(self):
+        output = io.StringIO()
+
+        processor = TrailingSpaceRemover(r".*\.java$")
+        processor.metrics = FileTreeMetrics(
+            ProgressReporter(interval=3600, output=output)
+        )
+
+        processor.applyTo(self._tempFileTreePath)
+
+        progressLines = [
+            line for line in output.getvalue().splitlines() if "files done" in line
+        ]
+        self.assertEqual(1, len(progressLines))
+
+    def testAsyncDriverUpdatesMetrics(self):
+        processor = TrailingSpaceRemover(r".*\.java$")
+        processor.metrics = FileTreeMetrics()
+
+        eventLoop = asyncio.new_event_loop()
+        try:
+            eventLoop.run_until_complete(
+                AsyncFileTreeDriver(processor).applyTo(self._tempFileTreePath)
+            )
+        finally:
+            eventLoop.close()
+
+        self.assertEqual(len(self._allFilePaths), processor.metrics.getScannedCount())
+        self.assertEqual(
+            len(self._javaFilePaths), processor.metrics.getProcessedCount()
+        )
+        self.assertEqual(1, processor.metrics.getChangedCount())
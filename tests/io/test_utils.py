@@ -5,8 +5,16 @@
 
 import os
 import shutil
+import threading
+import time
 
-from info.gianlucacosta.iris.io.utils import PathOperations
+from info.gianlucacosta.iris.io.utils import (
+    PathOperations,
+    AtomicFileWriter,
+    DirectoryLock,
+    DirectorySyncBatch,
+    TreeSynchronizer,
+)
 
 from . import AbstractIoTestCase
 
@@ -141,3 +149,278 @@ class PathOperationsTests(AbstractIoTestCase):
 
         assert not os.path.isdir(tempTreePath)
         assert PathOperations.safeRmTree(tempTreePath)
+
+
+class BulkPathOperationsTests(AbstractIoTestCase):
+    def _getTempPaths(self, *relativePaths):
+        return [
+            os.path.join(self._tempTestPath, *relativePath.split("/"))
+            for relativePath in relativePaths
+        ]
+
+    def testBulkMakeDirs(self):
+        dirPaths = self._getTempPaths("alpha/beta", "alpha", "alpha/beta", "gamma")
+
+        results = PathOperations.bulkMakeDirs(dirPaths, maxWorkers=2)
+
+        self.assertEqual(dirPaths, [result.getPath() for result in results])
+        self.assertTrue(all(result.isSuccessful() for result in results))
+        self.assertTrue(all(os.path.isdir(dirPath) for dirPath in dirPaths))
+
+    def testBulkMakeDirsWhenAFileIsInTheWay(self):
+        (filePath,) = self._getTempPaths("alpha")
+        PathOperations.touch(filePath)
+
+        (result,) = PathOperations.bulkMakeDirs(self._getTempPaths("alpha/beta"))
+
+        self.assertFalse(result.isSuccessful())
+        self.assertIsInstance(result.getError(), OSError)
+
+    def testBulkTouch(self):
+        filePaths = self._getTempPaths("alpha/beta/T1", "alpha/beta/T2", "gamma/T3")
+
+        results = PathOperations.bulkTouch(filePaths)
+
+        self.assertTrue(all(result.isSuccessful() for result in results))
+        self.assertTrue(all(os.path.isfile(filePath) for filePath in filePaths))
+
+    def testBulkRemove(self):
+        filePaths = self._getTempPaths("alpha/T1", "alpha/T2")
+        PathOperations.bulkTouch(filePaths)
+
+        results = PathOperations.bulkRemove(filePaths + self._getTempPaths("missing"))
+
+        self.assertEqual(
+            [True, True, False], [result.isSuccessful() for result in results]
+        )
+        self.assertFalse(any(os.path.exists(filePath) for filePath in filePaths))
+
+    def testBulkCopy(self):
+        sourcePaths = self._getTempPaths("source/T1", "source/T2")
+        targetPaths = self._getTempPaths("target/alpha/T1", "target/beta/T2")
+        PathOperations.bulkTouch(sourcePaths)
+
+        results = PathOperations.bulkCopy(zip(sourcePaths, targetPaths))
+
+        self.assertTrue(all(result.isSuccessful() for result in results))
+        self.assertTrue(all(os.path.isfile(targetPath) for targetPath in targetPaths))
+
+    def testParallelRmTree(self):
+        tempTreePath = os.path.join(self._tempTestPath, "tree")
+        shutil.copytree(os.path.join(self._ioTestPath, "tree"), tempTreePath)
+
+        results = PathOperations.parallelRmTree(tempTreePath)
+
+        self.assertEqual(4, len(results))
+        self.assertEqual(tempTreePath, results[-1].getPath())
+        self.assertTrue(all(result.isSuccessful() for result in results))
+        self.assertFalse(os.path.exists(tempTreePath))
+
+    def testParallelRmTreeOnInexistentTree(self):
+        (result,) = PathOperations.parallelRmTree(
+            os.path.join(self._tempTestPath, "INEXISTENT_TREE")
+        )
+
+        self.assertFalse(result.isSuccessful())
+
+
+class TreeSynchronizerTests(AbstractIoTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self._sourcePath = os.path.join(self._tempTestPath, "source")
+        self._targetPath = os.path.join(self._tempTestPath, "target")
+        shutil.copytree(os.path.join(self._ioTestPath, "tree"), self._sourcePath)
+
+    def _readTree(self, rootPath):
+        result = {}
+
+        for item in PathOperations.linearWalk(rootPath):
+            with open(item.getPath(), "rb") as treeFile:
+                result[os.path.relpath(item.getPath(), rootPath)] = treeFile.read()
+
+        return result
+
+    def testFastCopyFile(self):
+        sourcePath = os.path.join(self._tempTestPath, "T1")
+        targetPath = os.path.join(self._tempTestPath, "T2")
+
+        with open(sourcePath, "wb") as sourceFile:
+            sourceFile.write(os.urandom(100000))
+        os.utime(sourcePath, ns=(1000000000, 1000000000))
+
+        copyTechnique = PathOperations.fastCopyFile(sourcePath, targetPath)
+
+        self.assertIn(
+            copyTechnique, ("reflink", "copy_file_range", "sendfile", "userspace")
+        )
+        with open(sourcePath, "rb") as sourceFile, open(targetPath, "rb") as targetFile:
+            self.assertEqual(sourceFile.read(), targetFile.read())
+        self.assertEqual(1000000000, os.stat(targetPath).st_mtime_ns)
+
+    def testSyncCopiesTheTree(self):
+        report = TreeSynchronizer().sync(self._sourcePath, self._targetPath)
+
+        self.assertEqual(4, report.getCopiedCount())
+        self.assertEqual(0, report.getSkippedCount())
+        self.assertEqual([], report.getFailedResults())
+        self.assertEqual(4, sum(report.getCopyTechniqueCounts().values()))
+        self.assertEqual(
+            self._readTree(self._sourcePath), self._readTree(self._targetPath)
+        )
+
+    def testSyncSkipsUpToDateFiles(self):
+        synchronizer = TreeSynchronizer(maxWorkers=1)
+        synchronizer.sync(self._sourcePath, self._targetPath)
+
+        with open(os.path.join(self._sourcePath, "alpha", "T1"), "a") as changedFile:
+            changedFile.write("Extra line\n")
+
+        report = synchronizer.sync(self._sourcePath, self._targetPath)
+
+        self.assertEqual(1, report.getCopiedCount())
+        self.assertEqual(3, report.getSkippedCount())
+        self.assertEqual(
+            self._readTree(self._sourcePath), self._readTree(self._targetPath)
+        )
+
+    def testSyncDeletingExtraneousFiles(self):
+        extraneousPath = os.path.join(self._targetPath, "alpha", "EXTRA")
+        PathOperations.touch(extraneousPath)
+
+        report = TreeSynchronizer(deleteExtraneous=True).sync(
+            self._sourcePath, self._targetPath
+        )
+
+        self.assertEqual(
+            [extraneousPath],
+            [result.getPath() for result in report.getDeletionResults()],
+        )
+        self.assertFalse(os.path.exists(extraneousPath))
+        self.assertEqual(
+            self._readTree(self._sourcePath), self._readTree(self._targetPath)
+        )
+
+    def testSyncReplacesSymbolicLinksInTheTarget(self):
+        outsidePath = os.path.join(self._tempTestPath, "outside.txt")
+        shutil.copy2(os.path.join(self._sourcePath, "alpha", "T1"), outsidePath)
+
+        linkPath = os.path.join(self._targetPath, "alpha", "T1")
+        os.makedirs(os.path.dirname(linkPath))
+        os.symlink(outsidePath, linkPath)
+
+        with open(outsidePath, "rb") as outsideFile:
+            outsideContent = outsideFile.read()
+
+        report = TreeSynchronizer().sync(self._sourcePath, self._targetPath)
+
+        self.assertEqual(4, report.getCopiedCount())
+        self.assertFalse(os.path.islink(linkPath))
+        with open(outsidePath, "rb") as outsideFile:
+            self.assertEqual(outsideContent, outsideFile.read())
+        self.assertEqual(
+            self._readTree(self._sourcePath), self._readTree(self._targetPath)
+        )
+        self.assertEqual(["T1", "gamma"], sorted(os.listdir(os.path.dirname(linkPath))))
+
+
+class AtomicFileWriterTests(AbstractIoTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self._targetPath = os.path.join(self._tempTestPath, "target.txt")
+
+        with open(self._targetPath, "w") as targetFile:
+            targetFile.write("Original")
+
+        os.chmod(self._targetPath, 0o640)
+
+    def _readTarget(self):
+        with open(self._targetPath, "r") as targetFile:
+            return targetFile.read()
+
+    def testWriteReplacesTheContent(self):
+        with AtomicFileWriter(self._targetPath) as targetFile:
+            targetFile.write("Replaced")
+
+        self.assertEqual("Replaced", self._readTarget())
+        self.assertEqual(["target.txt"], os.listdir(self._tempTestPath))
+
+    def testWritePreservesPermissions(self):
+        with AtomicFileWriter(self._targetPath) as targetFile:
+            targetFile.write("Replaced")
+
+        self.assertEqual(0o640, os.stat(self._targetPath).st_mode & 0o777)
+
+    def testWriteThroughSymbolicLink(self):
+        linkPath = os.path.join(self._tempTestPath, "link.txt")
+        os.symlink(self._targetPath, linkPath)
+
+        with AtomicFileWriter(linkPath) as targetFile:
+            targetFile.write("Replaced")
+
+        self.assertTrue(os.path.islink(linkPath))
+        self.assertEqual("Replaced", self._readTarget())
+
+    def testWriteRejectsHardLinkedFiles(self):
+        linkPath = os.path.join(self._tempTestPath, "link.txt")
+        os.link(self._targetPath, linkPath)
+
+        def writeLink():
+            with AtomicFileWriter(linkPath) as targetFile:
+                targetFile.write("Replaced")
+
+        self.assertRaises(OSError, writeLink)
+
+        self.assertEqual("Original", self._readTarget())
+        self.assertEqual(2, os.stat(linkPath).st_nlink)
+        self.assertEqual(
+            ["link.txt", "target.txt"], sorted(os.listdir(self._tempTestPath))
+        )
+
+    def testFailedWriteLeavesTheOriginal(self):
+        def failingWrite():
+            with AtomicFileWriter(self._targetPath) as targetFile:
+                targetFile.write("Partial")
+                raise RuntimeError("Interrupted")
+
+        self.assertRaises(RuntimeError, failingWrite)
+
+        self.assertEqual("Original", self._readTarget())
+        self.assertEqual(["target.txt"], os.listdir(self._tempTestPath))
+
+    def testWriteWithDirectorySyncBatch(self):
+        with DirectorySyncBatch() as directorySyncBatch:
+            PathOperations.atomicWrite(
+                self._targetPath, b"Bytes", directorySyncBatch=directorySyncBatch
+            )
+
+        self.assertEqual("Bytes", self._readTarget())
+
+    def testIsTempFileName(self):
+        self.assertTrue(AtomicFileWriter.isTempFileName(".target.txt.0123.tmp"))
+        self.assertFalse(AtomicFileWriter.isTempFileName("target.txt"))
+
+
+class DirectoryLockTests(AbstractIoTestCase):
+    def testLockSerializesThreads(self):
+        events = []
+
+        def lockedWork(name):
+            with DirectoryLock(self._tempTestPath):
+                events.append(name)
+                time.sleep(0.01)
+                events.append(name)
+
+        threads = [
+            threading.Thread(target=lockedWork, args=(name,)) for name in range(4)
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        for index in range(0, len(events), 2):
+            self.assertEqual(events[index], events[index + 1])
@@ -0,0 +1,123 @@
+"""
+:copyright: Copyright (C) 2013-2022 Gianluca Costa.
+:license: LGPLv3, see LICENSE for details.
+"""
+
+import os
+import threading
+import unittest
+
+from info.gianlucacosta.iris.io.utils import PathOperations
+from info.gianlucacosta.iris.io.watching import (
+    InotifyDirectoryWatcher,
+    PollingDirectoryWatcher,
+    SharedDirectoryWatchers,
+)
+
+from . import AbstractIoTestCase
+
+
+class DirectoryWatcherTests:
+    """
+    Tests shared by every DirectoryWatcher implementation
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        self._watchedDirPath = os.path.join(self._tempTestPath, "watched")
+        os.makedirs(self._watchedDirPath)
+
+        PathOperations.touch(os.path.join(self._watchedDirPath, "initial"))
+
+        self._watcher = self._createWatcher()
+        self._changes = []
+        self._changeEvent = threading.Event()
+
+        def listener(entryName, exists):
+            self._changes.append((entryName, exists))
+            self._changeEvent.set()
+
+        self._watcher.addListener(listener)
+        self._watcher.start()
+
+    def tearDown(self):
+        self._watcher.stop()
+        super().tearDown()
+
+    def _waitForChange(self):
+        assert self._changeEvent.wait(5)
+        self._changeEvent.clear()
+
+    def testInitialScan(self):
+        self.assertTrue(self._watcher.contains("initial"))
+        self.assertEqual(frozenset(["initial"]), self._watcher.getEntryNames())
+
+    def testEntryCreation(self):
+        self._changes.clear()
+        self._changeEvent.clear()
+
+        PathOperations.touch(os.path.join(self._watchedDirPath, "created"))
+        self._waitForChange()
+
+        self.assertTrue(self._watcher.contains("created"))
+        self.assertEqual([("created", True)], self._changes)
+
+    def testEntryRemoval(self):
+        self._changes.clear()
+        self._changeEvent.clear()
+
+        os.remove(os.path.join(self._watchedDirPath, "initial"))
+        self._waitForChange()
+
+        self.assertFalse(self._watcher.contains("initial"))
+        self.assertEqual([("initial", False)], self._changes)
+
+    def testIgnoreDirs(self):
+        os.mkdir(os.path.join(self._watchedDirPath, "initialDir"))
+
+        with self._createWatcher(ignoreDirs=True) as watcher:
+            changeEvent = threading.Event()
+            watcher.addListener(lambda entryName, exists: changeEvent.set())
+
+            os.mkdir(os.path.join(self._watchedDirPath, "createdDir"))
+            PathOperations.touch(os.path.join(self._watchedDirPath, "created"))
+            self.assertTrue(changeEvent.wait(5))
+
+            self.assertEqual(frozenset(["initial", "created"]), watcher.getEntryNames())
+
+    def testNotifyChange(self):
+        self._watcher.notifyChange("local", True)
+
+        self.assertTrue(self._watcher.contains("local"))
+
+
+class PollingDirectoryWatcherTests(DirectoryWatcherTests, AbstractIoTestCase):
+    def _createWatcher(self, ignoreDirs=False):
+        return PollingDirectoryWatcher(self._watchedDirPath, 0.01, ignoreDirs)
+
+
+@unittest.skipUnless(InotifyDirectoryWatcher.isSupported(), "inotify not available")
+class InotifyDirectoryWatcherTests(DirectoryWatcherTests, AbstractIoTestCase):
+    def _createWatcher(self, ignoreDirs=False):
+        return InotifyDirectoryWatcher(self._watchedDirPath, ignoreDirs)
+
+
+@unittest.skipUnless(InotifyDirectoryWatcher.isSupported(), "inotify not available")
+class SharedDirectoryWatchersTests(AbstractIoTestCase):
+    def testAcquireReturnsTheSameWatcher(self):
+        firstWatcher = SharedDirectoryWatchers.acquire(self._tempTestPath)
+        secondWatcher = SharedDirectoryWatchers.acquire(self._tempTestPath)
+
+        self.assertIs(firstWatcher, secondWatcher)
+
+        SharedDirectoryWatchers.release(firstWatcher)
+        self.assertTrue(secondWatcher.isRunning())
+
+        SharedDirectoryWatchers.release(secondWatcher)
+        self.assertFalse(secondWatcher.isRunning())
+
+    def testAcquireOnMissingDirectory(self):
+        self.assertIsNone(
+            SharedDirectoryWatchers.acquire(os.path.join(self._tempTestPath, "missing"))
+        )
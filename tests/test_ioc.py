@@ -3,12 +3,16 @@
 :license: LGPLv3, see LICENSE for details.
 """
 
+import time
 import unittest
 
 from info.gianlucacosta.iris.ioc import (
     Container,
     TransientRegistration,
     SingletonRegistration,
+    ContainerInstrumentation,
+    CompositeInstrumentation,
+    ResolutionStatistics,
 )
 
 
@@ -123,3 +127,303 @@ class ContainerTests(unittest.TestCase):
         ).resolve(MyIocClass)
 
         self.assertEqual(1, MyIocClass._instances)
+
+
+class WarmUpTests(unittest.TestCase):
+    def setUp(self):
+        self._container = Container()
+        self._creationOrder = []
+
+    def _createFactory(self, name, *dependencyKeys):
+        def factory(container, key):
+            dependencies = [
+                container.resolve(dependency) for dependency in dependencyKeys
+            ]
+            self._creationOrder.append(name)
+            return (name, dependencies)
+
+        return factory
+
+    def testWarmUpCreatesSingletonsOnly(self):
+        self._container.registerSingleton("alpha", self._createFactory("alpha"))
+        self._container.registerTransient("beta", self._createFactory("beta"))
+
+        report = self._container.warmUp()
+
+        self.assertEqual(["alpha"], self._creationOrder)
+        self.assertEqual({"alpha"}, set(report.getTimings().keys()))
+
+    def testWarmUpFollowsDeclaredDependencies(self):
+        self._container.registerSingleton(
+            "service", self._createFactory("service", "pool"), dependencies=["pool"]
+        )
+        self._container.registerSingleton("pool", self._createFactory("pool"))
+
+        report = self._container.warmUp()
+
+        self.assertEqual(["pool", "service"], self._creationOrder)
+        self.assertEqual([["pool"], ["service"]], report.getLevels())
+
+    def testResolveRecordsNestedDependencies(self):
+        self._container.registerSingleton(
+            "service", self._createFactory("service", "pool")
+        )
+        self._container.registerTransient("pool", self._createFactory("pool"))
+
+        self._container.resolve("service")
+
+        self.assertEqual(
+            {"service": {"pool"}, "pool": set()},
+            self._container.getDependencyGraph(),
+        )
+
+    def testResolveRecordsAlreadyCreatedDependencies(self):
+        self._container.registerSingleton(
+            "service", self._createFactory("service", "pool")
+        )
+        self._container.registerSingleton("pool", self._createFactory("pool"))
+
+        self._container.resolve("pool")
+        self._container.resolve("service")
+
+        self.assertEqual({"pool"}, self._container.getDependencyGraph()["service"])
+
+    def testResolvingExistingInstancesRecordsNothing(self):
+        self._container.registerSingleton("pool", self._createFactory("pool"))
+        self._container.registerSingleton("cache", self._createFactory("cache"))
+
+        self._container.resolve("pool")
+        self._container.resolve("cache")
+        self._container.resolve("pool")
+
+        self.assertEqual(["pool", "cache"], list(self._container._resolvedKeys))
+        self.assertEqual(
+            {"pool": set(), "cache": set()}, self._container.getDependencyGraph()
+        )
+
+    def testTransientDependenciesAreRecordedWhenNested(self):
+        self._container.registerSingleton(
+            "service", self._createFactory("service", "connection")
+        )
+        self._container.registerTransient(
+            "connection", self._createFactory("connection", "pool")
+        )
+        self._container.registerSingleton("pool", self._createFactory("pool"))
+
+        self._container.resolve("connection")
+
+        self.assertEqual(["pool"], list(self._container._resolvedKeys))
+        self.assertEqual({}, self._container._resolutionStacks)
+
+        self._container.resolve("service")
+
+        self.assertEqual(
+            {"service": {"connection"}, "connection": {"pool"}, "pool": set()},
+            self._container.getDependencyGraph(),
+        )
+        self.assertEqual({}, self._container._resolutionStacks)
+
+    def testWarmUpWithUndeclaredDependencies(self):
+        self._container.registerSingleton(
+            "service", self._createFactory("service", "pool")
+        )
+        self._container.registerSingleton("pool", self._createFactory("pool"))
+
+        self._container.warmUp(maxWorkers=1)
+
+        self.assertEqual(["pool", "service"], self._creationOrder)
+        self.assertIs(
+            self._container.resolve("pool"), self._container.resolve("service")[1][0]
+        )
+
+    def testWarmUpWithCircularDependencies(self):
+        self._container.registerSingleton(
+            "alpha", self._createFactory("alpha"), dependencies=["beta"]
+        )
+        self._container.registerSingleton(
+            "beta", self._createFactory("beta"), dependencies=["alpha"]
+        )
+
+        self.assertRaises(ValueError, self._container.warmUp)
+
+    def testWarmUpWithUnknownDependency(self):
+        self._container.registerSingleton(
+            "alpha", self._createFactory("alpha"), dependencies=["omega"]
+        )
+
+        self.assertRaises(KeyError, self._container.warmUp)
+
+
+class DisposalTests(unittest.TestCase):
+    def setUp(self):
+        self._container = Container()
+        self._disposalOrder = []
+
+    def _registerSingleton(self, name, *dependencyKeys, disposalTime=0):
+        def factory(container, key):
+            for dependency in dependencyKeys:
+                container.resolve(dependency)
+
+            return name
+
+        def disposeMethod(instance):
+            time.sleep(disposalTime)
+            self._disposalOrder.append(instance)
+
+        self._container.registerSingleton(name, factory, disposeMethod)
+
+    def testDisposeInReverseCreationOrder(self):
+        self._registerSingleton("pool")
+        self._registerSingleton("service", "pool")
+        self._registerSingleton("cache")
+
+        self._container.resolve("service")
+        self._container.resolve("cache")
+
+        report = self._container.dispose()
+
+        self.assertEqual(["cache", "service", "pool"], self._disposalOrder)
+        self.assertEqual(["cache", "service", "pool"], report.getOrder())
+
+    def testDisposeFollowsDeclaredDependencies(self):
+        self._container.registerSingleton(
+            "service", lambda container, key: "service", dependencies=["pool"]
+        )
+        self._container.registerSingleton("pool", lambda container, key: "pool")
+
+        self._container.resolve("service")
+        self._container.resolve("pool")
+
+        report = self._container.dispose()
+
+        self.assertEqual(["service", "pool"], report.getOrder())
+
+    def testDisposeConcurrentlyRespectsDependencies(self):
+        self._registerSingleton("pool")
+        self._registerSingleton("service", "pool", disposalTime=0.05)
+        self._registerSingleton("cache")
+
+        self._container.resolve("service")
+        self._container.resolve("cache")
+
+        report = self._container.dispose(maxWorkers=4)
+
+        self.assertLess(
+            self._disposalOrder.index("service"), self._disposalOrder.index("pool")
+        )
+        self.assertEqual({"pool", "service", "cache"}, set(report.getTimings()))
+
+    def testDisposeWithTimeout(self):
+        self._registerSingleton("pool")
+        self._registerSingleton("service", "pool", disposalTime=0.5)
+
+        self._container.resolve("service")
+
+        report = self._container.dispose(timeout=0.05)
+
+        self.assertEqual(["service"], report.getTimedOutKeys())
+        self.assertEqual(["pool"], self._disposalOrder)
+
+    def testDisposeCollectsErrors(self):
+        def failingDispose(instance):
+            raise RuntimeError("Cannot dispose")
+
+        self._container.registerSingleton(
+            "alpha", lambda container, key: "alpha", failingDispose
+        )
+        self._registerSingleton("beta")
+
+        self._container.resolve("beta")
+        self._container.resolve("alpha")
+
+        report = self._container.dispose(collectErrors=True)
+
+        self.assertEqual(["alpha"], list(report.getErrors()))
+        self.assertEqual(["beta"], self._disposalOrder)
+
+    def testDisposeRaisesTheFirstErrorAfterDisposingEverything(self):
+        def failingDispose(instance):
+            raise RuntimeError("Cannot dispose " + instance)
+
+        self._container.registerSingleton(
+            "alpha", lambda container, key: "alpha", failingDispose
+        )
+        self._container.registerSingleton(
+            "gamma", lambda container, key: "gamma", failingDispose
+        )
+        self._registerSingleton("beta")
+
+        self._container.resolve("alpha")
+        self._container.resolve("beta")
+        self._container.resolve("gamma")
+
+        with self.assertRaisesRegex(RuntimeError, "Cannot dispose gamma"):
+            self._container.dispose()
+
+        self.assertEqual(["beta"], self._disposalOrder)
+        self.assertRaises(KeyError, self._container.resolve, "alpha")
+
+
+class RecordingInstrumentation(ContainerInstrumentation):
+    def __init__(self):
+        self.events = []
+
+    def onResolved(self, key, elapsedTime, error):
+        self.events.append(("resolved", key, error))
+
+    def onFactoryCalled(self, key, registration, elapsedTime, error):
+        self.events.append(("factory", key, error))
+
+
+class InstrumentationTests(unittest.TestCase):
+    def setUp(self):
+        self._statistics = ResolutionStatistics()
+        self._container = Container(self._statistics)
+
+    def testResolveCounts(self):
+        self._container.registerSingleton("alpha", lambda container, key: MyIocClass())
+        self._container.registerTransient("beta", lambda container, key: MyIocClass())
+
+        for _ in range(3):
+            self._container.resolve("alpha")
+            self._container.resolve("beta")
+
+        self.assertEqual({"alpha": 3, "beta": 3}, self._statistics.getResolveCounts())
+        self.assertEqual({"beta": 3}, self._statistics.getTransientCounts())
+
+    def testFactoryHistograms(self):
+        self._container.registerSingleton("alpha", lambda container, key: MyIocClass())
+
+        self._container.resolve("alpha")
+        self._container.resolve("alpha")
+
+        histogram = self._statistics.getFactoryHistograms()["alpha"]
+
+        self.assertEqual(len(self._statistics.getBucketBounds()) + 1, len(histogram))
+        self.assertEqual(1, sum(histogram))
+
+    def testHooksAreNotifiedOfErrors(self):
+        def failingFactory(container, key):
+            raise RuntimeError("Factory failure")
+
+        recorder = RecordingInstrumentation()
+        self._container.setInstrumentation(
+            CompositeInstrumentation(self._statistics, recorder)
+        )
+        self._container.registerTransient("alpha", failingFactory)
+
+        self.assertRaises(RuntimeError, self._container.resolve, "alpha")
+
+        self.assertEqual(
+            ["factory", "resolved"], [event[0] for event in recorder.events]
+        )
+        self.assertIsInstance(recorder.events[0][2], RuntimeError)
+        self.assertEqual({}, self._statistics.getTransientCounts())
+
+    def testDisabledInstrumentation(self):
+        self._container.setInstrumentation(None)
+        self._container.registerTransient("alpha", lambda container, key: MyIocClass())
+
+        self._container.resolve("alpha")
+
+        self.assertEqual({}, self._statistics.getResolveCounts())
@@ -5,6 +5,7 @@
 
 import unittest
 import os
+import tempfile
 
 from info.gianlucacosta.iris.maven import MavenArtifact, MavenRepository
 
@@ -179,3 +180,83 @@ class MavenRepositoryTests(unittest.TestCase):
         )
 
         self.assertEqual("28.3", latestVersion)
+
+
+class MavenRepositoryDiskUsageTests(unittest.TestCase):
+    def _writeFile(self, relativePath, size):
+        path = os.path.join(self._rootPath, *relativePath.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "wb") as outputFile:
+            outputFile.write(b"X" * size)
+
+    def setUp(self):
+        self._tempDir = tempfile.TemporaryDirectory()
+        self._rootPath = self._tempDir.name
+
+        self._writeFile("org/alpha/core/1.0/core-1.0.jar", 10)
+        self._writeFile("org/alpha/core/2.0/core-2.0.jar", 20)
+        self._writeFile("org/alpha/core/maven-metadata-local.xml", 1)
+        self._writeFile("org/alpha/utils/1.0/utils-1.0.jar", 100)
+        self._writeFile("org/alpha/sub/tools/3.0/tools-3.0.jar", 1000)
+
+        self._mavenRepository = MavenRepository(self._rootPath)
+
+    def tearDown(self):
+        self._tempDir.cleanup()
+
+    def testGetDiskUsage(self):
+        diskUsage = self._mavenRepository.getDiskUsage()
+
+        self.assertEqual(
+            {
+                ("org.alpha", "core", "1.0"),
+                ("org.alpha", "core", "2.0"),
+                ("org.alpha", "utils", "1.0"),
+                ("org.alpha.sub", "tools", "3.0"),
+            },
+            set(diskUsage.getVersionSizes()),
+        )
+        self.assertEqual(
+            {("org.alpha", "core"), ("org.alpha", "utils"), ("org.alpha.sub", "tools")},
+            set(diskUsage.getArtifactSizes()),
+        )
+        self.assertEqual({"org.alpha", "org.alpha.sub"}, set(diskUsage.getGroupSizes()))
+
+        versionSizes = diskUsage.getVersionSizes()
+        artifactSizes = diskUsage.getArtifactSizes()
+
+        self.assertGreater(
+            artifactSizes[("org.alpha", "core")],
+            versionSizes[("org.alpha", "core", "1.0")]
+            + versionSizes[("org.alpha", "core", "2.0")],
+        )
+        self.assertEqual(
+            artifactSizes[("org.alpha", "core")]
+            + artifactSizes[("org.alpha", "utils")],
+            diskUsage.getGroupSizes()["org.alpha"],
+        )
+
+    def testGetDiskUsageIsRefreshed(self):
+        self._mavenRepository.getDiskUsage()
+
+        self._writeFile("com/beta/lib/0.1/lib-0.1.jar", 5)
+
+        diskUsage = self._mavenRepository.getDiskUsage()
+
+        self.assertIn("com.beta", diskUsage.getGroupSizes())
+
+    def testGetDiskUsageWithMaxWorkers(self):
+        totalSize = self._mavenRepository.getDiskUsage().getTotalSize()
+
+        diskUsage = self._mavenRepository.getDiskUsage(maxWorkers=1, fullRescan=True)
+
+        self.assertEqual(totalSize, diskUsage.getTotalSize())
+
+    def testGetDiskUsageOfInexistentRepository(self):
+        diskUsage = MavenRepository(
+            os.path.join(self._rootPath, "INEXISTENT")
+        ).getDiskUsage()
+
+        self.assertEqual(0, diskUsage.getTotalSize())
+        self.assertEqual({}, diskUsage.getGroupSizes())
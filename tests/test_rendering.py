@@ -3,9 +3,24 @@
 :license: LGPLv3, see LICENSE for details.
 """
 
+import asyncio
+import io
+import os
+import pickle
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
 
-from info.gianlucacosta.iris.rendering import Model, View, TemplateView
+from info.gianlucacosta.iris.rendering import (
+    Model,
+    View,
+    TemplateView,
+    StringTemplateEngine,
+    TemplateCache,
+    BatchRenderer,
+)
+
+from .io import AbstractIoTestCase
 
 
 class MyTestModel(Model):
@@ -19,6 +34,25 @@ class MyTestModel(Model):
         return True
 
 
+class CompilationCountingEngine(StringTemplateEngine):
+    """
+    Appends, to every compiled template, the worker process id
+    and the number of compilations it performed so far
+    """
+
+    compilationCounts = {}
+
+    def compile(self, templateSource, templatePath):
+        processId = os.getpid()
+        compilationCount = self.compilationCounts.get(processId, 0) + 1
+        self.compilationCounts[processId] = compilationCount
+
+        return super().compile(
+            "{0}|{1}|{2}".format(templateSource, processId, compilationCount),
+            templatePath,
+        )
+
+
 class ModelTests(unittest.TestCase):
     def setUp(self):
         self._model = MyTestModel(False)
@@ -68,6 +102,148 @@ class ModelTests(unittest.TestCase):
         self.assertEqual(["sigma"], list(model.findVars().keys()))
 
 
+class CachedVarsTests(unittest.TestCase):
+    def setUp(self):
+        self._model = MyTestModel()
+
+    def testFindVars_ShouldReturnTheSameCachedView(self):
+        self.assertIs(self._model.findVars(), self._model.findVars())
+
+    def testFindVars_ShouldReturnAReadOnlyView(self):
+        cachedVars = self._model.findVars()
+
+        def assignVar():
+            cachedVars["alpha"] = 1
+
+        self.assertRaises(TypeError, assignVar)
+
+    def testFindVars_ShouldReferenceTheReturnedView(self):
+        cachedVars = self._model.findVars()
+
+        self.assertIs(cachedVars, cachedVars["vars"])
+
+    def testSetVar_ShouldInvalidateTheCache(self):
+        cachedVars = self._model.findVars()
+
+        self._model.setVar("alpha", 432)
+
+        self.assertEqual(90, cachedVars["alpha"])
+        self.assertEqual(432, self._model.findVars()["alpha"])
+
+    def testInvalidateVars_ShouldCallTheGettersAgain(self):
+        cachedVars = self._model.findVars()
+
+        self._model.invalidateVars()
+
+        self.assertIsNot(cachedVars, self._model.findVars())
+
+    def testPickle_ShouldDropTheCache(self):
+        self._model.setVar("delta", 4)
+        cachedVars = dict(self._model.findVars())
+
+        unpickledModel = pickle.loads(pickle.dumps(self._model))
+
+        self.assertIsNone(unpickledModel._vars)
+        self.assertIsNotNone(self._model._vars)
+
+        unpickledVars = dict(unpickledModel.findVars())
+        del cachedVars["vars"], unpickledVars["vars"]
+        self.assertEqual(cachedVars, unpickledVars)
+
+
+class MyDerivedTestModel(MyTestModel):
+    def getGamma(self):
+        return 7
+
+
+class AccessorPlanTests(unittest.TestCase):
+    def testAccessorPlan_ShouldBeComputedPerClass(self):
+        self.assertEqual(
+            (("alpha", "getAlpha"), ("beta", "getBeta"), ("testing", "isTesting")),
+            MyTestModel._accessorPlan,
+        )
+
+    def testAccessorPlan_ShouldIncludeInheritedGetters(self):
+        self.assertEqual(
+            {"alpha", "beta", "gamma", "testing"},
+            {varName for varName, _ in MyDerivedTestModel._accessorPlan},
+        )
+
+    def testAccessorPlan_ShouldBeEmptyForTheBaseModel(self):
+        self.assertEqual((), Model._accessorPlan)
+
+
+class CountingTestModel(Model):
+    def __init__(self):
+        super().__init__(False)
+        self.calls = []
+
+    def getAlpha(self):
+        self.calls.append("alpha")
+        return 90
+
+    def getBeta(self):
+        self.calls.append("beta")
+        return "Test!"
+
+
+class LazyVarsTests(unittest.TestCase):
+    def setUp(self):
+        self._model = CountingTestModel()
+
+    def testLazyVars_ShouldCallOnlyTheAccessedGetters(self):
+        lazyVars = self._model.lazyVars()
+
+        self.assertEqual(90, lazyVars["alpha"])
+        self.assertEqual(["alpha"], self._model.calls)
+
+    def testLazyVars_ShouldMemoizeValues(self):
+        lazyVars = self._model.lazyVars()
+
+        lazyVars["alpha"]
+        lazyVars["alpha"]
+
+        self.assertEqual(["alpha"], self._model.calls)
+
+    def testLazyVars_ShouldNotCallGettersWhenCheckingKeys(self):
+        lazyVars = self._model.lazyVars()
+
+        self.assertIn("beta", lazyVars)
+        self.assertNotIn("gamma", lazyVars)
+        self.assertEqual(["alpha", "beta", "vars"], list(lazyVars))
+        self.assertEqual([], self._model.calls)
+
+    def testLazyVars_ShouldHonorSetVars(self):
+        self._model.setVar("alpha", 432)
+        self._model.setVar("omega", 27)
+
+        lazyVars = self._model.lazyVars()
+
+        self.assertEqual(432, lazyVars["alpha"])
+        self.assertEqual(27, lazyVars["omega"])
+        self.assertEqual([], self._model.calls)
+
+    def testLazyVars_ShouldReferenceItself(self):
+        lazyVars = self._model.lazyVars()
+
+        self.assertIs(lazyVars, lazyVars["vars"])
+
+    def testLazyVars_ShouldMatchFindVars(self):
+        self._model.setVar("omega", 27)
+
+        lazyVars = dict(self._model.lazyVars())
+        foundVars = self._model.findVars()
+        del lazyVars["vars"]
+        del foundVars["vars"]
+
+        self.assertEqual(foundVars, lazyVars)
+
+    def testLazyVars_ShouldRaiseKeyErrorOnMissingVars(self):
+        lazyVars = self._model.lazyVars()
+
+        self.assertRaises(KeyError, lambda: lazyVars["gamma"])
+
+
 class ViewTests(unittest.TestCase):
     def setUp(self):
         self._view = View(91)
@@ -86,3 +262,224 @@ class TemplateViewTests(ViewTests):
 
     def testTemplatePathAvailability(self):
         self.assertEqual("MyTemplatePath", self._view._templatePath)
+
+
+class StringTemplateEngineTests(unittest.TestCase):
+    def setUp(self):
+        self._engine = StringTemplateEngine()
+
+    def _render(self, templateSource, vars):
+        return self._engine.compile(templateSource, "path").render(vars)
+
+    def testRender_ShouldReplacePlaceholders(self):
+        self.assertEqual(
+            "Alpha is 90, beta is Test!",
+            self._render("Alpha is $alpha, beta is ${beta}", MyTestModel().findVars()),
+        )
+
+    def testRender_ShouldLeaveMissingPlaceholders(self):
+        self.assertEqual(
+            "90 $gamma ${delta}", self._render("$alpha $gamma ${delta}", {"alpha": 90})
+        )
+
+    def testRender_ShouldUnescapeDelimiters(self):
+        self.assertEqual("Cost: $90 $", self._render("Cost: $$$alpha $", {"alpha": 90}))
+
+    def testRender_ShouldMatchSafeSubstitute(self):
+        templateSource = "$$ ${alpha}beta $alpha_1 $ $1 $$alpha $omega ${"
+        vars = {"alpha": 1, "alpha_1": 2}
+
+        self.assertEqual(
+            Template(templateSource).safe_substitute(vars),
+            self._render(templateSource, vars),
+        )
+
+
+class TemplateRenderingTestCase(AbstractIoTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self._templatePath = os.path.join(self._tempTestPath, "template.txt")
+        self._writeTemplate("Alpha is $alpha")
+
+        self._templateCache = TemplateCache(checkInterval=0)
+
+    def _writeTemplate(self, templateSource):
+        with open(self._templatePath, "w") as templateFile:
+            templateFile.write(templateSource)
+
+
+class TemplateCacheTests(TemplateRenderingTestCase):
+    def setUp(self):
+        super().setUp()
+        self._engine = StringTemplateEngine()
+
+    def testGetTemplate_ShouldReuseTheCompiledTemplate(self):
+        self.assertIs(
+            self._templateCache.getTemplate(self._templatePath, self._engine),
+            self._templateCache.getTemplate(self._templatePath, self._engine),
+        )
+
+    def testGetTemplate_ShouldRecompileModifiedTemplates(self):
+        self._templateCache.getTemplate(self._templatePath, self._engine)
+
+        self._writeTemplate("Beta is $beta, alpha is $alpha")
+
+        self.assertEqual(
+            "Beta is 2, alpha is 1",
+            self._templateCache.getTemplate(self._templatePath, self._engine).render(
+                {"alpha": 1, "beta": 2}
+            ),
+        )
+
+    def testGetTemplate_ShouldNotCheckTheFileWithinTheInterval(self):
+        templateCache = TemplateCache(checkInterval=3600)
+        compiledTemplate = templateCache.getTemplate(self._templatePath, self._engine)
+
+        os.remove(self._templatePath)
+
+        self.assertIs(
+            compiledTemplate,
+            templateCache.getTemplate(self._templatePath, self._engine),
+        )
+
+    def testGetTemplate_ShouldEvictLeastRecentlyUsedEntries(self):
+        templateCache = TemplateCache(maxEntries=2)
+        engines = [StringTemplateEngine() for _ in range(3)]
+
+        for engine in engines:
+            templateCache.getTemplate(self._templatePath, engine)
+
+        self.assertEqual(2, len(templateCache))
+
+    def testGetTemplate_ShouldEvictEntriesExceedingTheTotalSize(self):
+        templateCache = TemplateCache(maxTotalSize=20)
+
+        templateCache.getTemplate(self._templatePath, StringTemplateEngine())
+        templateCache.getTemplate(self._templatePath, StringTemplateEngine())
+
+        self.assertEqual(1, len(templateCache))
+
+    def testInvalidate(self):
+        self._templateCache.getTemplate(self._templatePath, self._engine)
+
+        self._templateCache.invalidate(self._templatePath)
+
+        self.assertEqual(0, len(self._templateCache))
+
+
+class TemplateViewRenderingTests(TemplateRenderingTestCase):
+    def testRender(self):
+        view = TemplateView(
+            MyTestModel(), self._templatePath, templateCache=self._templateCache
+        )
+
+        self.assertEqual("Alpha is 90", view.render())
+
+
+class StreamingRenderingTests(TemplateRenderingTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self._writeTemplate("$beta " * 1000)
+        self._view = TemplateView(
+            MyTestModel(), self._templatePath, templateCache=self._templateCache
+        )
+
+    def testGenerate_ShouldYieldTheRenderedOutput(self):
+        chunks = list(self._view.generate())
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(self._view.render(), "".join(chunks))
+
+    def testRenderTo_ShouldWriteTheEncodedOutput(self):
+        outputFile = io.BytesIO()
+
+        bytesWritten = self._view.renderTo(outputFile, bufferSize=100)
+
+        self.assertEqual(self._view.render().encode("utf-8"), outputFile.getvalue())
+        self.assertEqual(len(outputFile.getvalue()), bytesWritten)
+
+    def testGenerateAsync_ShouldYieldBlocks(self):
+        async def collectBlocks():
+            return [block async for block in self._view.generateAsync(bufferSize=100)]
+
+        eventLoop = asyncio.new_event_loop()
+        try:
+            blocks = eventLoop.run_until_complete(collectBlocks())
+        finally:
+            eventLoop.close()
+
+        self.assertGreater(len(blocks), 1)
+        self.assertTrue(all(len(block) >= 100 for block in blocks[:-1]))
+        self.assertEqual(self._view.render(), "".join(blocks))
+
+
+class BatchRendererTests(TemplateRenderingTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self._models = []
+
+        for index in range(20):
+            model = MyTestModel()
+            model.setVar("alpha", index)
+            self._models.append(model)
+
+    def _assertRenderedInOrder(self, results):
+        self.assertEqual(
+            ["Alpha is {0}".format(index) for index in range(20)],
+            [result.getOutput() for result in results],
+        )
+        self.assertEqual(list(range(20)), [result.getIndex() for result in results])
+
+    def testRender_WithProcessPool(self):
+        renderer = BatchRenderer(self._templatePath, maxWorkers=2)
+
+        results = list(renderer.render(self._models))
+
+        self._assertRenderedInOrder(results)
+        self.assertTrue(all(result.getFindVarsTime() >= 0 for result in results))
+        self.assertTrue(all(result.getRenderTime() >= 0 for result in results))
+
+    def testRender_WithPreviouslyRenderedModels(self):
+        for model in self._models:
+            model.findVars()
+
+        results = list(
+            BatchRenderer(self._templatePath, maxWorkers=2).render(self._models)
+        )
+
+        self._assertRenderedInOrder(results)
+
+    def testRender_ShouldCompileOncePerWorker(self):
+        renderer = BatchRenderer(
+            self._templatePath, CompilationCountingEngine(), maxWorkers=2
+        )
+
+        outputs = [result.getOutput() for result in renderer.render(self._models)]
+
+        self.assertEqual(
+            ["Alpha is {0}".format(index) for index in range(20)],
+            [output.split("|")[0] for output in outputs],
+        )
+        self.assertEqual({"1"}, {output.split("|")[2] for output in outputs})
+
+    def testRender_ShouldBoundTheInFlightModels(self):
+        consumedModels = []
+
+        def modelIterable():
+            for model in self._models:
+                consumedModels.append(model)
+                yield model
+
+        with ThreadPoolExecutor(2) as executor:
+            renderer = BatchRenderer(
+                self._templatePath, maxInFlight=3, executor=executor
+            )
+            results = renderer.render(modelIterable())
+
+            firstResult = next(results)
+            self.assertEqual(4, len(consumedModels))
+
+            self._assertRenderedInOrder([firstResult] + list(results))
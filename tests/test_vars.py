@@ -3,9 +3,13 @@
 :license: LGPLv3, see LICENSE for details.
 """
 
+import asyncio
 import os
+import threading
 
-from info.gianlucacosta.iris.vars import VariablesService, Flag
+from concurrent.futures import ThreadPoolExecutor
+
+from info.gianlucacosta.iris.vars import VariablesService, Flag, MappedVariablesService
 from info.gianlucacosta.iris.io.utils import PathOperations
 
 from .io import AbstractIoTestCase
@@ -72,3 +76,408 @@ class FlagTests(VariablesTestCase):
         self._flag.flip()
 
         self.assertTrue(self._flag.isActive())
+
+
+class SnapshotTests(VariablesTestCase):
+    def testSnapshotOnMissingDirectory(self):
+        self.assertEqual({}, self._variablesService.snapshot())
+
+    def testSnapshotOfActiveFlags(self):
+        self._variablesService.getFlag("alpha").activate()
+        self._variablesService.getFlag("beta").activate()
+
+        self.assertEqual(
+            {"alpha": True, "beta": True}, self._variablesService.snapshot()
+        )
+
+    def testSnapshotOfGivenFlags(self):
+        self._variablesService.getFlag("alpha").activate()
+
+        self.assertEqual(
+            {"alpha": True, "gamma": False},
+            self._variablesService.snapshot(["alpha", "gamma"]),
+        )
+
+    def testActivateAll(self):
+        self._variablesService.getFlag("alpha").activate()
+
+        activatedFlagNames = self._variablesService.activateAll(
+            ["alpha", "beta", "gamma"]
+        )
+
+        self.assertEqual({"beta", "gamma"}, activatedFlagNames)
+        self.assertTrue(self._variablesService.getFlag("gamma").isActive())
+
+    def testDeactivateAll(self):
+        self._variablesService.activateAll(["alpha", "beta"])
+
+        deactivatedFlagNames = self._variablesService.deactivateAll(["alpha", "gamma"])
+
+        self.assertEqual({"alpha"}, deactivatedFlagNames)
+        self.assertEqual({"beta": True}, self._variablesService.snapshot())
+
+    def testSnapshotInWatchedMode(self):
+        with VariablesService(self._varsDir, watched=True) as watchedService:
+            watchedService.activateAll(["alpha", "beta"])
+
+            self.assertEqual({"alpha": True, "beta": True}, watchedService.snapshot())
+
+    def _createNonFlagEntries(self):
+        self._variablesService.getString("name").set("Iris")
+        self._variablesService.getCounter("hits").increment()
+        os.makedirs(os.path.join(self._varsDir, "subdir"))
+
+    def testSnapshotIncludesOnlyFlags(self):
+        self._variablesService.getFlag("alpha").activate()
+        self._createNonFlagEntries()
+
+        self.assertEqual({"alpha": True}, self._variablesService.snapshot())
+
+    def testSnapshotAgreesWithIsActive(self):
+        self._variablesService.getFlag(".backup.tmp").activate()
+        os.symlink(
+            os.path.join(self._varsDir, ".backup.tmp"),
+            os.path.join(self._varsDir, "linked"),
+        )
+        os.makedirs(os.path.join(self._varsDir, "subdir"))
+
+        expectedSnapshot = {".backup.tmp": True, "linked": True}
+
+        self.assertEqual(expectedSnapshot, self._variablesService.snapshot())
+
+        with VariablesService(self._varsDir, watched=True) as watchedService:
+            self.assertEqual(expectedSnapshot, watchedService.snapshot())
+
+            for flagName in [".backup.tmp", "linked", "subdir"]:
+                self.assertEqual(
+                    flagName in expectedSnapshot,
+                    self._variablesService.getFlag(flagName).isActive(),
+                )
+                self.assertEqual(
+                    flagName in expectedSnapshot,
+                    watchedService.getFlag(flagName).isActive(),
+                )
+
+    def testSnapshotInWatchedModeIncludesOnlyFlags(self):
+        self._createNonFlagEntries()
+
+        with VariablesService(self._varsDir, watched=True) as watchedService:
+            watchedService.getFlag("alpha").activate()
+            watchedService.getJson("settings").set({"alpha": False})
+
+            self.assertEqual({"alpha": True}, watchedService.snapshot())
+
+
+class AtomicFlagTests(VariablesTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self._flag = self._variablesService.getFlag("AtomicTestFlag")
+
+    def testTryActivate(self):
+        self.assertTrue(self._flag.tryActivate())
+        self.assertFalse(self._flag.tryActivate())
+        self.assertTrue(self._flag.isActive())
+
+    def testTryDeactivate(self):
+        self._flag.activate()
+
+        self.assertTrue(self._flag.tryDeactivate())
+        self.assertFalse(self._flag.tryDeactivate())
+        self.assertFalse(self._flag.isActive())
+
+    def testFlipReturnsTheNewValue(self):
+        self.assertTrue(self._flag.flip())
+        self.assertFalse(self._flag.flip())
+
+    def testConcurrentFlips(self):
+        with ThreadPoolExecutor(8) as executor:
+            for _ in range(51):
+                executor.submit(self._flag.flip)
+
+        self.assertTrue(self._flag.isActive())
+
+
+class TypedVariablesTests(VariablesTestCase):
+    def testStringVariable(self):
+        variable = self._variablesService.getString("name")
+
+        self.assertIsNone(variable.get())
+
+        variable.set("Iris")
+
+        self.assertEqual("Iris", variable.get())
+        self.assertEqual("Iris", self._variablesService.getString("name").get())
+
+    def testJsonVariable(self):
+        variable = self._variablesService.getJson("settings")
+
+        variable.set({"alpha": [1, 2], "beta": None})
+
+        self.assertEqual({"alpha": [1, 2], "beta": None}, variable.get())
+
+    def testCachedReadsDetectExternalChanges(self):
+        variable = self._variablesService.getString("name")
+        variable.set("First")
+        variable.get()
+
+        self._variablesService.getString("name").set("Second value")
+
+        self.assertEqual("Second value", variable.get())
+
+    def testCounter(self):
+        counter = self._variablesService.getCounter("hits")
+
+        self.assertEqual(0, counter.get())
+        self.assertEqual(1, counter.increment())
+        self.assertEqual(6, counter.increment(5))
+        self.assertEqual(6, counter.get())
+
+    def testConcurrentIncrements(self):
+        counter = self._variablesService.getCounter("hits")
+
+        with ThreadPoolExecutor(8) as executor:
+            for _ in range(50):
+                executor.submit(
+                    lambda: self._variablesService.getCounter("hits").increment()
+                )
+
+        self.assertEqual(50, counter.get())
+
+    def testDelete(self):
+        variable = self._variablesService.getString("name")
+        variable.set("Iris")
+
+        self.assertTrue(variable.delete())
+        self.assertFalse(variable.exists())
+
+    def testSetValues(self):
+        stringVariable = self._variablesService.getString("name")
+        counter = self._variablesService.getCounter("hits")
+
+        self._variablesService.setValues({stringVariable: "Iris", counter: 90})
+
+        self.assertEqual("Iris", stringVariable.get())
+        self.assertEqual(90, counter.get())
+        self.assertEqual(
+            ["hits", "name"],
+            sorted(os.listdir(os.path.dirname(stringVariable.getPath()))),
+        )
+
+
+class FlagWaitTests(VariablesTestCase):
+    def setUp(self):
+        super().setUp()
+
+        os.makedirs(self._varsDir)
+        self._flag = self._variablesService.getFlag("waitedFlag")
+
+    def _activateLater(self, delay=0.05):
+        timer = threading.Timer(delay, self._flag.activate)
+        timer.start()
+        self.addCleanup(timer.join)
+
+    def testWaitWhenAlreadyActive(self):
+        self._flag.activate()
+
+        self.assertTrue(self._flag.wait(timeout=0))
+
+    def testWaitTimeout(self):
+        self.assertFalse(self._flag.wait(timeout=0.05))
+
+    def testWaitWithPositionalTimeout(self):
+        self.assertFalse(self._flag.wait(0.05))
+
+        self._flag.activate()
+        self.assertTrue(self._flag.wait(0))
+
+    def testWaitForActivation(self):
+        self._activateLater()
+
+        self.assertTrue(self._flag.wait(timeout=5))
+        self.assertTrue(self._flag.isActive())
+
+    def testWaitForDeactivation(self):
+        self._flag.activate()
+        timer = threading.Timer(0.05, self._flag.deactivate)
+        timer.start()
+        self.addCleanup(timer.join)
+
+        self.assertTrue(self._flag.wait(active=False, timeout=5))
+
+    def testWaitWithPolling(self):
+        self._activateLater()
+
+        self.assertTrue(self._flag._pollUntil(True, self._flag._getDeadline(5)))
+
+    def testWaitAsync(self):
+        self._activateLater()
+
+        eventLoop = asyncio.new_event_loop()
+        try:
+            self.assertTrue(
+                eventLoop.run_until_complete(self._flag.waitAsync(timeout=5))
+            )
+            self.assertFalse(
+                eventLoop.run_until_complete(
+                    self._flag.waitAsync(active=False, timeout=0.05)
+                )
+            )
+        finally:
+            eventLoop.close()
+
+    def testManyWaitersShareOneWatcher(self):
+        results = []
+        waiters = [
+            threading.Thread(target=lambda: results.append(self._flag.wait(timeout=5)))
+            for _ in range(5)
+        ]
+
+        for waiter in waiters:
+            waiter.start()
+
+        self._activateLater()
+
+        for waiter in waiters:
+            waiter.join()
+
+        self.assertEqual([True] * 5, results)
+
+
+class WatchedVariablesServiceTests(VariablesTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self._watchedService = VariablesService(self._varsDir, watched=True)
+
+    def tearDown(self):
+        self._watchedService.close()
+        super().tearDown()
+
+    def testIsWatched(self):
+        self.assertTrue(self._watchedService.isWatched())
+        self.assertFalse(self._variablesService.isWatched())
+
+    def testActivateIsVisibleImmediately(self):
+        flag = self._watchedService.getFlag("alpha")
+
+        flag.activate()
+        self.assertTrue(flag.isActive())
+
+        flag.deactivate()
+        self.assertFalse(flag.isActive())
+
+    def testNestedFlagsDoNotUseTheWatcher(self):
+        topLevelFlag = self._watchedService.getFlag("x")
+        topLevelFlag.activate()
+
+        nestedFlag = self._watchedService.getFlag(os.path.join("sub", "x"))
+        self.assertFalse(nestedFlag.isActive())
+
+        nestedFlag.activate()
+        self.assertTrue(nestedFlag.isActive())
+
+        nestedFlag.deactivate()
+        self.assertFalse(nestedFlag.isActive())
+        self.assertTrue(topLevelFlag.isActive())
+
+    def testExternalChangesAreDetected(self):
+        changeEvent = threading.Event()
+        changes = []
+
+        def listener(flagName, isActive):
+            changes.append((flagName, isActive))
+            changeEvent.set()
+
+        self._watchedService.subscribe(listener)
+
+        self._variablesService.getFlag("beta").activate()
+
+        assert changeEvent.wait(5)
+        self.assertEqual([("beta", True)], changes)
+        self.assertTrue(self._watchedService.getFlag("beta").isActive())
+
+    def testSubscribeRequiresWatchedMode(self):
+        self.assertRaises(RuntimeError, self._variablesService.subscribe, print)
+
+
+class MappedVariablesServiceTests(VariablesTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self._variablesFilePath = os.path.join(self._varsDir, "variables.bin")
+        self._mappedService = MappedVariablesService(self._variablesFilePath, 8)
+
+    def tearDown(self):
+        self._mappedService.close()
+        super().tearDown()
+
+    def testNewFlagIsInactive(self):
+        self.assertFalse(self._mappedService.getFlag("alpha").isActive())
+
+    def testActivateAndDeactivate(self):
+        flag = self._mappedService.getFlag("alpha")
+
+        flag.activate()
+        self.assertTrue(flag.isActive())
+
+        flag.deactivate()
+        self.assertFalse(flag.isActive())
+
+    def testFlip(self):
+        flag = self._mappedService.getFlag("alpha")
+
+        self.assertTrue(flag.flip())
+        self.assertFalse(flag.flip())
+
+    def testTryActivateAndTryDeactivate(self):
+        flag = self._mappedService.getFlag("alpha")
+
+        self.assertTrue(flag.tryActivate())
+        self.assertFalse(flag.tryActivate())
+        self.assertTrue(flag.tryDeactivate())
+        self.assertFalse(flag.tryDeactivate())
+
+    def testUpdatesAreSharedAmongMappings(self):
+        with MappedVariablesService(self._variablesFilePath) as otherService:
+            otherFlag = otherService.getFlag("alpha")
+
+            self._mappedService.getFlag("alpha").activate()
+
+            self.assertTrue(otherFlag.isActive())
+            self.assertEqual(8, otherService.getSlotCount())
+
+    def testFlagsAreStoredInOneFile(self):
+        for flagName in ["alpha", "beta", "gamma"]:
+            self._mappedService.getFlag(flagName).activate()
+
+        self.assertEqual(["variables.bin"], os.listdir(self._varsDir))
+        self.assertEqual(["alpha", "beta", "gamma"], self._mappedService.getFlagNames())
+
+    def testGetFlagWhenSlotsAreExhausted(self):
+        for index in range(8):
+            self._mappedService.getFlag("flag{0}".format(index))
+
+        self.assertRaises(RuntimeError, self._mappedService.getFlag, "overflow")
+
+    def testGetFlagWithTooLongName(self):
+        self.assertRaises(ValueError, self._mappedService.getFlag, "x" * 63)
+
+    def testSnapshot(self):
+        self._mappedService.activateAll(["alpha", "beta"])
+        self._mappedService.deactivateAll(["beta"])
+
+        self.assertEqual({"alpha": True}, self._mappedService.snapshot())
+        self.assertEqual(
+            {"alpha": True, "beta": False, "gamma": False},
+            self._mappedService.snapshot(["alpha", "beta", "gamma"]),
+        )
+
+    def testWait(self):
+        flag = self._mappedService.getFlag("alpha")
+        timer = threading.Timer(0.05, flag.activate)
+        timer.start()
+        self.addCleanup(timer.join)
+
+        self.assertTrue(flag.wait(timeout=5))
+        self.assertFalse(flag.wait(active=False, timeout=0.05))